@@ -0,0 +1,93 @@
+# bench_queries.py
+
+"""
+Per-request CPU cost of the hot item queries: ORM queries rebuilt on every
+call (the old handler code) vs. the cached statements in
+fastapi_postgres_app.queries.
+
+    python bench_queries.py [--iterations 2000]
+
+Uses DATABASE_URL and seeds sample rows if the table is empty. Point
+DATABASE_URL at postgresql+psycopg://... to include server-side prepared
+statements (DB_PREPARE_THRESHOLD) in the comparison.
+"""
+
+import argparse
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from fastapi_postgres_app import models  # noqa: E402
+from fastapi_postgres_app.database import SessionLocal, engine  # noqa: E402
+from fastapi_postgres_app.queries import get_item, items_query  # noqa: E402
+
+
+def legacy_read_item(db, item_id):
+    return db.query(models.Item).filter(models.Item.id == item_id).first()
+
+
+def cached_read_item(db, item_id):
+    return get_item(db, item_id)
+
+
+def legacy_read_items(db, price_gt):
+    query = db.query(models.Item)
+    query = query.filter(models.Item.available == True)  # noqa: E712
+    query = query.filter(models.Item.price > price_gt)
+    query = query.order_by(models.Item.price.asc(), models.Item.id.asc())
+    return query.limit(20).all()
+
+
+def cached_read_items(db, price_gt):
+    stmt, params = items_query(available=True, price_gt=price_gt, sort="price", limit=20)
+    return db.execute(stmt, params).scalars().all()
+
+
+def measure(fn, db, args, iterations):
+    for i in range(50):  # warm the compiled cache and the connection
+        fn(db, args[i % len(args)])
+    cpu, wall = time.process_time(), time.perf_counter()
+    for i in range(iterations):
+        fn(db, args[i % len(args)])
+    return (
+        (time.process_time() - cpu) / iterations * 1e6,
+        (time.perf_counter() - wall) / iterations * 1e6,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if not db.query(models.Item.id).limit(1).all():
+            db.execute(models.Item.__table__.insert(), [
+                {"name": f"Bench {i}", "description": "benchmark row", "price": i % 100,
+                 "available": i % 2 == 0, "email": f"bench{i}@example.com",
+                 "special_id": 900000 + i}
+                for i in range(1000)
+            ])
+            db.commit()
+        ids = [row.id for row in db.query(models.Item.id).limit(200)]
+        prices = list(range(0, 100, 7))
+
+        print(f"driver: {engine.dialect.driver}, iterations: {args.iterations}")
+        print(f"{'query':<12}{'variant':<10}{'cpu us/call':>14}{'wall us/call':>14}")
+        for label, legacy, cached, inputs in (
+            ("read_item", legacy_read_item, cached_read_item, ids),
+            ("read_items", legacy_read_items, cached_read_items, prices),
+        ):
+            for variant, fn in (("legacy", legacy), ("cached", cached)):
+                cpu, wall = measure(fn, db, inputs, args.iterations)
+                print(f"{label:<12}{variant:<10}{cpu:>14.1f}{wall:>14.1f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# fastapi_postgres_app/bulk.py
+
+"""
+Set-based bulk update and delete for PATCH/DELETE /items/bulk.
+
+Items are selected by an id list or the GET /items/ filters and written in
+chunks of BULK_CHUNK_SIZE ids, walking the id order:
+
+    SELECT id FROM items WHERE <selection> AND id > :after
+        ORDER BY id LIMIT :chunk FOR UPDATE
+    UPDATE items SET ..., version = version + 1 WHERE id = ANY(:chunk_ids) RETURNING *
+
+Each chunk is its own short transaction; the rows are locked when selected,
+so they still match when written. Locks are held for one chunk only and
+concurrent writers never wait for the whole job. The flip side: a failure
+stops the job with earlier chunks committed. Rerunning the
+same request is safe; with filters, rows already changed no longer match
+(or are changed again to the same values).
+"""
+
+import os
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import Integer, any_, bindparam, delete, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from fastapi_postgres_app import models, schemas
+from fastapi_postgres_app.queries import _filter_params, _where_filters
+from fastapi_postgres_app.querycount import count_batch
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+TABLE = models.Item.__table__
+
+
+def _where_selection(stmt, filters: Tuple[str, ...], by_ids: bool):
+    if by_ids:
+        stmt = stmt.where(TABLE.c.id == any_(bindparam("ids", type_=ARRAY(Integer))))
+    return _where_filters(stmt, filters)
+
+
+@lru_cache(maxsize=64)
+def _count_statement(filters: Tuple[str, ...], by_ids: bool):
+    return _where_selection(select(func.count()).select_from(TABLE), filters, by_ids)
+
+
+@lru_cache(maxsize=64)
+def _chunk_statement(filters: Tuple[str, ...], by_ids: bool):
+    stmt = (
+        select(TABLE.c.id)
+        .where(TABLE.c.id > bindparam("after"))
+        .order_by(TABLE.c.id)
+        .limit(bindparam("chunk", type_=Integer))
+        .with_for_update()
+    )
+    return _where_selection(stmt, filters, by_ids)
+
+
+IN_CHUNK = TABLE.c.id == any_(bindparam("chunk_ids", type_=ARRAY(Integer)))
+
+DELETE_CHUNK = delete(TABLE).where(IN_CHUNK).returning(TABLE.c.id, TABLE.c.email)
+
+
+@lru_cache(maxsize=16)
+def _update_statement(columns: Tuple[str, ...]):
+    values = {column: bindparam(f"set_{column}") for column in columns}
+    values["version"] = TABLE.c.version + 1
+    return update(TABLE).where(IN_CHUNK).values(values).returning(*TABLE.c)
+
+
+def _selection_params(selection: schemas.ItemBulkSelection) -> Tuple[Tuple[str, ...], bool, dict]:
+    filters = selection.filters or schemas.ItemFilters()
+    params = _filter_params(
+        filters.available, filters.price_lt, filters.price_gt, filters.search,
+        filters.created_after, filters.created_before,
+    )
+    filter_names = tuple(params)
+    if selection.ids is not None:
+        params["ids"] = selection.ids
+    return filter_names, selection.ids is not None, params
+
+
+def count(db: Session, selection: schemas.ItemBulkSelection) -> int:
+    filters, by_ids, params = _selection_params(selection)
+    # One row, or one per shard
+    return sum(db.execute(_count_statement(filters, by_ids), params).scalars())
+
+
+def _run_chunks(
+    db: Session, filters: Tuple[str, ...], by_ids: bool, params: dict, write, write_params: dict
+) -> Iterator[list]:
+    """Yield the rows `write` returned for each committed chunk."""
+    chunk_stmt = _chunk_statement(filters, by_ids)
+    sharded = getattr(db, "shard_set", None)
+    # Sharded, every shard is walked on its own engine
+    engines: List[Optional[object]] = list(sharded.engines.values()) if sharded is not None else [None]
+    for engine in engines:
+        after = 0
+        while True:
+            # At most two statements per chunk: the locking SELECT and the write
+            count_batch()
+            chunk_params = {**params, "after": after, "chunk": BULK_CHUNK_SIZE}
+            if engine is None:
+                chunk_ids = db.execute(chunk_stmt, chunk_params).scalars().all()
+                rows = db.execute(write, {**write_params, "chunk_ids": chunk_ids}).all() if chunk_ids else []
+                db.commit()
+            else:
+                with engine.begin() as conn:
+                    chunk_ids = conn.execute(chunk_stmt, chunk_params).scalars().all()
+                    rows = conn.execute(write, {**write_params, "chunk_ids": chunk_ids}).all() if chunk_ids else []
+            if rows:
+                yield rows
+            if len(chunk_ids) < BULK_CHUNK_SIZE:
+                break
+            after = chunk_ids[-1]
+
+
+def update_items(db: Session, request: schemas.ItemBulkUpdate) -> Iterator[list]:
+    """Apply request.changes chunk by chunk; yields the updated rows of each chunk."""
+    filters, by_ids, params = _selection_params(request)
+    changes = request.changes.model_dump(exclude_unset=True)
+    write_params = {f"set_{column}": value for column, value in changes.items()}
+    yield from _run_chunks(db, filters, by_ids, params, _update_statement(tuple(changes)), write_params)
+
+
+def delete_items(db: Session, request: schemas.ItemBulkDelete) -> Iterator[list]:
+    """Delete chunk by chunk; yields the (id, email) rows of each chunk."""
+    filters, by_ids, params = _selection_params(request)
+    sharded = getattr(db, "shard_set", None)
+    for rows in _run_chunks(db, filters, by_ids, params, DELETE_CHUNK, {}):
+        if sharded is not None:
+            sharded._delete_emails([row.email for row in rows])
+        yield rows
@@ -0,0 +1,245 @@
+# fastapi_postgres_app/compression.py
+
+import os
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from fastapi_postgres_app.metrics import REGISTRY
+
+# Brotli and zstd are optional; gzip is always available through zlib
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+COMPRESSION_LEVELS = {
+    "gzip": int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    "br": int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+    "zstd": int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3")),
+}
+
+# Content types worth compressing; everything else goes out untouched
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson",
+                      "application/xml", "application/javascript")
+
+compression_bytes_in = REGISTRY.counter(
+    "http_compression_bytes_in_total",
+    "Uncompressed response bytes fed to the compressor",
+)
+compression_bytes_out = REGISTRY.counter(
+    "http_compression_bytes_out_total",
+    "Compressed response bytes sent to clients",
+)
+compression_cpu_seconds = REGISTRY.counter(
+    "http_compression_cpu_seconds_total",
+    "CPU time spent compressing response bodies",
+)
+compression_ratio = REGISTRY.histogram(
+    "http_compression_ratio",
+    "Uncompressed/compressed size ratio per response",
+    buckets=(1, 1.5, 2, 3, 5, 8, 13, 21, 34),
+)
+
+
+def available_encodings() -> List[str]:
+    """Encodings this process can produce, in server preference order."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, supported: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Pick the best content-coding for an Accept-Encoding header.
+    Highest q-value wins; ties go to the server's preference order.
+    """
+    supported = supported if supported is not None else available_encodings()
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Compressor:
+    """Incremental compressor; each chunk is flushed so streams stay live."""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def _run(self, fn, data: bytes = b"") -> bytes:
+        start = time.thread_time()
+        out = fn(data)
+        self.cpu_seconds += time.thread_time() - start
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._run(lambda d: self._obj.compress(d) + self._obj.flush(zlib.Z_SYNC_FLUSH), data)
+        if self.encoding == "br":
+            return self._run(lambda d: self._obj.process(d) + self._obj.flush(), data)
+        return self._run(
+            lambda d: self._obj.compress(d) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), data
+        )
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "gzip":
+            out = self._run(lambda d: self._obj.compress(d) + self._obj.flush(zlib.Z_FINISH), data)
+        elif self.encoding == "br":
+            out = self._run(lambda d: self._obj.process(d) + self._obj.finish(), data)
+        else:
+            out = self._run(lambda d: self._obj.compress(d) + self._obj.flush(), data)
+        self._record()
+        return out
+
+    def _record(self) -> None:
+        compression_bytes_in.inc(self.bytes_in, encoding=self.encoding)
+        compression_bytes_out.inc(self.bytes_out, encoding=self.encoding)
+        compression_cpu_seconds.inc(self.cpu_seconds, encoding=self.encoding)
+        if self.bytes_out:
+            compression_ratio.observe(self.bytes_in / self.bytes_out, encoding=self.encoding)
+
+
+class CompressionMiddleware:
+    """
+    Compress responses according to Accept-Encoding.
+
+    Small, already-encoded or non-text responses pass through unchanged.
+    Streaming responses are compressed chunk by chunk instead of buffered.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        levels: Optional[Dict[str, int]] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {**COMPRESSION_LEVELS, **(levels or {})}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(self.app, encoding, self.levels[encoding], self.minimum_size)
+        await responder(scope, receive, send)
+
+
+class _CompressingResponder:
+    def __init__(self, app: ASGIApp, encoding: str, level: int, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.send: Send = None
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    def _should_skip(self, headers: Headers) -> bool:
+        if self.start_message["status"] in (204, 304):
+            return True
+        if "content-encoding" in headers:
+            return True
+        content_type = headers.get("content-type", "")
+        return not content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def send_with_compression(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Hold the headers until we've seen the first body chunk
+            self.start_message = message
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if self._should_skip(headers) or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding, self.level)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag is not None and etag.startswith('"') and etag.endswith('"'):
+                # A strong validator names one byte sequence; the compressed
+                # body gets its own ("3" -> "3-gzip"), see parse_if_match()
+                headers["ETag"] = f'{etag[:-1]}-{self.encoding}"'
+            if more_body:
+                del headers["Content-Length"]
+                body = self.compressor.compress(body)
+            else:
+                body = self.compressor.finish(body)
+                headers["Content-Length"] = str(len(body))
+            self.start_message["headers"] = headers.raw
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        if more_body:
+            body = self.compressor.compress(body)
+        else:
+            body = self.compressor.finish(body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
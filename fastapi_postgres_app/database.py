@@ -3,6 +3,7 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Load .env (optional if already loaded in main)
@@ -13,6 +14,23 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL environment variable is not set")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# With psycopg 3 (postgresql+psycopg://...), statements executed more than
+# DB_PREPARE_THRESHOLD times on a connection become server-side prepared
+# statements, so Postgres stops re-parsing and re-planning them. Set it to
+# "none" behind transaction-pooling PgBouncer. psycopg2 has no equivalent.
+connect_args = {}
+if make_url(DATABASE_URL).get_driver_name() == "psycopg":
+    threshold = os.getenv("DB_PREPARE_THRESHOLD", "5")
+    connect_args["prepare_threshold"] = None if threshold.lower() == "none" else int(threshold)
+
+# Connection pool per process and database. `python -m fastapi_postgres_app.serve`
+# derives DB_POOL_SIZE from DB_CONNECTION_BUDGET and the number of workers.
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+}
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, connect_args=connect_args, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
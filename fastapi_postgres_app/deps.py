@@ -1,5 +1,8 @@
 # fastapi_postgres_app/deps.py
 
+import hmac
+import os
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi_postgres_app.jwt_utils import verify_access_token
@@ -9,6 +12,9 @@ from fastapi_postgres_app.models import Permission
 # Don’t auto-error so we can return a 401 for missing tokens
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# Static bearer token for metrics scrapers, which cannot refresh a JWT
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+
 def get_token_data(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
 ) -> TokenData:
@@ -57,3 +63,16 @@ def require_full_access(td: TokenData = Depends(get_token_data)):
             detail="Full access required"
         )
     return td
+
+
+def require_metrics_access(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
+):
+    """GET /metrics: the METRICS_TOKEN scrape token, or a full_access JWT."""
+    if (
+        METRICS_TOKEN is not None
+        and credentials is not None
+        and hmac.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode())
+    ):
+        return None
+    return require_full_access(get_token_data(credentials))
@@ -0,0 +1,134 @@
+# fastapi_postgres_app/idempotency.py
+
+"""
+Idempotency-Key support for POST /items/.
+
+The key is claimed with an INSERT into idempotency_keys in the same
+transaction that creates the item, and the response (status, headers, body)
+is written to that row before the commit. So:
+
+- a retry after a success finds the committed row and gets the stored
+  response back, with `Idempotent-Replayed: true`, without touching items;
+- a duplicate that arrives while the first request is still running blocks
+  on the uncommitted key (Postgres makes the second INSERT wait for the
+  first transaction) and then replays its result;
+- a request that fails (e.g. 409) rolls its claim back, so a retry runs
+  again instead of replaying the error;
+- reusing a key with a different body is rejected with 422.
+
+With SHARD_URLS the key lives in the directory database and is committed
+right after the item, so a crash in between can still let one retry fail
+with 409.
+
+Keys expire after IDEMPOTENCY_TTL_SECONDS; an expired key is taken over by
+the next request using it, and `python -m fastapi_postgres_app.idempotency
+purge` (e.g. from cron) deletes expired rows to keep the table bounded.
+"""
+
+import argparse
+import hashlib
+import os
+from datetime import timedelta
+from typing import Dict
+
+from fastapi import HTTPException, Response
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from fastapi_postgres_app import models
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+TABLE = models.IdempotencyKey.__table__
+
+
+def request_hash(body: str) -> str:
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def validate_key(key: str) -> None:
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "error": "InvalidIdempotencyKey",
+                "message": f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters.",
+                "code": 422
+            }
+        )
+
+
+def claim(conn, key: str, body_hash: str):
+    """
+    Claim `key` in the caller's transaction (a Session or Connection).
+    Returns None when this request now owns the key, otherwise the stored
+    row of the request that completed with it. Waits while another open
+    transaction holds the key.
+    """
+    stmt = pg_insert(TABLE).values(
+        key=key,
+        request_hash=body_hash,
+        expires_at=func.now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TABLE.c.key],
+        # Only an expired key is taken over
+        set_={
+            "request_hash": stmt.excluded.request_hash,
+            "status_code": None,
+            "headers": None,
+            "body": None,
+            "created_at": func.now(),
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=TABLE.c.expires_at <= func.now(),
+    ).returning(TABLE.c.key)
+    if conn.execute(stmt).first() is not None:
+        return None
+    return conn.execute(select(TABLE).where(TABLE.c.key == key)).first()
+
+
+def save(conn, key: str, status_code: int, headers: Dict[str, str], body: bytes) -> None:
+    conn.execute(
+        TABLE.update().where(TABLE.c.key == key)
+        .values(status_code=status_code, headers=headers, body=body)
+    )
+
+
+def replay(stored, body_hash: str) -> Response:
+    if stored.request_hash != body_hash:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "error": "IdempotencyKeyReused",
+                "message": "This Idempotency-Key was already used with a different request body.",
+                "code": 422
+            }
+        )
+    return Response(
+        content=stored.body,
+        status_code=stored.status_code,
+        headers={**stored.headers, "Idempotent-Replayed": "true"},
+        media_type="application/json",
+    )
+
+
+def purge_expired(conn) -> int:
+    return conn.execute(delete(TABLE).where(TABLE.c.expires_at <= func.now())).rowcount
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain stored Idempotency-Key responses")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("purge", help="delete expired keys")
+    parser.parse_args(argv)
+
+    from fastapi_postgres_app.database import engine
+
+    with engine.begin() as conn:
+        print(f"deleted {purge_expired(conn)} expired keys")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# fastapi_postgres_app/imports.py
+
+"""
+Background bulk imports of items from CSV or NDJSON uploads.
+
+POST /items/imports spools the upload to IMPORTS_DIR and answers 202 with a
+job id straight away. A pool of IMPORT_WORKERS threads then stream-parses
+the file, validates IMPORT_BATCH_SIZE rows at a time with
+schemas.ItemCreate and loads each batch with COPY into a temporary stage
+table followed by one INSERT ... ON CONFLICT DO NOTHING. Rows that fail
+validation or collide with an existing email/special_id go to a reject
+file (NDJSON, one {"line", "error", "message", "row"} object per row)
+served at GET /items/imports/{id}/rejects.
+
+Progress lives in the import_jobs table, so any app process can report it.
+A job runs in the process that accepted the upload; one interrupted by a
+restart stays "running" and has to be submitted again. After each committed
+batch the inserted rows go to the callbacks registered with
+on_rows_imported(), which keep that process's read models current.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from fastapi_postgres_app import models, schemas
+from fastapi_postgres_app.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+IMPORTS_DIR = os.getenv("IMPORTS_DIR", os.path.join(tempfile.gettempdir(), "fastapi_imports"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(1024 ** 3)))
+
+COLUMNS = ("name", "description", "price", "available", "email", "special_id")
+STAGE_TABLE = "items_import_stage"
+
+executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+
+items_imported = REGISTRY.counter(
+    "items_imported_total",
+    "Items created by bulk imports",
+)
+items_import_rejected = REGISTRY.counter(
+    "items_import_rejected_total",
+    "Rows rejected by bulk imports, by reason",
+)
+
+# (line number, parsed record, error) as produced by the parsers
+Record = Tuple[int, Optional[dict], Optional[Tuple[str, str]]]
+
+_listeners: List[Callable[[list], None]] = []
+
+
+def on_rows_imported(listener: Callable[[list], None]) -> None:
+    """Call listener with the items rows (RETURNING *) of every committed batch."""
+    _listeners.append(listener)
+
+
+def upload_path(job_id: str) -> Path:
+    return Path(IMPORTS_DIR) / f"{job_id}.upload"
+
+
+def rejects_path(job_id: str) -> Path:
+    return Path(IMPORTS_DIR) / f"{job_id}.rejects.ndjson"
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    name = (filename or "").lower()
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+def _spool(job_id: str, source: BinaryIO, max_bytes: int) -> int:
+    Path(IMPORTS_DIR).mkdir(parents=True, exist_ok=True)
+    path = upload_path(job_id)
+    size = 0
+    with open(path, "wb") as out:
+        while chunk := source.read(1 << 20):
+            size += len(chunk)
+            if size > max_bytes:
+                break
+            out.write(chunk)
+    if size > max_bytes:
+        path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=413,
+            detail={
+                "error": "PayloadTooLarge",
+                "message": f"Import files are limited to {max_bytes} bytes.",
+                "code": 413
+            }
+        )
+    return size
+
+
+def start_import(db: Session, source: BinaryIO, filename: Optional[str], fmt: str) -> models.ImportJob:
+    """Spool the upload to disk, record the job and queue it for a worker."""
+    job_id = uuid.uuid4().hex
+    size = _spool(job_id, source, IMPORT_MAX_BYTES)
+    job = models.ImportJob(id=job_id, status="queued", filename=filename, format=fmt, bytes_total=size)
+    db.add(job)
+    db.commit()
+    executor.submit(run_import, db.get_bind(), job_id, fmt)
+    return job
+
+
+def get_job(db: Session, job_id: str) -> Optional[models.ImportJob]:
+    # Workers update the row from other connections; never serve a stale copy
+    stmt = select(models.ImportJob).where(models.ImportJob.id == job_id)
+    return db.execute(stmt.execution_options(populate_existing=True)).scalar_one_or_none()
+
+
+def job_status(job: models.ImportJob) -> dict:
+    finished = job.status in ("succeeded", "failed")
+    rows_per_second = None
+    if job.started_at is not None:
+        elapsed = ((job.finished_at or datetime.now(timezone.utc)) - job.started_at).total_seconds()
+        rows_per_second = round(job.rows_processed / elapsed, 1) if elapsed > 0 else None
+    progress = job.bytes_read / job.bytes_total if job.bytes_total else float(finished)
+    return {
+        "id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "format": job.format,
+        "bytes_total": job.bytes_total,
+        "bytes_read": job.bytes_read,
+        "rows_processed": job.rows_processed,
+        "rows_imported": job.rows_imported,
+        "rows_rejected": job.rows_rejected,
+        "progress": round(progress, 4),
+        "rows_per_second": rows_per_second,
+        "rejects_url": f"/items/imports/{job.id}/rejects" if job.rows_rejected else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# --- parsing ---
+
+def _csv_records(stream: TextIO) -> Iterator[Record]:
+    reader = csv.DictReader(stream)
+    for record in reader:
+        if None in record:
+            yield reader.line_num, record, ("ValidationError", "Row has more fields than the header")
+            continue
+        # Empty cells mean "not given", e.g. a null price
+        yield reader.line_num, {k: v for k, v in record.items() if v != ""}, None
+
+
+def _ndjson_records(stream: TextIO) -> Iterator[Record]:
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_no, None, ("InvalidJSON", str(exc))
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, ("InvalidJSON", "Each line must be a JSON object")
+            continue
+        yield line_no, record, None
+
+
+PARSERS = {"csv": _csv_records, "ndjson": _ndjson_records}
+
+
+def _validate(record: dict) -> Tuple[Optional[dict], Optional[Tuple[str, str]]]:
+    try:
+        return schemas.ItemCreate.model_validate(record).model_dump(), None
+    except ValidationError as exc:
+        message = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+            for error in exc.errors()
+        )
+        return None, ("ValidationError", message)
+
+
+def _batches(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    records = iter(records)
+    while batch := list(islice(records, size)):
+        yield batch
+
+
+# --- loading ---
+
+def _copy_value(value) -> str:
+    # COPY text format: \N is NULL; backslash, tab and newlines are escaped
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value).replace("\\", "\\\\").replace("\t", "\\t")
+        .replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+
+def _copy_to_stage(conn: Connection, rows: List[Tuple[int, dict]]) -> None:
+    sql = f"COPY {STAGE_TABLE} (line, {', '.join(COLUMNS)}) FROM STDIN"
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy"):  # psycopg 3
+            with cursor.copy(sql) as copy:
+                for line, row in rows:
+                    copy.write_row((line, *(row[col] for col in COLUMNS)))
+        else:  # psycopg2
+            buffer = io.StringIO()
+            for line, row in rows:
+                buffer.write("\t".join(_copy_value(v) for v in (line, *(row[col] for col in COLUMNS))))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+
+def _load(conn: Connection, rows: List[Tuple[int, dict]]) -> Tuple[list, list, list]:
+    """Insert a batch of valid rows; returns (imported, duplicate, inserted items) rows."""
+    if not rows:
+        return [], [], []
+    try:
+        with conn.begin():
+            _copy_to_stage(conn, rows)
+            inserted = conn.execute(text(
+                f"INSERT INTO items ({', '.join(COLUMNS)}) "
+                f"SELECT {', '.join(COLUMNS)} FROM {STAGE_TABLE} ORDER BY line "
+                "ON CONFLICT DO NOTHING RETURNING *"
+            )).all()
+    except IntegrityError:
+        # A partitioned items table enforces uniqueness in a trigger, which
+        # ON CONFLICT cannot skip; fall back to one savepoint per row
+        return _load_row_by_row(conn, rows)
+
+    # Duplicates inside the batch: the first occurrence is the one inserted
+    remaining = {(row.special_id, row.email) for row in inserted}
+    imported, duplicates = [], []
+    for line, row in rows:
+        key = (row["special_id"], row["email"])
+        if key in remaining:
+            remaining.discard(key)
+            imported.append((line, row))
+        else:
+            duplicates.append((line, row))
+    return imported, duplicates, inserted
+
+
+def _load_row_by_row(conn: Connection, rows: List[Tuple[int, dict]]) -> Tuple[list, list, list]:
+    table = models.Item.__table__
+    imported, duplicates, inserted = [], [], []
+    with conn.begin():
+        for line, row in rows:
+            try:
+                with conn.begin_nested():
+                    inserted.append(conn.execute(table.insert().values(row).returning(*table.c)).one())
+                imported.append((line, row))
+            except IntegrityError:
+                duplicates.append((line, row))
+    return imported, duplicates, inserted
+
+
+def _update_job(engine: Engine, job_id: str, **values) -> None:
+    with engine.begin() as conn:
+        conn.execute(update(models.ImportJob).where(models.ImportJob.id == job_id).values(**values))
+
+
+def run_import(engine: Engine, job_id: str, fmt: str) -> None:
+    counts = {"rows_processed": 0, "rows_imported": 0, "rows_rejected": 0}
+    _update_job(engine, job_id, status="running", started_at=datetime.now(timezone.utc))
+    started = time.perf_counter()
+    try:
+        with open(upload_path(job_id), "rb") as raw, \
+                open(rejects_path(job_id), "w", encoding="utf-8") as rejects, \
+                engine.connect() as conn:
+            conn.execute(text(
+                f"CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} ("
+                "line integer, name text, description text, price integer,"
+                " available boolean, email text, special_id integer"
+                ") ON COMMIT DELETE ROWS"
+            ))
+            conn.commit()
+
+            def reject(line: int, error: Tuple[str, str], row) -> None:
+                rejects.write(json.dumps(
+                    {"line": line, "error": error[0], "message": error[1], "row": row}, default=str
+                ) + "\n")
+                items_import_rejected.inc(reason=error[0])
+                counts["rows_rejected"] += 1
+
+            stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="" if fmt == "csv" else None)
+            for batch in _batches(PARSERS[fmt](stream), IMPORT_BATCH_SIZE):
+                valid = []
+                for line, record, error in batch:
+                    row = None
+                    if error is None:
+                        row, error = _validate(record)
+                    if error is None:
+                        valid.append((line, row))
+                    else:
+                        reject(line, error, record)
+                imported, duplicates, inserted = _load(conn, valid)
+                for listener in _listeners:
+                    listener(inserted)
+                for line, row in duplicates:
+                    reject(line, ("UniqueViolation", "Email or special_id already exists."), row)
+                items_imported.inc(len(imported))
+                counts["rows_processed"] += len(batch)
+                counts["rows_imported"] += len(imported)
+                rejects.flush()
+                _update_job(engine, job_id, bytes_read=raw.tell(), **counts)
+            # Temp tables outlive the pooled connection otherwise
+            conn.execute(text(f"DROP TABLE IF EXISTS {STAGE_TABLE}"))
+            conn.commit()
+        _update_job(
+            engine, job_id, status="succeeded", finished_at=datetime.now(timezone.utc),
+            bytes_read=upload_path(job_id).stat().st_size, **counts,
+        )
+        logger.info("import %s: %s in %.1fs", job_id, counts, time.perf_counter() - started)
+    except Exception as exc:
+        logger.exception("import %s failed", job_id)
+        _update_job(
+            engine, job_id, status="failed", error=str(exc),
+            finished_at=datetime.now(timezone.utc), **counts,
+        )
+    finally:
+        upload_path(job_id).unlink(missing_ok=True)
+        if not counts["rows_rejected"]:
+            rejects_path(job_id).unlink(missing_ok=True)
@@ -1,37 +1,146 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import Request, FastAPI, Depends, HTTPException, Query, Response, status
-from fastapi.responses import JSONResponse
+from fastapi import Request, FastAPI, Depends, File, Header, HTTPException, Query, Response, UploadFile, status
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+from sqlalchemy import literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+from contextlib import nullcontext
+from datetime import datetime
+from typing import List, Literal, Optional
 
-from fastapi_postgres_app import models, schemas
+from fastapi_postgres_app import bulk, idempotency, models, schemas
 from fastapi_postgres_app.database import engine, SessionLocal
 from fastapi_postgres_app.auth import router as auth_router
+from fastapi_postgres_app.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from fastapi_postgres_app.imports import (
+    detect_format,
+    get_job,
+    job_status,
+    on_rows_imported,
+    rejects_path,
+    start_import,
+)
+from fastapi_postgres_app.memprofile import (
+    MEMORY_PROFILING_ENABLED,
+    MemoryProfilingMiddleware,
+    router as memory_router,
+)
+from fastapi_postgres_app.metrics import COLLECTOR, render as render_metrics
+from fastapi_postgres_app.queries import (
+    MAX_PAGE_SIZE,
+    combine_stats,
+    delete_item_if_match,
+    get_item,
+    items_query,
+    items_stats_query,
+    lookup_statement,
+    parse_if_match,
+    sort_keys,
+    update_item_if_match,
+)
+from fastapi_postgres_app.querycount import (
+    QUERY_BUDGETS_ENFORCED,
+    QUERY_COUNT_HEADER,
+    QueryCountMiddleware,
+    query_budget,
+)
+from fastapi_postgres_app.snapshot import SNAPSHOT_ENABLED, ItemSnapshot
+from fastapi_postgres_app.similar import SIMILAR_INDEX_ENABLED, SIMILAR_MAX_LIMIT, SimilarityIndex
+from fastapi_postgres_app.suggest import SUGGEST_INDEX_ENABLED, SUGGEST_MAX_LIMIT, NameIndex, suggest_from_db
+from fastapi_postgres_app.sharding import SHARD_URLS, ShardKeyChangeError, ShardSet, shard_for_special_id
+from fastapi_postgres_app.profiling import (
+    PROFILING_ENABLED,
+    ProfilingMiddleware,
+    router as profiling_router,
+)
 from fastapi_postgres_app.deps import (
     require_read_only,
     require_read_write,
     require_full_access,
+    require_metrics_access,
 )
 
 models.Base.metadata.create_all(bind=engine)
+
+# Optional hash sharding of items; DATABASE_URL stays the directory database
+shard_set = ShardSet(SHARD_URLS, directory=engine) if SHARD_URLS else None
+if shard_set is not None:
+    shard_set.prepare()
+
+# Optional in-process read models, patched by _notify() after each write
+item_engines = list(shard_set.engines.values()) if shard_set is not None else [engine]
+snapshot = None
+if SNAPSHOT_ENABLED:
+    snapshot = ItemSnapshot(item_engines)
+    snapshot.start()
+suggest_index = None
+if SUGGEST_INDEX_ENABLED:
+    suggest_index = NameIndex(item_engines)
+    suggest_index.start()
+similar_index = None
+if SIMILAR_INDEX_ENABLED:
+    similar_index = SimilarityIndex(item_engines)
+    similar_index.start()
+
+# Worker processes sharing METRICS_DIR publish their metrics for /metrics
+if COLLECTOR is not None:
+    COLLECTOR.start()
+
 app = FastAPI()
 
+# Per-request statement counts: X-Query-Count headers and route budgets
+if QUERY_COUNT_HEADER or QUERY_BUDGETS_ENFORCED:
+    app.add_middleware(QueryCountMiddleware)
+
+# Negotiated gzip/br/zstd compression of responses
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Per-request peak allocation of sampled requests while tracemalloc runs
+if MEMORY_PROFILING_ENABLED:
+    app.add_middleware(MemoryProfilingMiddleware)
+
+# Outermost, so a profile covers everything the request goes through
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # Mount the token-generation endpoint
 app.include_router(auth_router)
+if PROFILING_ENABLED:
+    app.include_router(profiling_router)
+if MEMORY_PROFILING_ENABLED:
+    app.include_router(memory_router)
 
 
 # Dependency for getting a DB session
 def get_db():
-    db = SessionLocal()
+    db = shard_set.sessionmaker() if shard_set is not None else SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
 
+def _notify(items=(), deleted_ids=()) -> None:
+    """Keep in-process read models current after a committed write."""
+    items = list(items)
+    for read_model in (snapshot, suggest_index, similar_index):
+        if read_model is not None:
+            read_model.apply(items, deleted_ids)
+
+
+# Background imports commit outside any request
+on_rows_imported(_notify)
+
+
+def _etag(item) -> str:
+    return f'"{item.version}"'
+
+
 @app.post(
     "/items/",
     response_model=schemas.Item,
@@ -56,11 +165,15 @@ def get_db():
         },
     }
 )
+@query_budget(statements=5, rows=3)
 def create_item(
     item: schemas.ItemCreate,
     response: Response,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
+    if idempotency_key is not None:
+        return _create_item_idempotent(db, item, idempotency_key)
     db_item = models.Item(**item.model_dump())
     try:
         db.add(db_item)
@@ -76,10 +189,227 @@ def create_item(
                 "code": 409
             }
         )
+    _notify([db_item])
     response.headers["Location"] = f"/items/{db_item.id}"
+    response.headers["ETag"] = _etag(db_item)
     return db_item
 
 
+def _create_item_idempotent(db: Session, item: schemas.ItemCreate, key: str) -> Response:
+    """create_item with the response stored under key; see idempotency.py."""
+    idempotency.validate_key(key)
+    body_hash = idempotency.request_hash(item.model_dump_json())
+    sharded = getattr(db, "shard_set", None)
+    # Unsharded, the key commits with the item; sharded, it lives in the directory
+    keys = sharded.directory.begin() if sharded is not None else nullcontext(db)
+    with keys as conn:
+        stored = idempotency.claim(conn, key, body_hash)
+        if stored is None:
+            db_item = models.Item(**item.model_dump())
+            try:
+                db.add(db_item)
+                db.flush()
+                db.refresh(db_item)
+            except IntegrityError:
+                db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail={
+                        "error": "UniqueViolation",
+                        "message": "Email or special_id already exists.",
+                        "code": 409
+                    }
+                )
+            body = schemas.Item.model_validate(db_item).model_dump_json().encode()
+            headers = {"Location": f"/items/{db_item.id}", "ETag": _etag(db_item)}
+            idempotency.save(conn, key, status.HTTP_201_CREATED, headers, body)
+            db.commit()
+            _notify([db_item])
+            return Response(content=body, status_code=status.HTTP_201_CREATED,
+                            headers=headers, media_type="application/json")
+    db.rollback()
+    return idempotency.replay(stored, body_hash)
+
+
+def _upsert_items(db: Session, rows: List[dict], on: str) -> List[dict]:
+    """
+    Insert or update rows in a single INSERT ... ON CONFLICT DO UPDATE.
+    Returns {"status", "item"} dicts in input order.
+    """
+    keys = [row[on] for row in rows]
+    if len(set(keys)) != len(keys):
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "error": "DuplicateKey",
+                "message": f"Each {on} may appear only once per batch.",
+                "code": 422
+            }
+        )
+
+    table = models.Item.__table__
+
+    def upsert_statement(batch):
+        stmt = pg_insert(table).values(batch)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c[on]],
+            set_={
+                **{col: stmt.excluded[col] for col in batch[0] if col != on},
+                "version": table.c.version + 1,
+            },
+        ).returning(
+            *table.c,
+            # xmax is 0 only for a freshly inserted row version
+            literal_column("(xmax = 0)").label("inserted"),
+        )
+
+    try:
+        sharded = getattr(db, "shard_set", None)
+        if sharded is None:
+            result = db.execute(upsert_statement(rows)).mappings().all()
+        else:
+            result = _upsert_sharded(db, sharded, rows, on, upsert_statement)
+        db.commit()
+    except IntegrityError:
+        # The other unique column collided with a different row
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "error": "UniqueViolation",
+                "message": "Email or special_id already exists.",
+                "code": 409
+            }
+        )
+    except ProgrammingError as exc:
+        db.rollback()
+        # 42P10: no unique index matches ON CONFLICT, i.e. items is partitioned
+        sqlstate = getattr(exc.orig, "sqlstate", None) or getattr(exc.orig, "pgcode", None)
+        if sqlstate != "42P10":
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail={
+                "error": "NotImplemented",
+                "message": "Upserts are not available while items is partitioned.",
+                "code": 501
+            }
+        )
+
+    by_key = {row[on]: dict(row) for row in result}
+    results = []
+    for key in keys:
+        row = by_key[key]
+        inserted = row.pop("inserted")
+        results.append({
+            "status": "inserted" if inserted else "updated",
+            "item": schemas.Item.model_validate(row),
+        })
+    _notify(entry["item"] for entry in results)
+    return results
+
+
+def _upsert_sharded(db: Session, sharded: ShardSet, rows: List[dict], on: str, upsert_statement) -> list:
+    # special_id picks the shard, so only it can serve as the conflict key;
+    # email ownership is reserved in the directory before each shard write.
+    if on != "special_id":
+        raise ShardKeyChangeError("Sharded upserts must be keyed on special_id")
+    by_shard = {}
+    for row in rows:
+        by_shard.setdefault(shard_for_special_id(row["special_id"], sharded.count), []).append(row)
+
+    table = models.Item.__table__
+    result = []
+    for shard_id, batch in by_shard.items():
+        bind = {"shard_id": shard_id}
+        existing = dict(db.execute(
+            select(table.c.special_id, table.c.email).where(
+                table.c.special_id.in_([row["special_id"] for row in batch])
+            ),
+            bind_arguments=bind,
+        ).all())
+        for row in batch:
+            old_email = existing.get(row["special_id"])
+            if old_email != row["email"]:
+                sharded.reserve_email(db, row["email"], shard_id)
+                if old_email is not None:
+                    sharded.release_on_commit(db, old_email)
+        result += db.execute(upsert_statement(batch), bind_arguments=bind).mappings().all()
+    return result
+
+
+@app.post(
+    "/items/upsert",
+    response_model=schemas.UpsertResult,
+    dependencies=[Depends(require_read_write)],
+    responses={
+        200: {
+            "description": "Existing item updated"
+        },
+        201: {
+            "description": "Item created",
+            "headers": {
+                "Location": {
+                    "description": "URL of the new item",
+                    "schema": {"type": "string", "example": "/items/1"}
+                }
+            }
+        },
+        409: {
+            "model": schemas.ErrorResponse,
+            "description": "Conflict – the other unique column belongs to another item"
+        },
+        422: {
+            "description": "Validation Error"
+        },
+        501: {
+            "model": schemas.ErrorResponse,
+            "description": "items is partitioned; see partitions.py"
+        },
+    }
+)
+@query_budget(statements=1, rows=1)
+def upsert_item(
+    item: schemas.ItemCreate,
+    response: Response,
+    on: Literal["special_id", "email"] = Query("special_id"),
+    db: Session = Depends(get_db)
+):
+    result = _upsert_items(db, [item.model_dump()], on)[0]
+    if result["status"] == "inserted":
+        response.status_code = status.HTTP_201_CREATED
+        response.headers["Location"] = f"/items/{result['item'].id}"
+    response.headers["ETag"] = _etag(result["item"])
+    return result
+
+
+@app.post(
+    "/items/upsert/batch",
+    response_model=List[schemas.UpsertResult],
+    dependencies=[Depends(require_read_write)],
+    responses={
+        409: {
+            "model": schemas.ErrorResponse,
+            "description": "Conflict – the other unique column belongs to another item"
+        },
+        422: {
+            "description": "Validation Error"
+        },
+        501: {
+            "model": schemas.ErrorResponse,
+            "description": "items is partitioned; see partitions.py"
+        },
+    }
+)
+@query_budget(statements=1, rows=schemas.MAX_UPSERT_BATCH)
+def upsert_items_batch(
+    batch: schemas.ItemUpsertBatch,
+    on: Literal["special_id", "email"] = Query("special_id"),
+    db: Session = Depends(get_db)
+):
+    return _upsert_items(db, [item.model_dump() for item in batch.items], on)
+
+
 @app.get(
     "/items/",
     response_model=List[schemas.Item],
@@ -90,27 +420,354 @@ def create_item(
         }
     }
 )
+@query_budget(statements=1)
 def read_items(
     available: Optional[bool] = Query(None),
     price_lt: Optional[int] = Query(None),
     price_gt: Optional[int] = Query(None),
     search: Optional[str] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
+    sort: str = Query(
+        "id",
+        description="Comma-separated columns, '-' for descending, e.g. price,-created_at,name"
+    ),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    if snapshot is not None and snapshot.can_serve(search, sort_keys(sort)):
+        # Filter and order in memory; Postgres only hydrates the page
+        ids = snapshot.query_ids(
+            sort_keys(sort), limit, offset,
+            available, price_lt, price_gt, created_after, created_before,
+        )
+        rows = db.execute(lookup_statement(True, False, False), {"ids": ids}).scalars().all()
+        by_id = {row.id: row for row in rows}
+        return [by_id[item_id] for item_id in ids if item_id in by_id]
+
+    stmt, params = items_query(
+        available, price_lt, price_gt, search,
+        created_after, created_before, sort, limit, offset,
+    )
+    sharded = getattr(db, "shard_set", None)
+    if sharded is not None:
+        return sharded.merge_sorted(stmt, params, sort_keys(sort), limit, offset)
+    return db.execute(stmt, params).scalars().all()
+
+
+@app.get(
+    "/items/stats",
+    response_model=schemas.ItemStats,
+    dependencies=[Depends(require_read_only)],
+    responses={
+        422: {
+            "description": "Validation Error"
+        }
+    }
+)
+@query_budget(statements=1, rows=1)
+def items_stats(
+    available: Optional[bool] = Query(None),
+    price_lt: Optional[int] = Query(None),
+    price_gt: Optional[int] = Query(None),
+    search: Optional[str] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """Count and price aggregates over the items GET /items/ would return."""
+    if snapshot is not None and not search:
+        return snapshot.stats(available, price_lt, price_gt, created_after, created_before)
+    stmt, params = items_stats_query(available, price_lt, price_gt, search, created_after, created_before)
+    # One row, or one per shard
+    return combine_stats(db.execute(stmt, params).all())
+
+
+@app.patch(
+    "/items/bulk",
+    response_model=schemas.ItemBulkResult,
+    dependencies=[Depends(require_read_write)],
+    responses={
+        422: {
+            "description": "Validation Error"
+        }
+    }
+)
+@query_budget(statements=1, rows=1, batch_statements=2, batch_rows=2 * bulk.BULK_CHUNK_SIZE)
+def bulk_update_items(request: schemas.ItemBulkUpdate, db: Session = Depends(get_db)):
+    """
+    Apply the same changes to every item selected by `ids` or `filters`
+    with set-based UPDATEs, BULK_CHUNK_SIZE rows per transaction. With
+    dry_run only the matching items are counted.
+    """
+    if request.dry_run:
+        return {"affected": bulk.count(db, request), "dry_run": True}
+    affected = 0
+    for rows in bulk.update_items(db, request):
+        affected += len(rows)
+        _notify(rows)
+    return {"affected": affected, "dry_run": False}
+
+
+@app.delete(
+    "/items/bulk",
+    response_model=schemas.ItemBulkResult,
+    dependencies=[Depends(require_full_access)],
+    responses={
+        422: {
+            "description": "Validation Error"
+        }
+    }
+)
+@query_budget(statements=1, rows=1, batch_statements=2, batch_rows=2 * bulk.BULK_CHUNK_SIZE)
+def bulk_delete_items(request: schemas.ItemBulkDelete, db: Session = Depends(get_db)):
+    """Delete every item selected by `ids` or `filters`, in chunks like PATCH /items/bulk."""
+    if request.dry_run:
+        return {"affected": bulk.count(db, request), "dry_run": True}
+    affected = 0
+    for rows in bulk.delete_items(db, request):
+        affected += len(rows)
+        _notify(deleted_ids=[row.id for row in rows])
+    return {"affected": affected, "dry_run": False}
+
+
+@app.get(
+    "/items/suggest",
+    response_model=List[schemas.ItemSuggestion],
+    dependencies=[Depends(require_read_only)],
+    responses={
+        422: {
+            "description": "Validation Error"
+        }
+    }
+)
+@query_budget(statements=1, rows=SUGGEST_MAX_LIMIT)
+def suggest_items(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=SUGGEST_MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """Names starting with prefix (case-insensitive), alphabetically, with their ids."""
+    if suggest_index is not None:
+        return suggest_index.suggest(prefix, limit)
+    return suggest_from_db(db, prefix, limit)
+
+
+@app.post(
+    "/items/lookup",
+    response_model=schemas.ItemLookupResponse,
+    dependencies=[Depends(require_read_only)],
+    responses={
+        422: {
+            "description": "Validation Error"
+        }
+    }
+)
+@query_budget(statements=1, rows=schemas.MAX_LOOKUP_KEYS)
+def lookup_items(lookup: schemas.ItemLookupRequest, db: Session = Depends(get_db)):
+    ids = list(dict.fromkeys(lookup.ids))
+    emails = list(dict.fromkeys(lookup.emails))
+    special_ids = list(dict.fromkeys(lookup.special_ids))
+
+    # One round trip for all three key lists
+    stmt = lookup_statement(bool(ids), bool(emails), bool(special_ids))
+    params = {"ids": ids, "emails": emails, "special_ids": special_ids}
+    rows = db.execute(stmt, params).scalars().all()
+
+    by_id = {row.id: row for row in rows}
+    by_email = {row.email: row for row in rows}
+    by_special_id = {row.special_id: row for row in rows}
+
+    def resolve(keys, index):
+        return {
+            str(key): {"found": key in index, "item": index.get(key)}
+            for key in keys
+        }
+
+    return {
+        "ids": resolve(ids, by_id),
+        "emails": resolve(emails, by_email),
+        "special_ids": resolve(special_ids, by_special_id),
+    }
+
+
+@app.post(
+    "/items/imports",
+    response_model=schemas.ImportJob,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(require_read_write)],
+    responses={
+        202: {
+            "description": "Import queued",
+            "headers": {
+                "Location": {
+                    "description": "URL of the import job",
+                    "schema": {"type": "string", "example": "/items/imports/3f2a..."}
+                }
+            }
+        },
+        413: {
+            "model": schemas.ErrorResponse,
+            "description": "Upload exceeds IMPORT_MAX_BYTES"
+        },
+        422: {
+            "description": "Validation Error"
+        },
+        501: {
+            "model": schemas.ErrorResponse,
+            "description": "Imports are not available with sharding"
+        },
+    }
+)
+@query_budget(statements=2, rows=2)
+def create_import(
+    response: Response,
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON"),
+    format: Optional[Literal["csv", "ndjson"]] = Query(
+        None, description="Defaults to the file extension or content type"
+    ),
     db: Session = Depends(get_db),
 ):
-    query = db.query(models.Item)
-    if available is not None:
-        query = query.filter(models.Item.available == available)
-    if price_lt is not None:
-        query = query.filter(models.Item.price < price_lt)
-    if price_gt is not None:
-        query = query.filter(models.Item.price > price_gt)
-    if search:
-        term = f"%{search}%"
-        query = query.filter(
-            models.Item.name.ilike(term) |
-            models.Item.description.ilike(term)
+    if getattr(db, "shard_set", None) is not None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail={
+                "error": "NotImplemented",
+                "message": "Bulk imports are not supported when SHARD_URLS is set.",
+                "code": 501
+            }
         )
-    return query.all()
+    fmt = format or detect_format(file.filename, file.content_type)
+    if fmt is None:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "error": "UnknownFormat",
+                "message": "Upload a .csv or .ndjson file, or pass ?format=csv|ndjson.",
+                "code": 422
+            }
+        )
+    job = start_import(db, file.file, file.filename, fmt)
+    response.headers["Location"] = f"/items/imports/{job.id}"
+    return job_status(job)
+
+
+def _import_not_found(job_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail={
+            "error": "NotFound",
+            "message": f"Import {job_id} not found.",
+            "code": 404
+        }
+    )
+
+
+@app.get(
+    "/items/imports/{job_id}",
+    response_model=schemas.ImportJob,
+    dependencies=[Depends(require_read_only)],
+    responses={
+        404: {
+            "model": schemas.ErrorResponse,
+            "description": "Import not found"
+        }
+    }
+)
+@query_budget(statements=1, rows=1)
+def read_import(job_id: str, db: Session = Depends(get_db)):
+    job = get_job(db, job_id)
+    if job is None:
+        raise _import_not_found(job_id)
+    return job_status(job)
+
+
+@app.get(
+    "/items/imports/{job_id}/rejects",
+    response_class=FileResponse,
+    dependencies=[Depends(require_read_only)],
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "One {line, error, message, row} object per rejected row"
+        },
+        404: {
+            "model": schemas.ErrorResponse,
+            "description": "Import not found or nothing rejected"
+        }
+    }
+)
+@query_budget(statements=1, rows=1)
+def download_import_rejects(job_id: str, db: Session = Depends(get_db)):
+    job = get_job(db, job_id)
+    path = rejects_path(job_id)
+    if job is None or not job.rows_rejected or not path.exists():
+        raise _import_not_found(job_id)
+    return FileResponse(path, media_type="application/x-ndjson", filename=f"{job_id}.rejects.ndjson")
+
+
+def _precondition_failed(item_id: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail={
+            "error": "PreconditionFailed",
+            "message": f"Item {item_id} was modified; fetch it again for the current ETag.",
+            "code": 412
+        }
+    )
+
+
+def _write_item(db: Session, item_id: int, values: dict, if_match: Optional[str]) -> schemas.Item:
+    """
+    Apply values to an item and bump its version. Unsharded this is a single
+    UPDATE ... WHERE id = :id [AND version = :v] RETURNING; sharded sessions
+    go through the ORM so the email directory stays in sync, and the mapper's
+    version check guards the UPDATE instead.
+    """
+    versions = parse_if_match(if_match)
+    try:
+        if getattr(db, "shard_set", None) is None:
+            item = update_item_if_match(db, item_id, values, versions)
+        else:
+            item = get_item(db, item_id)
+            if item is not None:
+                if versions is not None and item.version not in versions:
+                    raise _precondition_failed(item_id)
+                for key, value in values.items():
+                    setattr(item, key, value)
+                db.flush()
+        if item is None:
+            db.rollback()
+            # Only on failure: tell a stale If-Match apart from a missing item
+            if versions is not None and get_item(db, item_id) is not None:
+                raise _precondition_failed(item_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={
+                    "error": "NotFound",
+                    "message": f"Item {item_id} not found.",
+                    "code": 404
+                }
+            )
+        # Serialize before commit so the response needs no reload
+        result = schemas.Item.model_validate(item)
+        db.commit()
+        _notify([result])
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "error": "UniqueViolation",
+                "message": "Email or special_id already exists.",
+                "code": 409
+            }
+        )
+    except StaleDataError:
+        db.rollback()
+        raise _precondition_failed(item_id)
+    return result
 
 
 @app.get(
@@ -118,6 +775,14 @@ def read_items(
     response_model=schemas.Item,
     dependencies=[Depends(require_read_only)],
     responses={
+        200: {
+            "headers": {
+                "ETag": {
+                    "description": "Current version; send it back as If-Match",
+                    "schema": {"type": "string", "example": '"1"'}
+                }
+            }
+        },
         404: {
             "model": schemas.ErrorResponse,
             "description": "Item not found"
@@ -127,8 +792,9 @@ def read_items(
         }
     }
 )
-def read_item(item_id: int, db: Session = Depends(get_db)):
-    item = db.query(models.Item).filter(models.Item.id == item_id).first()
+@query_budget(statements=1, rows=1)
+def read_item(item_id: int, response: Response, db: Session = Depends(get_db)):
+    item = get_item(db, item_id)
     if not item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -138,9 +804,66 @@ def read_item(item_id: int, db: Session = Depends(get_db)):
                 "code": 404
             }
         )
+    response.headers["ETag"] = _etag(item)
     return item
 
 
+@app.get(
+    "/items/{item_id}/similar",
+    response_model=List[schemas.SimilarItem],
+    dependencies=[Depends(require_read_only)],
+    responses={
+        404: {
+            "model": schemas.ErrorResponse,
+            "description": "Item not found"
+        },
+        422: {
+            "description": "Validation Error"
+        },
+        501: {
+            "model": schemas.ErrorResponse,
+            "description": "The similarity index is not enabled"
+        }
+    }
+)
+@query_budget(statements=2, rows=SIMILAR_MAX_LIMIT + 1)
+def similar_items(
+    item_id: int,
+    limit: int = Query(10, ge=1, le=SIMILAR_MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """The items whose name and description are most similar to this one's, best first."""
+    if similar_index is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail={
+                "error": "NotImplemented",
+                "message": "Similar items need SIMILAR_INDEX_ENABLED=true.",
+                "code": 501
+            }
+        )
+    matches = similar_index.similar(item_id, limit)
+    if matches is None:
+        # Written by another process since the last reload
+        item = get_item(db, item_id)
+        if item is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={
+                    "error": "NotFound",
+                    "message": f"Item {item_id} not found.",
+                    "code": 404
+                }
+            )
+        matches = similar_index.similar(item_id, limit, text=(item.name, item.description))
+    if not matches:
+        return []
+    # Rows come from Postgres, so they are current; items deleted elsewhere drop out
+    rows = db.execute(lookup_statement(True, False, False), {"ids": [i for i, _ in matches]}).scalars().all()
+    by_id = {row.id: row for row in rows}
+    return [{"score": score, "item": by_id[i]} for i, score in matches if i in by_id]
+
+
 @app.put(
     "/items/{item_id}",
     response_model=schemas.Item,
@@ -154,42 +877,25 @@ def read_item(item_id: int, db: Session = Depends(get_db)):
             "model": schemas.ErrorResponse,
             "description": "Conflict – unique constraint violation"
         },
+        412: {
+            "model": schemas.ErrorResponse,
+            "description": "If-Match does not match the current version"
+        },
         422: {
             "description": "Validation Error"
         }
     }
 )
+@query_budget(statements=2, rows=1)
 def update_item(
     item_id: int,
     updated_item: schemas.ItemCreate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    item = db.query(models.Item).filter(models.Item.id == item_id).first()
-    if not item:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={
-                "error": "NotFound",
-                "message": f"Item {item_id} not found.",
-                "code": 404
-            }
-        )
-
-    for key, value in updated_item.model_dump().items():
-        setattr(item, key, value)
-    try:
-        db.commit()
-        db.refresh(item)
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail={
-                "error": "UniqueViolation",
-                "message": "Email or special_id already exists.",
-                "code": 409
-            }
-        )
+    item = _write_item(db, item_id, updated_item.model_dump(), if_match)
+    response.headers["ETag"] = _etag(item)
     return item
 
 
@@ -206,43 +912,25 @@ def update_item(
             "model": schemas.ErrorResponse,
             "description": "Conflict – unique constraint violation"
         },
+        412: {
+            "model": schemas.ErrorResponse,
+            "description": "If-Match does not match the current version"
+        },
         422: {
             "description": "Validation Error"
         }
     }
 )
+@query_budget(statements=2, rows=1)
 def partial_update_item(
     item_id: int,
     updates: schemas.ItemUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    item = db.query(models.Item).filter(models.Item.id == item_id).first()
-    if not item:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={
-                "error": "NotFound",
-                "message": f"Item {item_id} not found.",
-                "code": 404
-            }
-        )
-
-    update_data = updates.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(item, key, value)
-    try:
-        db.commit()
-        db.refresh(item)
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail={
-                "error": "UniqueViolation",
-                "message": "Email or special_id already exists.",
-                "code": 409
-            }
-        )
+    item = _write_item(db, item_id, updates.model_dump(exclude_unset=True), if_match)
+    response.headers["ETag"] = _etag(item)
     return item
 
 
@@ -254,12 +942,28 @@ def partial_update_item(
         404: {
             "model": schemas.ErrorResponse,
             "description": "Item not found"
+        },
+        412: {
+            "model": schemas.ErrorResponse,
+            "description": "If-Match does not match the current version"
         }
     }
 )
-def delete_item(item_id: int, db: Session = Depends(get_db)):
-    item = db.query(models.Item).filter(models.Item.id == item_id).first()
-    if not item:
+@query_budget(statements=2, rows=1)
+def delete_item(
+    item_id: int,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    versions = parse_if_match(if_match)
+    if getattr(db, "shard_set", None) is None:
+        deleted = delete_item_if_match(db, item_id, versions)
+        item = None if deleted else get_item(db, item_id)
+    else:
+        item = get_item(db, item_id)
+        deleted = False
+    if not deleted and item is None:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail={
@@ -268,11 +972,38 @@ def delete_item(item_id: int, db: Session = Depends(get_db)):
                 "code": 404
             }
         )
-    db.delete(item)
-    db.commit()
+    if not deleted:
+        if versions is not None and item.version not in versions:
+            db.rollback()
+            raise _precondition_failed(item_id)
+        db.delete(item)
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise _precondition_failed(item_id)
+    _notify(deleted_ids=[item_id])
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    include_in_schema=False,
+    dependencies=[Depends(require_metrics_access)],
+)
+def metrics():
+    return render_metrics()
+
+
+@app.exception_handler(ShardKeyChangeError)
+async def shard_key_change_handler(request: Request, exc: ShardKeyChangeError):
+    return JSONResponse(
+        status_code=422,
+        content={"error": "ShardKeyChange", "message": str(exc), "code": 422},
+    )
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     # If detail is a dict, return it as the root JSON; else fall back to {"detail": ...}
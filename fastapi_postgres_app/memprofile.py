@@ -0,0 +1,311 @@
+# fastapi_postgres_app/memprofile.py
+
+"""
+tracemalloc-based memory profiling, for finding what keeps worker RSS growing.
+
+Off by default. With MEMORY_PROFILING_ENABLED=true the /admin/memory
+endpoints (full_access) can start and stop tracing in the worker that
+serves them, take snapshots and diff two of them by file and line. While
+tracing, 1 in MEMORY_PROFILING_SAMPLE_RATE requests records its peak and
+retained allocation, listed under /admin/memory/requests.
+
+Tracing slows allocation-heavy code and uses memory itself, so it is
+bounded: it stops on its own after MEMORY_TRACE_MAX_SECONDS or once
+tracemalloc's own overhead passes MEMORY_TRACE_MAX_OVERHEAD_MB (checked on
+every request), at most MEMORY_MAX_SNAPSHOTS snapshots are kept (the oldest
+is dropped) and each keeps only per-line totals, not the traces.
+
+tracemalloc is process-wide: a sampled request's peak includes whatever
+concurrent requests allocated meanwhile (only one is measured at a time),
+and with several workers each traces only itself.
+"""
+
+import os
+import random
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from fastapi_postgres_app.deps import require_full_access
+
+MEMORY_PROFILING_ENABLED = os.getenv("MEMORY_PROFILING_ENABLED", "false").lower() == "true"
+MEMORY_PROFILING_SAMPLE_RATE = int(os.getenv("MEMORY_PROFILING_SAMPLE_RATE", "10"))  # 0 = none
+MEMORY_TRACE_MAX_SECONDS = float(os.getenv("MEMORY_TRACE_MAX_SECONDS", "300"))
+MEMORY_TRACE_MAX_OVERHEAD_MB = float(os.getenv("MEMORY_TRACE_MAX_OVERHEAD_MB", "256"))
+MEMORY_MAX_SNAPSHOTS = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "5"))
+MEMORY_MAX_REQUEST_RECORDS = 100
+MEMORY_MAX_LINES = 100  # per snapshot summary or diff response
+
+# Allocations made by tracemalloc and the import machinery are noise
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+LineKey = Tuple[str, int]
+
+
+class LineSnapshot:
+    """Allocated size and block count per (file, line) at one moment."""
+
+    def __init__(self, snapshot_id: int, lines: Dict[LineKey, Tuple[int, int]]):
+        self.id = snapshot_id
+        self.taken_at = datetime.now(timezone.utc)
+        self.lines = lines
+        self.size = sum(size for size, _ in lines.values())
+        self.count = sum(count for _, count in lines.values())
+
+    @classmethod
+    def take(cls, snapshot_id: int) -> "LineSnapshot":
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        lines = {
+            (stat.traceback[0].filename, stat.traceback[0].lineno): (stat.size, stat.count)
+            for stat in snapshot.statistics("lineno")
+        }
+        return cls(snapshot_id, lines)
+
+    def summary(self, limit: int) -> dict:
+        top = sorted(self.lines.items(), key=lambda line: line[1][0], reverse=True)[:limit]
+        return {
+            "id": self.id,
+            "taken_at": self.taken_at,
+            "size": self.size,
+            "count": self.count,
+            "top": [
+                {"file": filename, "line": lineno, "size": size, "count": count}
+                for (filename, lineno), (size, count) in top
+            ],
+        }
+
+
+def diff_snapshots(base: LineSnapshot, target: LineSnapshot, limit: int) -> dict:
+    """Per-line growth from base to target, largest change (either way) first."""
+    changes = []
+    for key in base.lines.keys() | target.lines.keys():
+        base_size, base_count = base.lines.get(key, (0, 0))
+        size, count = target.lines.get(key, (0, 0))
+        if size != base_size or count != base_count:
+            changes.append((key, size, size - base_size, count, count - base_count))
+    changes.sort(key=lambda change: abs(change[2]), reverse=True)
+    return {
+        "base": base.id,
+        "target": target.id,
+        "size_diff": target.size - base.size,
+        "count_diff": target.count - base.count,
+        "lines": [
+            {
+                "file": filename, "line": lineno,
+                "size": size, "size_diff": size_diff,
+                "count": count, "count_diff": count_diff,
+            }
+            for (filename, lineno), size, size_diff, count, count_diff in changes[:limit]
+        ],
+    }
+
+
+class MemoryProfiler:
+    def __init__(
+        self,
+        max_seconds: float = MEMORY_TRACE_MAX_SECONDS,
+        max_overhead_mb: float = MEMORY_TRACE_MAX_OVERHEAD_MB,
+        max_snapshots: int = MEMORY_MAX_SNAPSHOTS,
+        max_records: int = MEMORY_MAX_REQUEST_RECORDS,
+    ):
+        self.max_seconds = max_seconds
+        self.max_overhead = int(max_overhead_mb * 1024 * 1024)
+        self.max_snapshots = max_snapshots
+        self.snapshots: "OrderedDict[int, LineSnapshot]" = OrderedDict()
+        self.requests = deque(maxlen=max_records)
+        self.stops_at: Optional[float] = None
+        self.stopped_reason: Optional[str] = None
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._measuring = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, seconds: Optional[float] = None) -> None:
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self.stops_at = time.monotonic() + seconds
+            self.stopped_reason = None
+
+    def stop(self, reason: str = "stopped") -> None:
+        with self._lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+                self.stopped_reason = reason
+            self.stops_at = None
+
+    def check_limits(self) -> None:
+        """Stop tracing once it has run too long or costs too much memory."""
+        if not tracemalloc.is_tracing():
+            return
+        if self.stops_at is not None and time.monotonic() >= self.stops_at:
+            self.stop("time limit")
+        elif tracemalloc.get_tracemalloc_memory() > self.max_overhead:
+            self.stop("overhead limit")
+
+    def take_snapshot(self) -> LineSnapshot:
+        with self._lock:
+            snapshot_id, self._next_id = self._next_id, self._next_id + 1
+        snapshot = LineSnapshot.take(snapshot_id)
+        with self._lock:
+            self.snapshots[snapshot_id] = snapshot
+            while len(self.snapshots) > self.max_snapshots:
+                self.snapshots.popitem(last=False)
+        return snapshot
+
+    @contextmanager
+    def measure(self) -> Iterator[Optional[dict]]:
+        """Record peak and retained allocation of the enclosed work, if free to."""
+        if not tracemalloc.is_tracing() or not self._measuring.acquire(blocking=False):
+            yield None
+            return
+        try:
+            record = {"at": datetime.now(timezone.utc)}
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            yield record
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                record["peak_size"] = peak - before
+                record["retained_size"] = current - before
+                self.requests.appendleft(record)
+        finally:
+            self._measuring.release()
+
+    def status(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "traced_size": current,
+            "traced_peak": peak,
+            "overhead": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            "stops_in": max(self.stops_at - time.monotonic(), 0) if tracing and self.stops_at else None,
+            "stopped_reason": self.stopped_reason,
+            "snapshots": [
+                {"id": s.id, "taken_at": s.taken_at, "size": s.size, "count": s.count}
+                for s in self.snapshots.values()
+            ],
+        }
+
+
+profiler = MemoryProfiler()
+
+
+class MemoryProfilingMiddleware:
+    def __init__(self, app: ASGIApp, sample_rate: int = MEMORY_PROFILING_SAMPLE_RATE, memory_profiler=None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.profiler = memory_profiler or profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.profiler.tracing:
+            await self.app(scope, receive, send)
+            return
+        self.profiler.check_limits()
+        if self.sample_rate <= 0 or random.randrange(self.sample_rate) != 0:
+            await self.app(scope, receive, send)
+            return
+
+        response_status = {}
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_status["status"] = message["status"]
+            await send(message)
+
+        with self.profiler.measure() as record:
+            await self.app(scope, receive, send_with_status)
+            if record is not None:
+                record.update(method=scope["method"], path=scope["path"], status=response_status.get("status"))
+
+
+router = APIRouter(
+    prefix="/admin/memory",
+    tags=["admin"],
+    dependencies=[Depends(require_full_access)],
+)
+
+
+def _not_tracing() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={
+            "error": "NotTracing",
+            "message": "Start tracing with POST /admin/memory/start first.",
+            "code": 409
+        }
+    )
+
+
+def _snapshot_or_404(snapshot_id: int) -> LineSnapshot:
+    snapshot = profiler.snapshots.get(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error": "NotFound",
+                "message": f"Snapshot {snapshot_id} not found; only the last {profiler.max_snapshots} are kept.",
+                "code": 404
+            }
+        )
+    return snapshot
+
+
+@router.get("/")
+def memory_status():
+    profiler.check_limits()
+    return profiler.status()
+
+
+@router.post("/start")
+def start_tracing(
+    seconds: Optional[float] = Query(None, gt=0, description="Capped at MEMORY_TRACE_MAX_SECONDS"),
+):
+    profiler.start(seconds)
+    return profiler.status()
+
+
+@router.post("/stop")
+def stop_tracing():
+    profiler.stop()
+    return profiler.status()
+
+
+@router.post("/snapshots", status_code=status.HTTP_201_CREATED)
+def take_snapshot(limit: int = Query(20, ge=1, le=MEMORY_MAX_LINES)):
+    profiler.check_limits()
+    if not profiler.tracing:
+        raise _not_tracing()
+    return profiler.take_snapshot().summary(limit)
+
+
+@router.get("/snapshots/{snapshot_id}")
+def read_snapshot(snapshot_id: int, limit: int = Query(20, ge=1, le=MEMORY_MAX_LINES)):
+    return _snapshot_or_404(snapshot_id).summary(limit)
+
+
+@router.get("/diff")
+def diff(base: int, target: int, limit: int = Query(20, ge=1, le=MEMORY_MAX_LINES)):
+    return diff_snapshots(_snapshot_or_404(base), _snapshot_or_404(target), limit)
+
+
+@router.get("/requests")
+def sampled_requests():
+    return list(profiler.requests)
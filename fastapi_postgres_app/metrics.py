@@ -0,0 +1,300 @@
+# fastapi_postgres_app/metrics.py
+
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Shared by the worker processes of one node (see serve.py); unset = per process
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def state(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total: Dict[LabelKey, float], state: Dict[LabelKey, float]) -> None:
+        for key, value in state.items():
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, state=None) -> Iterable[Tuple[str, LabelKey, Dict[str, str], float]]:
+        for key, value in (self.state() if state is None else state).items():
+            yield self.name, key, {}, value
+
+
+class Histogram:
+    """Cumulative bucket histogram with running sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets: List[float] = sorted(buckets) + [float("inf")]
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # one slot per bucket, then sum, then count
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def state(self) -> Dict[LabelKey, List[float]]:
+        with self._lock:
+            return {k: list(v) for k, v in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict[LabelKey, List[float]], state: Dict[LabelKey, List[float]]) -> None:
+        for key, values in state.items():
+            current = total.get(key)
+            total[key] = list(values) if current is None else [a + b for a, b in zip(current, values)]
+
+    def samples(self, state=None) -> Iterable[Tuple[str, LabelKey, Dict[str, str], float]]:
+        for key, values in (self.state() if state is None else state).items():
+            for bound, count in zip(self.buckets, values):
+                yield f"{self.name}_bucket", key, {"le": _format_value(bound)}, count
+            yield f"{self.name}_sum", key, {}, values[-2]
+            yield f"{self.name}_count", key, {}, values[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Iterable[float]) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def collect(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def state(self) -> Dict[str, dict]:
+        return {metric.name: metric.state() for metric in self.collect()}
+
+    def render(self, states: Optional[Dict[str, dict]] = None) -> str:
+        """
+        Render every metric in the Prometheus text exposition format, from
+        `states` (as returned by state(), e.g. merged across processes) when
+        given.
+        """
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            state = None if states is None else states.get(metric.name, {})
+            for sample_name, key, extra, value in metric.samples(state):
+                lines.append(f"{sample_name}{_format_labels(key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class FileCollector:
+    """
+    Combines the registries of several worker processes through files.
+
+    Every process writes its state to <dir>/<pid>-<token>.json every flush_seconds
+    (and right before rendering); render() sums all files. When a worker
+    exits, the supervisor folds its file into archive.json so counters never
+    go backwards. A worker killed hard loses at most flush_seconds of updates.
+    """
+
+    ARCHIVE = "archive.json"
+
+    def __init__(self, registry: Registry, directory: str, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        self.registry = registry
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._filename = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def filename(self) -> str:
+        # A new name after fork; the token keeps a reused pid from colliding
+        # with an archived file
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._filename = f"{self._pid}-{uuid.uuid4().hex[:8]}.json"
+        return self._filename
+
+    def start(self) -> None:
+        if self.flush_seconds > 0:
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Could not write metrics to %s", self.directory)
+
+    def flush(self) -> None:
+        """Write this process's state atomically."""
+        _write_json(os.path.join(self.directory, self.filename), _encode(self.registry.state()))
+
+    def _merge(self, totals: Dict[str, dict], data: dict) -> None:
+        metrics = {metric.name: metric for metric in self.registry.collect()}
+        for name, entries in data.items():
+            metric = metrics.get(name)
+            if metric is not None:
+                state = {tuple(map(tuple, key)): value for key, value in entries}
+                metric.merge(totals.setdefault(name, {}), state)
+
+    def _load_archive(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, self.ARCHIVE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"files": [], "metrics": {}}
+
+    def collect(self) -> Dict[str, dict]:
+        """Summed state of every live and archived process."""
+        for _ in range(3):
+            # List first: a worker archived after this point is either still
+            # listed in archive.json's files or its file is gone (then retry).
+            # Files are removed before the next archive() starts, so only the
+            # latest one's names need listing.
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json") and n != self.ARCHIVE]
+            archive = self._load_archive()
+            archived = set(archive["files"])
+            totals: Dict[str, dict] = {}
+            self._merge(totals, archive["metrics"])
+            try:
+                for name in names:
+                    if name not in archived:
+                        with open(os.path.join(self.directory, name)) as f:
+                            self._merge(totals, json.load(f))
+            except FileNotFoundError:
+                continue
+            return totals
+        return totals
+
+    def render(self) -> str:
+        self.flush()
+        return self.registry.render(self.collect())
+
+    def archive(self, pid: int) -> None:
+        """Fold an exited process's file into archive.json (supervisor only)."""
+        names = [n for n in os.listdir(self.directory) if n.startswith(f"{pid}-") and n.endswith(".json")]
+        if not names:
+            return
+        archive = self._load_archive()
+        totals: Dict[str, dict] = {}
+        self._merge(totals, archive["metrics"])
+        for name in names:
+            with open(os.path.join(self.directory, name)) as f:
+                self._merge(totals, json.load(f))
+        # Only this call's names: earlier archived files are already deleted
+        _write_json(os.path.join(self.directory, self.ARCHIVE), {
+            "files": names,
+            "metrics": _encode(totals),
+        })
+        for name in names:
+            os.remove(os.path.join(self.directory, name))
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith((".json", ".tmp")):
+                os.remove(os.path.join(self.directory, name))
+
+
+def _encode(states: Dict[str, dict]) -> dict:
+    # JSON has no tuple keys: each series becomes [[[label, value], ...], state]
+    return {
+        name: [[list(map(list, key)), value] for key, value in state.items()]
+        for name, state in states.items()
+    }
+
+
+def _write_json(path: str, data) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+# Process-wide registry rendered by GET /metrics
+REGISTRY = Registry()
+
+# Whole-node view when worker processes share METRICS_DIR
+COLLECTOR = FileCollector(REGISTRY, METRICS_DIR) if METRICS_DIR else None
+
+
+def render() -> str:
+    return COLLECTOR.render() if COLLECTOR is not None else REGISTRY.render()
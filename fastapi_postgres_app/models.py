@@ -1,5 +1,6 @@
 from enum import Enum
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func
+from sqlalchemy import BigInteger, Column, Integer, LargeBinary, String, Boolean, DateTime, Index, func, text
+from sqlalchemy.dialects.postgresql import JSONB
 from fastapi_postgres_app.database import Base
 
 class Item(Base):
@@ -21,6 +22,65 @@ class Item(Base):
     email      = Column(String, unique=True, nullable=False)
     special_id = Column(Integer, unique=True, nullable=False)
 
+    # Bumped on every write and exposed as the ETag; ORM flushes check it
+    # (UPDATE/DELETE ... WHERE version = :old), If-Match writes compare it
+    version = Column(Integer, nullable=False, server_default=text("1"))
+
+    __table_args__ = (
+        # created_at follows insertion order, so a BRIN index stays tiny
+        # and still narrows time-range scans to the matching block ranges
+        Index("ix_items_created_at_brin", "created_at", postgresql_using="brin"),
+        # Serve ?sort= with an ordered index scan that stops at LIMIT;
+        # id is the tiebreaker parse_sort() appends to every ordering
+        Index("ix_items_available_price_id", "available", "price", "id"),
+        Index("ix_items_price_id", "price", "id"),
+        Index("ix_items_created_at_id", "created_at", "id"),
+        # Prefix search for /items/suggest: byte-wise ("C") ordering turns
+        # a prefix into a range that an ordered index scan can serve
+        Index("ix_items_name_lower_c", func.lower(name).collate("C"), id),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+
+class ItemEmailDirectory(Base):
+    """Which shard owns an email; only used when SHARD_URLS is set."""
+    __tablename__ = "item_email_directory"
+
+    email    = Column(String, primary_key=True)
+    shard_id = Column(Integer, nullable=False)
+
+
+class ImportJob(Base):
+    """Progress of a background bulk import; see fastapi_postgres_app/imports.py."""
+    __tablename__ = "import_jobs"
+
+    id             = Column(String(32), primary_key=True)
+    status         = Column(String, nullable=False, default="queued")
+    filename       = Column(String)
+    format         = Column(String, nullable=False)
+    bytes_total    = Column(BigInteger, nullable=False, default=0)
+    bytes_read     = Column(BigInteger, nullable=False, default=0)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    rows_imported  = Column(Integer, nullable=False, default=0)
+    rows_rejected  = Column(Integer, nullable=False, default=0)
+    error          = Column(String)
+    created_at     = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at     = Column(DateTime(timezone=True))
+    finished_at    = Column(DateTime(timezone=True))
+
+
+class IdempotencyKey(Base):
+    """Stored response of a POST /items/ sent with an Idempotency-Key; see idempotency.py."""
+    __tablename__ = "idempotency_keys"
+
+    key          = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code  = Column(Integer)
+    headers      = Column(JSONB)
+    body         = Column(LargeBinary)
+    created_at   = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at   = Column(DateTime(timezone=True), nullable=False, index=True)
+
 
 class Permission(str, Enum):
     read_only   = "read_only"
@@ -0,0 +1,203 @@
+# fastapi_postgres_app/online_migrations.py
+
+"""
+Helpers for schema changes that must run while the app keeps serving.
+
+Inside an Alembic migration:
+
+    from fastapi_postgres_app.online_migrations import backfill_in_batches, create_index_concurrently
+
+    def upgrade():
+        op.add_column("items", sa.Column("slug", sa.String()))   # no rewrite
+        create_index_concurrently("ix_items_slug", "items", "slug")
+        backfill_in_batches("items_slug", "items", "slug = lower(name)", where="slug IS NULL")
+
+create_index_concurrently() builds the index with CREATE INDEX CONCURRENTLY
+outside the migration transaction, so writers are never blocked. On a
+partitioned table it builds each partition's index concurrently and
+attaches them to an index created ON ONLY the parent.
+
+backfill_in_batches() updates id ranges of `batch_size` rows, each in its
+own short transaction, pausing between batches. Progress is stored in
+migration_backfills in the same statement as each batch, so an interrupted
+backfill resumes where it stopped when the migration is run again. Rows
+inserted after the backfill starts are not visited; give new columns a
+default or have the app write them before backfilling.
+
+Both use autocommit blocks, so env.py runs each migration in its own
+transaction (transaction_per_migration).
+"""
+
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+BACKFILL_TABLE = "migration_backfills"
+
+
+def _partitions(conn: Connection, table: str) -> List[str]:
+    return list(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+    ), {"table": table}).scalars())
+
+
+def _is_partitioned(conn: Connection, table: str) -> bool:
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+    ).scalar()
+    return relkind == "p"
+
+
+def _index_valid(conn: Connection, name: str) -> Optional[bool]:
+    """True/False for an existing index, None when it does not exist."""
+    return conn.execute(text(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"
+    ), {"name": name}).scalar()
+
+
+def _build_concurrently(conn: Connection, name: str, table: str, definition: str) -> None:
+    # A failed CONCURRENTLY build leaves an INVALID index behind; IF NOT
+    # EXISTS would keep it, so drop it and start over
+    if _index_valid(conn, name) is False:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text(f"CREATE {definition.format(name=name, table=table, concurrently='CONCURRENTLY ')}"))
+
+
+def create_index_online(
+    conn: Connection,
+    name: str,
+    table: str,
+    columns: str,
+    unique: bool = False,
+    using: Optional[str] = None,
+    where: Optional[str] = None,
+) -> None:
+    """
+    Build an index without blocking writes. `conn` must be in autocommit
+    mode; `columns` is the SQL inside the parentheses, e.g. "price, id" or
+    '(lower(name) COLLATE "C"), id'.
+    """
+    definition = (
+        ("UNIQUE " if unique else "") + "INDEX {concurrently}IF NOT EXISTS {name} ON {table}"
+        + (f" USING {using}" if using else "") + f" ({columns})"
+        + (f" WHERE {where}" if where else "")
+    )
+    if not _is_partitioned(conn, table):
+        _build_concurrently(conn, name, table, definition)
+        return
+
+    # Partitioned tables reject CONCURRENTLY: create the parent index ON ONLY
+    # (invalid, no lock on partitions), build each partition's index
+    # concurrently, then attach them; the parent turns valid with the last one
+    if _index_valid(conn, name):
+        return
+    parent = definition.replace("ON {table}", "ON ONLY {table}")
+    conn.execute(text(f"CREATE {parent.format(name=name, table=table, concurrently='')}"))
+    for partition in _partitions(conn, table):
+        partition_index = f"{partition}_{name}"[:63]
+        _build_concurrently(conn, partition_index, partition, definition)
+        attached = conn.execute(text(
+            "SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:child) AND inhparent = to_regclass(:parent)"
+        ), {"child": partition_index, "parent": name}).scalar()
+        if not attached:
+            conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}"))
+
+
+def drop_index_online(conn: Connection, name: str) -> None:
+    # DROP INDEX CONCURRENTLY is not allowed for partitioned indexes
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    concurrently = "" if relkind == "I" else "CONCURRENTLY "
+    conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+
+
+def _print_progress(name: str, last_id: int, max_id: int, rows: int, rate: float) -> None:
+    percent = 100.0 * last_id / max_id if max_id else 100.0
+    print(f"backfill {name}: id {min(last_id, max_id)}/{max_id} ({percent:.1f}%), "
+          f"{rows} rows updated, {rate:.0f} rows/s", flush=True)
+
+
+def run_backfill(
+    conn: Connection,
+    name: str,
+    table: str,
+    set_clause: str,
+    where: Optional[str] = None,
+    batch_size: int = 10_000,
+    pause: float = 0.1,
+    progress: Callable[[str, int, int, int, float], None] = _print_progress,
+) -> int:
+    """
+    UPDATE `table` SET `set_clause` [WHERE `where`] in id ranges of
+    `batch_size`, resuming from migration_backfills. `conn` must be in
+    autocommit mode. Returns the number of rows updated so far.
+    """
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {BACKFILL_TABLE} ("
+        " name text PRIMARY KEY, last_id bigint NOT NULL, max_id bigint NOT NULL,"
+        " rows_updated bigint NOT NULL DEFAULT 0, started_at timestamptz NOT NULL DEFAULT now(),"
+        " updated_at timestamptz NOT NULL DEFAULT now(), finished_at timestamptz)"
+    ))
+    # The upper bound is fixed on the first run; later rows are not visited
+    conn.execute(text(
+        f"INSERT INTO {BACKFILL_TABLE} (name, last_id, max_id) "
+        f"SELECT :name, coalesce(min(id), 1) - 1, coalesce(max(id), 0) FROM {table} "
+        "ON CONFLICT (name) DO NOTHING"
+    ), {"name": name})
+    state = conn.execute(text(
+        f"SELECT last_id, max_id, rows_updated, finished_at FROM {BACKFILL_TABLE} WHERE name = :name"
+    ), {"name": name}).one()
+    last_id, max_id, rows = state.last_id, state.max_id, state.rows_updated
+    if state.finished_at is not None:
+        return rows
+
+    # Batch and bookkeeping in one statement: both commit or neither does
+    step = text(
+        f"WITH batch AS ("
+        f" UPDATE {table} SET {set_clause} WHERE id > :low AND id <= :high"
+        + (f" AND ({where})" if where else "") +
+        " RETURNING 1)"
+        f" UPDATE {BACKFILL_TABLE} SET last_id = :high, updated_at = now(),"
+        " rows_updated = rows_updated + (SELECT count(*) FROM batch)"
+        " WHERE name = :name RETURNING rows_updated"
+    )
+    started, done_at_start = time.monotonic(), rows
+    while last_id < max_id:
+        high = min(last_id + batch_size, max_id)
+        rows = conn.execute(step, {"low": last_id, "high": high, "name": name}).scalar()
+        last_id = high
+        elapsed = time.monotonic() - started
+        if progress:
+            progress(name, last_id, max_id, rows, (rows - done_at_start) / elapsed if elapsed else 0.0)
+        if pause and last_id < max_id:
+            time.sleep(pause)
+
+    conn.execute(text(f"UPDATE {BACKFILL_TABLE} SET finished_at = now() WHERE name = :name"), {"name": name})
+    return rows
+
+
+# --- Alembic wrappers ---
+
+def create_index_concurrently(name: str, table: str, columns: str, **kwargs) -> None:
+    from alembic import op
+
+    with op.get_context().autocommit_block():
+        create_index_online(op.get_bind(), name, table, columns, **kwargs)
+
+
+def drop_index_concurrently(name: str) -> None:
+    from alembic import op
+
+    with op.get_context().autocommit_block():
+        drop_index_online(op.get_bind(), name)
+
+
+def backfill_in_batches(name: str, table: str, set_clause: str, **kwargs) -> int:
+    from alembic import op
+
+    with op.get_context().autocommit_block():
+        return run_backfill(op.get_bind(), name, table, set_clause, **kwargs)
@@ -0,0 +1,260 @@
+# fastapi_postgres_app/partitions.py
+
+"""
+Monthly range partitioning of the items table on created_at.
+
+Optional, for large deployments. Once converted, time-bounded queries only
+touch the partitions they need and old months can be detached cheaply.
+
+    python -m fastapi_postgres_app.partitions convert
+    python -m fastapi_postgres_app.partitions ensure --months-ahead 3
+    python -m fastapi_postgres_app.partitions detach --before 2025-01
+
+Postgres requires every unique constraint on a partitioned table to include
+the partition key. The primary key therefore becomes (id, created_at), and
+email/special_id uniqueness moves to the item_keys table, which a trigger
+keeps up to date. Violations still raise unique_violation (23505), so the
+API keeps answering 409. ON CONFLICT upserts need the global unique indexes,
+so /items/upsert answers 501 on a partitioned table. Plain (email) and
+(special_id) indexes keep lookups by those columns from scanning every
+partition.
+
+Rows outside every monthly partition land in items_default. Creating the
+partition for their month later moves them out of it first, so a missed
+`ensure` run does not block that month for good.
+"""
+
+import argparse
+import re
+from datetime import date
+from typing import List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+PARTITION_NAME = re.compile(r"^items_p(\d{4})_(\d{2})$")
+DEFAULT_PARTITION = "items_default"
+
+_KEYS_TRIGGER = """
+CREATE OR REPLACE FUNCTION items_sync_keys() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM item_keys WHERE item_id = OLD.id;
+        RETURN OLD;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO item_keys (item_id, email, special_id)
+        VALUES (NEW.id, NEW.email, NEW.special_id);
+    ELSIF NEW.email IS DISTINCT FROM OLD.email
+          OR NEW.special_id IS DISTINCT FROM OLD.special_id THEN
+        UPDATE item_keys SET email = NEW.email, special_id = NEW.special_id
+        WHERE item_id = NEW.id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER items_sync_keys
+AFTER INSERT OR UPDATE OR DELETE ON items
+FOR EACH ROW EXECUTE FUNCTION items_sync_keys();
+"""
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"items_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass('items')")
+    ).scalar()
+    return relkind == "p"
+
+
+def _exists(conn: Connection, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def create_month_partition(conn: Connection, month: date) -> str:
+    month = month_start(month)
+    name = partition_name(month)
+    if _exists(conn, name):
+        return name
+    bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    in_range = f"created_at >= '{month.isoformat()}' AND created_at < '{add_months(month, 1).isoformat()}'"
+    stranded = _exists(conn, DEFAULT_PARTITION) and conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})")
+    ).scalar()
+    if not stranded:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF items {bounds}"))
+        return name
+
+    # Postgres refuses a partition whose rows are in the default partition:
+    # move them into a plain table and attach that instead
+    conn.execute(text(f"CREATE TABLE {name} (LIKE items INCLUDING DEFAULTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ))
+    conn.execute(text(f"ALTER TABLE items ATTACH PARTITION {name} {bounds}"))
+    # The DELETE trigger released their keys; the rows still hold them
+    conn.execute(text(
+        f"INSERT INTO item_keys (item_id, email, special_id) SELECT id, email, special_id FROM {name}"
+    ))
+    return name
+
+
+def ensure_partitions(conn: Connection, months_ahead: int = 3, today: date = None) -> List[str]:
+    """Create partitions from the current month through `months_ahead` months out."""
+    start = month_start(today or date.today())
+    return [create_month_partition(conn, add_months(start, i)) for i in range(months_ahead + 1)]
+
+
+def list_partitions(conn: Connection) -> List[str]:
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('items') ORDER BY c.relname"
+    )).scalars().all()
+    return list(rows)
+
+
+def detach_partitions_before(conn: Connection, before: date) -> List[str]:
+    """
+    Detach monthly partitions that end on or before `before`. Detached
+    tables keep their data and can be archived or dropped separately.
+    """
+    before = month_start(before)
+    detached = []
+    for name in list_partitions(conn):
+        match = PARTITION_NAME.match(name)
+        if not match:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if add_months(month, 1) > before:
+            continue
+        # Detached rows no longer count towards email/special_id uniqueness
+        conn.execute(text(f"DELETE FROM item_keys k USING {name} p WHERE k.item_id = p.id"))
+        conn.execute(text(f"ALTER TABLE items DETACH PARTITION {name}"))
+        detached.append(name)
+    return detached
+
+
+def _create_indexes(conn: Connection, indexes: Optional[Sequence[str]]) -> None:
+    """Run the given CREATE INDEX statements, or create the model's current indexes."""
+    if indexes is not None:
+        for ddl in indexes:
+            conn.execute(text(ddl))
+        return
+    # Imported lazily so the CLI can run without importing the app
+    from fastapi_postgres_app.models import Item
+
+    for index in Item.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def convert_items_to_partitioned(
+    conn: Connection, months_ahead: int = 3, indexes: Optional[Sequence[str]] = None
+) -> None:
+    """
+    Rebuild items as a table range-partitioned by month on created_at.
+    `indexes` (CREATE INDEX statements) defaults to the model's indexes;
+    migrations pass the set as of their revision.
+    """
+    if is_partitioned(conn):
+        return
+
+    conn.execute(text("ALTER TABLE items RENAME TO items_unpartitioned"))
+    # Keep the id sequence alive when the old table is dropped
+    conn.execute(text("ALTER SEQUENCE items_id_seq OWNED BY NONE"))
+    conn.execute(text(
+        "CREATE TABLE items (LIKE items_unpartitioned INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (created_at)"
+    ))
+
+    first = conn.execute(text("SELECT min(created_at) FROM items_unpartitioned")).scalar()
+    month = month_start(first.date()) if first else month_start(date.today())
+    last = add_months(month_start(date.today()), months_ahead)
+    while month <= last:
+        create_month_partition(conn, month)
+        month = add_months(month, 1)
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF items DEFAULT"))
+
+    conn.execute(text("INSERT INTO items SELECT * FROM items_unpartitioned"))
+    conn.execute(text(
+        "CREATE TABLE item_keys ("
+        " item_id integer PRIMARY KEY,"
+        " email varchar NOT NULL UNIQUE,"
+        " special_id integer NOT NULL UNIQUE)"
+    ))
+    conn.execute(text(
+        "INSERT INTO item_keys (item_id, email, special_id) "
+        "SELECT id, email, special_id FROM items_unpartitioned"
+    ))
+    # Dropping the old table frees its constraint and index names
+    conn.execute(text("DROP TABLE items_unpartitioned"))
+
+    conn.execute(text("ALTER SEQUENCE items_id_seq OWNED BY items.id"))
+    conn.execute(text("ALTER TABLE items ADD CONSTRAINT items_pkey PRIMARY KEY (id, created_at)"))
+    _create_indexes(conn, indexes)
+    # Non-unique stand-ins for the dropped unique constraints' indexes
+    conn.execute(text("CREATE INDEX ix_items_email ON items (email)"))
+    conn.execute(text("CREATE INDEX ix_items_special_id ON items (special_id)"))
+    conn.execute(text(_KEYS_TRIGGER))
+
+
+def revert_items_partitioning(conn: Connection, indexes: Optional[Sequence[str]] = None) -> None:
+    """Inverse of convert_items_to_partitioned: back to a single heap table."""
+    if not is_partitioned(conn):
+        return
+
+    conn.execute(text("ALTER TABLE items RENAME TO items_partitioned"))
+    conn.execute(text("ALTER SEQUENCE items_id_seq OWNED BY NONE"))
+    conn.execute(text("CREATE TABLE items (LIKE items_partitioned INCLUDING DEFAULTS)"))
+    conn.execute(text("INSERT INTO items SELECT * FROM items_partitioned"))
+    conn.execute(text("DROP TABLE items_partitioned CASCADE"))
+    conn.execute(text("DROP TABLE item_keys"))
+    conn.execute(text("DROP FUNCTION IF EXISTS items_sync_keys()"))
+
+    conn.execute(text("ALTER SEQUENCE items_id_seq OWNED BY items.id"))
+    conn.execute(text("ALTER TABLE items ADD CONSTRAINT items_pkey PRIMARY KEY (id)"))
+    conn.execute(text("ALTER TABLE items ADD CONSTRAINT items_email_key UNIQUE (email)"))
+    conn.execute(text("ALTER TABLE items ADD CONSTRAINT items_special_id_key UNIQUE (special_id)"))
+    _create_indexes(conn, indexes)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of the items table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("convert", help="convert items into a partitioned table")
+    ensure = sub.add_parser("ensure", help="create upcoming monthly partitions")
+    ensure.add_argument("--months-ahead", type=int, default=3)
+    detach = sub.add_parser("detach", help="detach partitions older than a month")
+    detach.add_argument("--before", required=True, help="YYYY-MM; partitions ending by then are detached")
+    args = parser.parse_args(argv)
+
+    from fastapi_postgres_app.database import engine
+
+    with engine.begin() as conn:
+        if args.command == "convert":
+            convert_items_to_partitioned(conn)
+            print("items is now partitioned by month on created_at")
+        elif args.command == "ensure":
+            for name in ensure_partitions(conn, args.months_ahead):
+                print(name)
+        else:
+            year, month = (int(part) for part in args.before.split("-"))
+            for name in detach_partitions_before(conn, date(year, month, 1)):
+                print(f"detached {name}")
+
+
+if __name__ == "__main__":
+    main()
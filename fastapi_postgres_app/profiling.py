@@ -0,0 +1,275 @@
+# fastapi_postgres_app/profiling.py
+
+"""
+On-demand sampling profiler for individual requests.
+
+Off by default. When PROFILING_ENABLED=true, a request is profiled if it
+carries `X-Profile: 1` together with a full_access bearer token, or if the
+1-in-PROFILING_SAMPLE_RATE sampler picks it. A background thread samples the
+Python stacks of the busy threads (the event loop plus threadpool workers
+running sync dependencies/handlers) every PROFILING_INTERVAL_MS, so the
+profile covers dependency resolution, validation, SQLAlchemy and
+serialization alike. Results are written as speedscope JSON
+(https://www.speedscope.app) to PROFILING_DIR, which keeps at most
+PROFILING_MAX_FILES files, and are listed under /admin/profiles.
+
+Threads are sampled process-wide, so requests running concurrently with a
+profiled one can show up in its profile; only one profile runs at a time.
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from fastapi_postgres_app.deps import require_full_access
+from fastapi_postgres_app.jwt_utils import verify_access_token
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_SAMPLE_RATE = int(os.getenv("PROFILING_SAMPLE_RATE", "0"))  # 0 = header only
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", os.path.join(tempfile.gettempdir(), "fastapi_profiles"))
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "50"))
+PROFILE_HEADER = "x-profile"
+
+PROFILE_NAME = re.compile(r"^[\w.-]+\.speedscope\.json$")
+
+FrameKey = Tuple[str, str, int]
+
+
+def _is_idle(frame) -> bool:
+    # Idle threadpool workers block in queue.get() -> Condition.wait()
+    code = frame.f_code
+    if code.co_name != "wait" or not code.co_filename.endswith("threading.py"):
+        return False
+    caller = frame.f_back
+    return caller is not None and caller.f_code.co_name == "get" \
+        and caller.f_code.co_filename.endswith("queue.py")
+
+
+class StackSampler:
+    """Samples Python stacks of all busy threads on a background thread."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.frames: List[FrameKey] = []
+        self._frame_index: Dict[FrameKey, int] = {}
+        # thread ident -> (thread name, samples, weights)
+        self.threads: Dict[int, Tuple[str, List[List[int]], List[float]]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.started = 0.0
+        self.duration = 0.0
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _frame_id(self, frame) -> int:
+        code = frame.f_code
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            for ident, frame in sys._current_frames().items():
+                if ident == own or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_id(frame))
+                    frame = frame.f_back
+                stack.reverse()  # speedscope wants root first
+                if ident not in self.threads:
+                    if ident not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    self.threads[ident] = (names.get(ident, str(ident)), [], [])
+                _, samples, weights = self.threads[ident]
+                samples.append(stack)
+                weights.append(weight)
+
+    def to_speedscope(self, name: str) -> dict:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "fastapi_postgres_app.profiling",
+            "shared": {
+                "frames": [
+                    {"name": fn, "file": filename, "line": line}
+                    for fn, filename, line in self.frames
+                ]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread_name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+                for thread_name, samples, weights in self.threads.values()
+            ],
+        }
+
+
+class ProfileStore:
+    """A directory of profile files that never grows past max_files."""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, name: str, profile: dict) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        path.write_text(json.dumps(profile))
+        self._prune()
+        return path
+
+    def _files(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        files = [p for p in self.directory.iterdir() if PROFILE_NAME.match(p.name)]
+        return sorted(files, key=lambda p: p.stat().st_mtime)
+
+    def _prune(self) -> None:
+        files = self._files()
+        for path in files[:max(len(files) - self.max_files, 0)]:
+            path.unlink(missing_ok=True)
+
+    def list(self) -> List[dict]:
+        return [
+            {
+                "name": p.name,
+                "size": p.stat().st_size,
+                "created_at": datetime.fromtimestamp(p.stat().st_mtime, timezone.utc),
+            }
+            for p in reversed(self._files())
+        ]
+
+    def path(self, name: str) -> Optional[Path]:
+        if not PROFILE_NAME.match(name):
+            return None
+        path = self.directory / name
+        return path if path.exists() else None
+
+
+store = ProfileStore(PROFILING_DIR, PROFILING_MAX_FILES)
+
+
+def _is_admin(headers: Headers) -> bool:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        require_full_access(verify_access_token(token))
+    except HTTPException:
+        return False
+    return True
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: int = PROFILING_SAMPLE_RATE,
+        interval_ms: float = PROFILING_INTERVAL_MS,
+        profile_store: ProfileStore = None,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.store = profile_store or store
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope: Scope) -> bool:
+        headers = Headers(scope=scope)
+        if headers.get(PROFILE_HEADER) == "1" and _is_admin(headers):
+            return True
+        return self.sample_rate > 0 and random.randrange(self.sample_rate) == 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        # One profile at a time keeps overhead and cross-talk bounded
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        slug = re.sub(r"[^\w]+", "_", scope["path"]).strip("_") or "root"
+        name = f"{stamp}_{scope['method']}_{slug}.speedscope.json"
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = name
+            await send(message)
+
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            self._busy.release()
+            # Serializing and writing the file would block the event loop
+            await run_in_threadpool(
+                self.store.save, name, sampler.to_speedscope(f"{scope['method']} {scope['path']}")
+            )
+
+
+router = APIRouter(
+    prefix="/admin/profiles",
+    tags=["admin"],
+    dependencies=[Depends(require_full_access)],
+)
+
+
+@router.get("/")
+def list_profiles():
+    return store.list()
+
+
+@router.get("/{name}", response_class=FileResponse)
+def download_profile(name: str):
+    path = store.path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error": "NotFound",
+                "message": f"Profile {name} not found.",
+                "code": 404
+            }
+        )
+    return FileResponse(path, media_type="application/json", filename=name)
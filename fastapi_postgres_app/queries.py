@@ -0,0 +1,258 @@
+# fastapi_postgres_app/queries.py
+
+"""
+Hot-path statements, built once and reused with bound parameters.
+
+Reusing the same statement object lets SQLAlchemy skip both statement
+construction and cache-key generation, and hit its compiled-SQL cache on
+every call. Statements whose shape depends on the request (which filters
+are present, the sort order) are built once per shape and kept in an LRU.
+"""
+
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, String, any_, bindparam, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from fastapi_postgres_app import models
+
+# Columns clients may sort on; anything else is rejected with 422
+SORTABLE_COLUMNS = {
+    "id": models.Item.id,
+    "name": models.Item.name,
+    "price": models.Item.price,
+    "created_at": models.Item.created_at,
+    "special_id": models.Item.special_id,
+}
+MAX_PAGE_SIZE = 1000
+
+# "3", or "3-gzip" as CompressionMiddleware rewrites it
+ETAG = re.compile(r'^"(\d+)(?:-(?:gzip|br|zstd))?"$')
+
+ITEM_BY_ID = select(models.Item).where(models.Item.id == bindparam("item_id"))
+
+
+def get_item(db: Session, item_id: int) -> Optional[models.Item]:
+    return db.execute(ITEM_BY_ID, {"item_id": item_id}).scalar_one_or_none()
+
+
+def parse_if_match(header: Optional[str]) -> Optional[List[int]]:
+    """
+    Versions listed in an If-Match header; None when the write is
+    unconditional (no header, or "*"). Weak or foreign tags never match.
+    Tags of compressed responses ("3-gzip") name the same version.
+    """
+    if header is None or header.strip() == "*":
+        return None
+    versions = []
+    for tag in header.split(","):
+        match = ETAG.match(tag.strip())
+        if match:
+            versions.append(int(match.group(1)))
+    return versions
+
+
+def update_item_if_match(
+    db: Session, item_id: int, values: dict, versions: Optional[List[int]]
+) -> Optional[models.Item]:
+    """
+    Apply `values` and bump the version in one UPDATE ... RETURNING, guarded
+    by the If-Match versions. None means no row matched (missing or stale).
+    An empty `values` changes nothing, so it reads the row without a bump.
+    """
+    stmt = update(models.Item) if values else select(models.Item)
+    stmt = stmt.where(models.Item.id == item_id)
+    if versions is not None:
+        stmt = stmt.where(models.Item.version.in_(versions))
+    if values:
+        stmt = stmt.values(**values, version=models.Item.version + 1).returning(models.Item)
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def delete_item_if_match(db: Session, item_id: int, versions: Optional[List[int]]) -> bool:
+    stmt = delete(models.Item).where(models.Item.id == item_id)
+    if versions is not None:
+        stmt = stmt.where(models.Item.version.in_(versions))
+    return db.execute(stmt.returning(models.Item.id)).first() is not None
+
+
+def sort_keys(sort: str) -> List[Tuple[str, bool]]:
+    """
+    Turn "price,-created_at" into [(column, descending), ...]. id is appended
+    as a tiebreaker in the direction of the last key, so a single index on
+    (..., id) can serve the whole ordering in either direction.
+    """
+    keys = []
+    descending = False
+    for part in sort.split(","):
+        part = part.strip()
+        descending = part.startswith("-")
+        name = part.lstrip("+-")
+        if name not in SORTABLE_COLUMNS or any(name == seen for seen, _ in keys):
+            raise HTTPException(
+                status_code=422,
+                detail={
+                    "error": "InvalidSort",
+                    "message": f"Cannot sort by '{part}'. Allowed: {', '.join(SORTABLE_COLUMNS)}.",
+                    "code": 422
+                }
+            )
+        keys.append((name, descending))
+    if not any(name == "id" for name, _ in keys):
+        keys.append(("id", descending))
+    return keys
+
+
+def parse_sort(sort: str) -> list:
+    """ORDER BY clauses for a sort= value; see sort_keys()."""
+    return [
+        SORTABLE_COLUMNS[name].desc() if descending else SORTABLE_COLUMNS[name].asc()
+        for name, descending in sort_keys(sort)
+    ]
+
+
+def _where_filters(stmt: Select, filters: Tuple[str, ...]) -> Select:
+    if "available" in filters:
+        stmt = stmt.where(models.Item.available == bindparam("available"))
+    if "price_lt" in filters:
+        stmt = stmt.where(models.Item.price < bindparam("price_lt"))
+    if "price_gt" in filters:
+        stmt = stmt.where(models.Item.price > bindparam("price_gt"))
+    if "search" in filters:
+        stmt = stmt.where(
+            models.Item.name.ilike(bindparam("search")) |
+            models.Item.description.ilike(bindparam("search"))
+        )
+    # Half-open range [created_after, created_before)
+    if "created_after" in filters:
+        stmt = stmt.where(models.Item.created_at >= bindparam("created_after"))
+    if "created_before" in filters:
+        stmt = stmt.where(models.Item.created_at < bindparam("created_before"))
+    return stmt
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Naive datetimes are taken as UTC, as the snapshot does, rather than in
+    # the session TimeZone Postgres would otherwise apply
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _filter_params(
+    available: Optional[bool],
+    price_lt: Optional[int],
+    price_gt: Optional[int],
+    search: Optional[str],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime],
+) -> dict:
+    params = {
+        "available": available,
+        "price_lt": price_lt,
+        "price_gt": price_gt,
+        "search": f"%{search}%" if search else None,
+        "created_after": _as_utc(created_after),
+        "created_before": _as_utc(created_before),
+    }
+    return {key: value for key, value in params.items() if value is not None}
+
+
+@lru_cache(maxsize=256)
+def _items_statement(filters: Tuple[str, ...], sort: str, paginated: bool) -> Select:
+    stmt = _where_filters(select(models.Item), filters)
+    stmt = stmt.order_by(*parse_sort(sort))
+    if paginated:
+        stmt = stmt.limit(bindparam("limit", type_=Integer)).offset(bindparam("offset", type_=Integer))
+    return stmt
+
+
+def items_query(
+    available: Optional[bool] = None,
+    price_lt: Optional[int] = None,
+    price_gt: Optional[int] = None,
+    search: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    sort: str = "id",
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> Tuple[Select, dict]:
+    """Return the cached statement for this filter shape plus its parameters."""
+    params = _filter_params(available, price_lt, price_gt, search, created_after, created_before)
+    filters = tuple(params)
+    paginated = limit is not None or offset > 0
+    if paginated:
+        # LIMIT NULL means no limit in Postgres
+        params["limit"] = limit
+        params["offset"] = offset
+    return _items_statement(filters, sort, paginated), params
+
+
+@lru_cache(maxsize=64)
+def _stats_statement(filters: Tuple[str, ...]) -> Select:
+    price = models.Item.price
+    stmt = select(
+        func.count().label("count"),
+        func.count().filter(models.Item.available.is_(True)).label("available_count"),
+        func.count(price).label("price_count"),
+        func.min(price).label("price_min"),
+        func.max(price).label("price_max"),
+        func.sum(price).label("price_sum"),
+    )
+    return _where_filters(stmt, filters)
+
+
+def items_stats_query(
+    available: Optional[bool] = None,
+    price_lt: Optional[int] = None,
+    price_gt: Optional[int] = None,
+    search: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+) -> Tuple[Select, dict]:
+    """Aggregate counterpart of items_query(): one row of counts and price stats."""
+    params = _filter_params(available, price_lt, price_gt, search, created_after, created_before)
+    return _stats_statement(tuple(params)), params
+
+
+def combine_stats(rows) -> dict:
+    """
+    Fold per-shard aggregate rows (or the single unsharded row) into the
+    /items/stats response.
+    """
+    priced = [row for row in rows if row.price_count]
+    count = sum(row.count for row in rows)
+    price_count = sum(row.price_count for row in rows)
+    price_sum = sum(int(row.price_sum) for row in priced) if priced else None
+    return {
+        "count": count,
+        "available_count": sum(row.available_count for row in rows),
+        "price_count": price_count,
+        "price_min": min(row.price_min for row in priced) if priced else None,
+        "price_max": max(row.price_max for row in priced) if priced else None,
+        "price_sum": price_sum,
+        "price_avg": price_sum / price_count if priced else None,
+    }
+
+
+@lru_cache(maxsize=8)
+def lookup_statement(by_id: bool, by_email: bool, by_special_id: bool) -> Select:
+    # Each key list is bound as one array parameter (col = ANY(:arr)),
+    # so every branch of the OR can use its own unique index.
+    conditions = []
+    if by_id:
+        conditions.append(models.Item.id == any_(bindparam("ids", type_=ARRAY(Integer))))
+    if by_email:
+        conditions.append(models.Item.email == any_(bindparam("emails", type_=ARRAY(String))))
+    if by_special_id:
+        conditions.append(
+            models.Item.special_id == any_(bindparam("special_ids", type_=ARRAY(Integer)))
+        )
+    return select(models.Item).where(or_(*conditions))
@@ -0,0 +1,165 @@
+# fastapi_postgres_app/querycount.py
+
+"""
+Per-request SQL statement and row counts, and per-route query budgets.
+
+Every statement SQLAlchemy sends on any engine (the main database and the
+shards) is counted against the request it runs for, found through a
+context variable that follows the request into the threadpool. Rows are
+those returned to the client (SELECT, RETURNING), not rows written.
+
+Routes declare what they may use:
+
+    @app.get("/items/{item_id}")
+    @query_budget(statements=1, rows=1)
+    def read_item(...): ...
+
+Work done in chunks calls count_batch() once per chunk, and the route's
+budget grows by batch_statements / batch_rows for each call:
+
+    @query_budget(statements=1, rows=1, batch_statements=2, batch_rows=2000)
+
+With QUERY_BUDGETS_ENFORCED=true (the test suite sets it) a request that
+runs over its route's budget, or runs any statement on a route without one,
+raises QueryBudgetExceeded, so the test making it fails. Budgets are per
+database: scatter-gather over N shards legitimately runs N statements, so
+sharded tests switch enforcement off.
+
+QUERY_COUNT_HEADER=true (debug mode) adds `X-Query-Count` and
+`X-Query-Rows` to every response.
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("fastapi_postgres_app.querycount")
+
+QUERY_COUNT_HEADER = os.getenv("QUERY_COUNT_HEADER", "false").lower() == "true"
+QUERY_BUDGETS_ENFORCED = os.getenv("QUERY_BUDGETS_ENFORCED", "false").lower() == "true"
+
+
+class QueryBudget(NamedTuple):
+    # None = unbounded, e.g. unpaginated lists
+    statements: Optional[int]
+    rows: Optional[int] = None
+    # Added per count_batch() call
+    batch_statements: int = 0
+    batch_rows: int = 0
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    __slots__ = ("statements", "rows", "batches")
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.batches = 0
+
+
+_current: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter.statements += 1
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_rows(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    # rowcount is -1 for server-side cursors, which are not used per request
+    if counter is not None and cursor.description is not None and cursor.rowcount > 0:
+        counter.rows += cursor.rowcount
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """Count the statements run in this context (and threads it is copied to)."""
+    counter = QueryCounter()
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+
+
+def count_batch() -> None:
+    """Mark the start of one chunk of work, for routes with batch budgets."""
+    counter = _current.get()
+    if counter is not None:
+        counter.batches += 1
+
+
+def query_budget(
+    statements: Optional[int],
+    rows: Optional[int] = None,
+    batch_statements: int = 0,
+    batch_rows: int = 0,
+) -> Callable:
+    """Declare the most statements and fetched rows one request to this route may use."""
+    def decorate(endpoint: Callable) -> Callable:
+        endpoint.query_budget = QueryBudget(statements, rows, batch_statements, batch_rows)
+        return endpoint
+    return decorate
+
+
+def budget_violation(scope: Scope, counter: QueryCounter) -> Optional[str]:
+    route = scope.get("route")
+    name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+    budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+    if budget is None:
+        if counter.statements:
+            return f"{name} ran {counter.statements} statements without a @query_budget"
+        return None
+    if budget.statements is not None:
+        allowed = budget.statements + budget.batch_statements * counter.batches
+        if counter.statements > allowed:
+            return f"{name} ran {counter.statements} statements; its budget is {allowed}"
+    if budget.rows is not None:
+        allowed = budget.rows + budget.batch_rows * counter.batches
+        if counter.rows > allowed:
+            return f"{name} fetched {counter.rows} rows; its budget is {allowed}"
+    return None
+
+
+class QueryCountMiddleware:
+    """Counts each request's queries for the debug header and budget checks."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Read at call time so tests can switch enforcement per fixture
+        if scope["type"] != "http" or not (QUERY_COUNT_HEADER or QUERY_BUDGETS_ENFORCED):
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries() as counter:
+            async def send_with_counts(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    violation = budget_violation(scope, counter)
+                    if violation is not None:
+                        if QUERY_BUDGETS_ENFORCED:
+                            raise QueryBudgetExceeded(violation)
+                        logger.warning(violation)
+                    if QUERY_COUNT_HEADER:
+                        headers = MutableHeaders(scope=message)
+                        headers["X-Query-Count"] = str(counter.statements)
+                        headers["X-Query-Rows"] = str(counter.rows)
+                await send(message)
+
+            await self.app(scope, receive, send_with_counts)
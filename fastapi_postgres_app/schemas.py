@@ -1,7 +1,7 @@
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, model_validator
 
 from fastapi_postgres_app.models import Permission
 
@@ -70,6 +70,7 @@ class ItemCreate(ItemBase):
 class Item(ItemBase):
     id: int
     created_at: Optional[datetime] = None  # Handles legacy nulls
+    version: int = Field(..., json_schema_extra={"example": 1})  # also sent as the ETag
 
     model_config = ConfigDict(
         from_attributes=True,
@@ -83,7 +84,8 @@ class Item(ItemBase):
                 "available": True,
                 "email": "user@example.com",
                 "special_id": 12345,
-                "created_at": "2025-07-12T12:34:56"
+                "created_at": "2025-07-12T12:34:56",
+                "version": 1
             }
         }
     )
@@ -105,6 +107,179 @@ class ItemUpdate(BaseModel):
     special_id: Optional[int] = None
 
 
+# Upper bound on ids + emails + special_ids in one lookup request
+MAX_LOOKUP_KEYS = 1000
+
+
+class ItemLookupRequest(BaseModel):
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
+            "example": {
+                "ids": [1, 2],
+                "emails": ["user@example.com"],
+                "special_ids": [12345]
+            }
+        }
+    )
+
+    ids: List[int] = []
+    emails: List[EmailStr] = []
+    special_ids: List[int] = []
+
+    @model_validator(mode="after")
+    def check_key_count(self):
+        total = len(self.ids) + len(self.emails) + len(self.special_ids)
+        if total == 0:
+            raise ValueError("At least one id, email or special_id is required")
+        if total > MAX_LOOKUP_KEYS:
+            raise ValueError(f"At most {MAX_LOOKUP_KEYS} keys per lookup")
+        return self
+
+
+class LookupResult(BaseModel):
+    found: bool
+    item: Optional[Item] = None
+
+
+class ItemLookupResponse(BaseModel):
+    # Keyed by the requested value; missing keys carry found=false
+    ids: Dict[str, LookupResult] = {}
+    emails: Dict[str, LookupResult] = {}
+    special_ids: Dict[str, LookupResult] = {}
+
+
+# Upper bound on rows in one batch upsert
+MAX_UPSERT_BATCH = 1000
+
+
+class ItemUpsertBatch(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    items: List[ItemCreate] = Field(..., min_length=1, max_length=MAX_UPSERT_BATCH)
+
+
+class UpsertResult(BaseModel):
+    status: Literal["inserted", "updated"]
+    item: Item
+
+
+class ItemSuggestion(BaseModel):
+    id: int
+    name: str
+
+
+class SimilarItem(BaseModel):
+    score: float  # cosine similarity of name + description, 0..1
+    item: Item
+
+
+# Upper bound on explicit ids in one bulk update/delete
+MAX_BULK_IDS = 10000
+
+
+class ItemFilters(BaseModel):
+    """The filters of GET /items/, as a request body."""
+    model_config = ConfigDict(extra="forbid")
+
+    available: Optional[bool] = None
+    price_lt: Optional[int] = None
+    price_gt: Optional[int] = None
+    search: Optional[str] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+
+class ItemBulkSelection(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=MAX_BULK_IDS)
+    filters: Optional[ItemFilters] = None
+    dry_run: bool = False  # only count the matching items
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if (self.ids is None) == (self.filters is None):
+            raise ValueError("Give exactly one of ids or filters")
+        if self.filters is not None and not self.filters.model_dump(exclude_none=True):
+            raise ValueError("filters must set at least one condition")
+        return self
+
+
+class ItemBulkChanges(BaseModel):
+    # email and special_id are unique per item, so they cannot be bulk-set
+    model_config = ConfigDict(extra="forbid")
+
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[int] = Field(None, ge=0)
+    available: Optional[bool] = None
+
+
+class ItemBulkUpdate(ItemBulkSelection):
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
+            "example": {
+                "filters": {"search": "acme", "available": True},
+                "changes": {"available": False},
+                "dry_run": False
+            }
+        }
+    )
+
+    changes: ItemBulkChanges
+
+    @model_validator(mode="after")
+    def check_changes(self):
+        if not self.changes.model_dump(exclude_unset=True):
+            raise ValueError("changes must set at least one field")
+        return self
+
+
+class ItemBulkDelete(ItemBulkSelection):
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={"example": {"ids": [1, 2, 3], "dry_run": True}}
+    )
+
+
+class ItemBulkResult(BaseModel):
+    affected: int  # rows changed, or that would be with dry_run
+    dry_run: bool
+
+
+class ItemStats(BaseModel):
+    count: int
+    available_count: int
+    price_count: int  # items with a non-null price
+    price_min: Optional[int] = None
+    price_max: Optional[int] = None
+    price_sum: Optional[int] = None
+    price_avg: Optional[float] = None
+
+
+class ImportJob(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    filename: Optional[str] = None
+    format: Literal["csv", "ndjson"]
+    bytes_total: int
+    bytes_read: int
+    rows_processed: int
+    rows_imported: int
+    rows_rejected: int
+    progress: float = Field(..., json_schema_extra={"example": 0.42})  # share of the file read
+    rows_per_second: Optional[float] = None
+    rejects_url: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
 class TokenRequest(BaseModel):
     permissions: Permission
     expires_minutes: int
@@ -0,0 +1,354 @@
+# fastapi_postgres_app/serve.py
+
+"""
+Pre-fork production server: one supervisor, N uvicorn worker processes.
+
+    python -m fastapi_postgres_app.serve --host 0.0.0.0 --port 8000 --workers 4
+
+The supervisor binds the listening socket, imports the app once (including
+the snapshot/name index loads) and forks the workers, which share that
+memory copy-on-write and accept from the same socket. Workers that die are
+replaced. Signals to the supervisor:
+
+- SIGTERM / SIGINT: stop accepting, let in-flight requests finish (up to
+  GRACEFUL_TIMEOUT seconds), exit.
+- SIGHUP: rolling restart. Each worker is replaced by a fresh fork once the
+  new one has started, so capacity never drops. Code is not reloaded; the
+  preloaded app is reused.
+
+Settings (flags win over environment):
+
+- WEB_WORKERS: worker count, default one per usable CPU.
+- DB_CONNECTION_BUDGET: connections this node may open per database; each
+  worker gets DB_POOL_SIZE = budget // workers and no overflow. Without it
+  DB_POOL_SIZE / DB_MAX_OVERFLOW apply per worker as usual.
+- METRICS_DIR: where workers publish metrics so /metrics covers the whole
+  node; a temporary directory when unset.
+- WORKER_BOOT_TIMEOUT, GRACEFUL_TIMEOUT: seconds.
+"""
+
+import argparse
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+logger = logging.getLogger("fastapi_postgres_app.serve")
+
+WORKER_BOOT_TIMEOUT = float(os.getenv("WORKER_BOOT_TIMEOUT", "60"))
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# A worker dying sooner than this after its start counts as a crash loop
+MIN_WORKER_LIFETIME = 5.0
+
+
+def default_workers() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not on Linux
+        return os.cpu_count() or 1
+
+
+def pool_size_for(budget: int, workers: int) -> int:
+    per_worker = budget // workers
+    if per_worker < 1:
+        raise ValueError(f"DB_CONNECTION_BUDGET={budget} is less than one connection per worker ({workers})")
+    return per_worker
+
+
+def configure_environment(workers: int) -> Optional[str]:
+    """
+    Set the pool size and metrics directory the workers will read; must run
+    before the app is imported. Returns a temporary METRICS_DIR to remove.
+    """
+    budget = os.getenv("DB_CONNECTION_BUDGET")
+    if budget:
+        os.environ["DB_POOL_SIZE"] = str(pool_size_for(int(budget), workers))
+        os.environ["DB_MAX_OVERFLOW"] = "0"
+    if os.getenv("METRICS_DIR"):
+        return None
+    metrics_dir = tempfile.mkdtemp(prefix="fastapi-metrics-")
+    os.environ["METRICS_DIR"] = metrics_dir
+    return metrics_dir
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def _engines(main):
+    from fastapi_postgres_app.database import engine
+
+    engines = {engine}
+    if main.shard_set is not None:
+        engines.update(main.shard_set.engines.values())
+    return engines
+
+
+def _read_models(main):
+    return [model for model in (main.snapshot, main.suggest_index, main.similar_index) if model is not None]
+
+
+def preload():
+    """Import the app in the supervisor and quiesce it for forking."""
+    from fastapi_postgres_app import main
+    from fastapi_postgres_app.metrics import COLLECTOR
+
+    # Background threads do not survive fork() and a lock held by one would
+    # stay held in the child, so stop them here and restart them per worker
+    for read_model in _read_models(main):
+        read_model.stop()
+    if COLLECTOR is not None:
+        COLLECTOR.stop()
+        COLLECTOR.clear()
+    # Workers must not share the supervisor's connections
+    for engine in _engines(main):
+        engine.dispose()
+    return main
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn.Server that tells the supervisor once it is accepting."""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            try:
+                os.write(self.ready_fd, b"1")
+            except BrokenPipeError:
+                pass  # the supervisor was not waiting for this one
+            os.close(self.ready_fd)
+
+
+def run_worker(main, sock: socket.socket, ready_fd: int, log_level: str) -> None:
+    from fastapi_postgres_app.metrics import COLLECTOR
+
+    signal.set_wakeup_fd(-1)
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+
+    for engine in _engines(main):
+        # Drop the inherited pool without touching the parent's sockets
+        engine.dispose(close=False)
+    for read_model in _read_models(main):
+        read_model.after_fork()
+    if COLLECTOR is not None:
+        COLLECTOR.start()
+
+    server = WorkerServer(uvicorn.Config(main.app, lifespan="on", log_level=log_level), ready_fd)
+
+    supervisor = os.getppid()
+
+    def exit_with_supervisor():
+        while os.getppid() == supervisor:
+            time.sleep(1)
+        server.should_exit = True
+
+    threading.Thread(target=exit_with_supervisor, name="supervisor-watch", daemon=True).start()
+    try:
+        server.run(sockets=[sock])
+    finally:
+        if COLLECTOR is not None:
+            COLLECTOR.stop()
+            COLLECTOR.flush()
+
+
+class Supervisor:
+    def __init__(
+        self,
+        main,
+        sock: socket.socket,
+        workers: int,
+        log_level: str = "info",
+        boot_timeout: float = WORKER_BOOT_TIMEOUT,
+        graceful_timeout: float = GRACEFUL_TIMEOUT,
+    ):
+        self.main = main
+        self.sock = sock
+        self.count = workers
+        self.log_level = log_level
+        self.boot_timeout = boot_timeout
+        self.graceful_timeout = graceful_timeout
+        # pid -> start time of every child not yet reaped
+        self.workers: Dict[int, float] = {}
+        # pid -> SIGKILL deadline of children asked to stop
+        self.retiring: Dict[int, float] = {}
+        self.stopping = False
+        self.restart_requested = False
+
+    # --- signals ---
+
+    def _install_signals(self) -> None:
+        self._wakeup_r, wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(wakeup_w, False)
+        signal.set_wakeup_fd(wakeup_w)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+        # Only to wake the loop; children are reaped there
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    def _on_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _on_restart(self, signum, frame) -> None:
+        self.restart_requested = True
+
+    def _sleep(self, timeout: float) -> None:
+        ready, _, _ = select.select([self._wakeup_r], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self._wakeup_r, 512):
+                    pass
+            except BlockingIOError:
+                pass
+
+    # --- workers ---
+
+    def spawn(self) -> int:
+        """Fork a worker; returns a pipe that yields a byte once it accepts."""
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            code = 0
+            try:
+                run_worker(self.main, self.sock, ready_w, self.log_level)
+            except SystemExit as exc:
+                code = exc.code if isinstance(exc.code, int) else 1
+            except BaseException:
+                logger.exception("Worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(ready_w)
+        self.workers[pid] = time.monotonic()
+        logger.info("Started worker %d", pid)
+        return ready_r
+
+    def wait_ready(self, ready_fd: int) -> bool:
+        try:
+            ready, _, _ = select.select([ready_fd], [], [], self.boot_timeout)
+            return bool(ready) and os.read(ready_fd, 1) == b"1"
+        finally:
+            os.close(ready_fd)
+
+    def retire(self, pid: int, sig: int = signal.SIGTERM) -> None:
+        self.retiring.setdefault(pid, time.monotonic() + self.graceful_timeout)
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def reap(self) -> None:
+        from fastapi_postgres_app.metrics import COLLECTOR
+
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            expected = self.retiring.pop(pid, None) is not None or self.stopping
+            if COLLECTOR is not None:
+                # Keep its counts in the node totals
+                COLLECTOR.archive(pid)
+            if expected:
+                logger.info("Worker %d exited", pid)
+            else:
+                logger.warning("Worker %d died (status %s)", pid, os.waitstatus_to_exitcode(status))
+                if started is not None and time.monotonic() - started < MIN_WORKER_LIFETIME:
+                    # Do not fork-bomb when every worker fails on boot
+                    time.sleep(1)
+
+    def kill_overdue(self) -> None:
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now >= deadline:
+                logger.warning("Worker %d did not stop in time; killing it", pid)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self.retiring[pid] = float("inf")
+
+    def rolling_restart(self) -> None:
+        logger.info("Restarting %d workers", len(self.workers) - len(self.retiring))
+        for pid in [pid for pid in self.workers if pid not in self.retiring]:
+            if self.stopping:
+                return
+            if not self.wait_ready(self.spawn()):
+                logger.error("Replacement worker did not start; keeping worker %d", pid)
+                return
+            self.retire(pid)
+
+    # --- main loop ---
+
+    def run(self) -> None:
+        self._install_signals()
+        boot = [self.spawn() for _ in range(self.count)]
+        started = sum(self.wait_ready(fd) for fd in boot)
+        logger.info("%d of %d workers ready on %s", started, self.count, self.sock.getsockname())
+
+        while not self.stopping:
+            self.reap()
+            self.kill_overdue()
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            while not self.stopping and len(self.workers) - len(self.retiring) < self.count:
+                os.close(self.spawn())
+            self._sleep(1.0)
+
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        logger.info("Stopping %d workers", len(self.workers))
+        for pid in list(self.workers):
+            self.retire(pid)
+        while self.workers:
+            self.reap()
+            self.kill_overdue()
+            if self.workers:
+                self._sleep(0.2)
+        self.sock.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run the API with a pre-forked pool of uvicorn workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "0")) or default_workers())
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+    temporary_metrics_dir = configure_environment(args.workers)
+    sock = bind_socket(args.host, args.port)
+    try:
+        Supervisor(preload(), sock, args.workers, args.log_level).run()
+    finally:
+        if temporary_metrics_dir:
+            shutil.rmtree(temporary_metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# fastapi_postgres_app/sharding.py
+
+"""
+Optional hash sharding of items across several Postgres databases.
+
+Enabled by setting SHARD_URLS to a comma-separated list of database URLs.
+DATABASE_URL stays the "directory" database that holds the email lookup
+table; it may also appear in SHARD_URLS.
+
+Routing:
+- a new item goes to shard hash(special_id) % N;
+- each shard's id sequence hands out ids k+1, k+1+N, ... so an item_id
+  names its shard without a lookup: (item_id - 1) % N;
+- email uniqueness across shards is enforced by item_email_directory on the
+  directory database, reserved before the shard write and released on
+  rollback;
+- queries whose WHERE pins id, special_id or email go to the matching
+  shards only; everything else is scatter-gathered.
+
+    python -m fastapi_postgres_app.sharding prepare
+    python -m fastapi_postgres_app.sharding rebuild-directory
+
+Writes spanning shards are not atomic: each shard commits on its own. The
+shard count is fixed once data exists; changing it means resharding.
+"""
+
+import argparse
+import contextvars
+import hashlib
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cmp_to_key
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import String, any_, bindparam, create_engine, delete, event, inspect, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import (
+    BinaryExpression,
+    BindParameter,
+    BooleanClauseList,
+    CollectionAggregate,
+    Grouping,
+)
+
+from fastapi_postgres_app import models
+from fastapi_postgres_app.database import POOL_OPTIONS
+
+SHARD_URLS = [url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
+
+ROUTING_COLUMNS = ("id", "special_id", "email")
+
+
+class ShardRoutingError(Exception):
+    """Raised when a statement cannot be routed to a shard."""
+
+
+class ShardKeyChangeError(Exception):
+    """special_id is the shard key and cannot change on an existing item."""
+
+
+def shard_for_special_id(special_id: int, count: int) -> int:
+    # Stable across processes and Python versions, unlike hash()
+    digest = hashlib.blake2b(str(special_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def shard_for_id(item_id: int, count: int) -> int:
+    return (item_id - 1) % count
+
+
+def _bound_values(element, params: dict) -> Optional[list]:
+    # Unwrap "= :x" and "= ANY(:x)" down to the bound parameter
+    while isinstance(element, (Grouping, CollectionAggregate)):
+        element = element.element
+    if not isinstance(element, BindParameter):
+        return None
+    value = params.get(element.key, element.value)
+    if value is None:
+        return None
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+class ShardSet:
+    def __init__(self, urls: List[str], directory: Engine):
+        self.engines: Dict[int, Engine] = {
+            shard_id: create_engine(url, pool_pre_ping=True, **POOL_OPTIONS)
+            for shard_id, url in enumerate(urls)
+        }
+        self.count = len(self.engines)
+        self.directory = directory
+        self._pool = ThreadPoolExecutor(max_workers=self.count, thread_name_prefix="shard")
+        self.sessionmaker = sessionmaker(
+            class_=ItemShardedSession,
+            autoflush=False,
+            shard_set=self,
+            shards=self.engines,
+            shard_chooser=self.shard_chooser,
+            identity_chooser=self.identity_chooser,
+            execute_chooser=self.execute_chooser,
+        )
+
+    def prepare(self) -> None:
+        """Create tables and give each shard its own id residue class."""
+        models.ItemEmailDirectory.__table__.create(self.directory, checkfirst=True)
+        for shard_id, engine in self.engines.items():
+            models.Item.__table__.create(engine, checkfirst=True)
+            with engine.begin() as conn:
+                increment = conn.execute(text(
+                    "SELECT increment_by FROM pg_sequences WHERE sequencename = 'items_id_seq'"
+                )).scalar()
+                if increment == self.count:
+                    continue
+                max_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM items")).scalar()
+                next_id = max_id + 1
+                next_id += (shard_id - shard_for_id(next_id, self.count)) % self.count
+                conn.execute(text(
+                    f"ALTER SEQUENCE items_id_seq INCREMENT BY {self.count} RESTART WITH {next_id}"
+                ))
+
+    # --- ShardedSession hooks ---
+
+    def shard_chooser(self, mapper, instance, clause=None, **kw) -> int:
+        if instance is not None and getattr(instance, "special_id", None) is not None:
+            return shard_for_special_id(instance.special_id, self.count)
+        raise ShardRoutingError("Cannot choose a shard without an item or an explicit shard_id")
+
+    def identity_chooser(self, mapper, primary_key, **kw) -> List[int]:
+        return [shard_for_id(primary_key[0], self.count)]
+
+    def execute_chooser(self, orm_context) -> List[int]:
+        if orm_context.is_insert:
+            raise ShardRoutingError("INSERT statements need bind_arguments={'shard_id': ...}")
+        params = orm_context.parameters if isinstance(orm_context.parameters, dict) else {}
+        where = getattr(orm_context.statement, "whereclause", None)
+        shards = self._shards_for(where, params) if where is not None else None
+        if shards is None:
+            return list(self.engines)
+        # Nothing matches anywhere; one shard still has to produce an empty result
+        return sorted(shards) or [0]
+
+    def _shards_for(self, clause, params: dict) -> Optional[Set[int]]:
+        """Shards that can hold rows matching `clause`; None means all of them."""
+        while isinstance(clause, Grouping):
+            clause = clause.element
+        if isinstance(clause, BooleanClauseList):
+            children = [self._shards_for(child, params) for child in clause.clauses]
+            if clause.operator is operators.and_:
+                known = [c for c in children if c is not None]
+                return set.intersection(*known) if known else None
+            if clause.operator is operators.or_:
+                if any(c is None for c in children):
+                    return None
+                return set().union(*children)
+            return None
+        if not isinstance(clause, BinaryExpression) or clause.operator is not operators.eq:
+            return None
+        column = clause.left
+        table = getattr(column, "table", None)
+        if table is None or table.name != models.Item.__tablename__ or column.name not in ROUTING_COLUMNS:
+            return None
+        values = _bound_values(clause.right, params)
+        if values is None:
+            return None
+        if column.name == "id":
+            return {shard_for_id(v, self.count) for v in values}
+        if column.name == "special_id":
+            return {shard_for_special_id(v, self.count) for v in values}
+        return set(self.email_shards(values).values())
+
+    # --- email directory ---
+
+    def email_shards(self, emails: Iterable[str]) -> Dict[str, int]:
+        table = models.ItemEmailDirectory.__table__
+        stmt = select(table.c.email, table.c.shard_id).where(
+            table.c.email == any_(bindparam("emails", type_=ARRAY(String)))
+        )
+        with self.directory.connect() as conn:
+            return dict(conn.execute(stmt, {"emails": list(emails)}).all())
+
+    def reserve_email(self, session, email: str, shard_id: int) -> None:
+        # Raises IntegrityError when another shard already owns the email
+        table = models.ItemEmailDirectory.__table__
+        with self.directory.begin() as conn:
+            conn.execute(table.insert().values(email=email, shard_id=shard_id))
+        session.info.setdefault("reserved_emails", []).append(email)
+
+    def release_on_commit(self, session, email: str) -> None:
+        session.info.setdefault("released_emails", []).append(email)
+
+    def _delete_emails(self, emails: List[str]) -> None:
+        if not emails:
+            return
+        table = models.ItemEmailDirectory.__table__
+        with self.directory.begin() as conn:
+            conn.execute(delete(table).where(table.c.email == any_(bindparam("emails", type_=ARRAY(String)))),
+                         {"emails": emails})
+
+    def rebuild_directory(self) -> None:
+        """Recreate item_email_directory from the shards' current contents."""
+        table = models.ItemEmailDirectory.__table__
+        rows = []
+        for shard_id, engine in self.engines.items():
+            with engine.connect() as conn:
+                rows += [{"email": email, "shard_id": shard_id}
+                         for email in conn.execute(text("SELECT email FROM items")).scalars()]
+        with self.directory.begin() as conn:
+            conn.execute(table.delete())
+            if rows:
+                conn.execute(table.insert(), rows)
+
+    # --- scatter-gather ---
+
+    def merge_sorted(self, stmt, params: dict, sort_keys: List[tuple], limit: Optional[int], offset: int):
+        """
+        Run a sorted, paginated statement on every shard in parallel and
+        merge-sort the partial results. Each shard returns at most
+        offset + limit rows, so the merged page is exact.
+        """
+        shard_params = dict(params)
+        if "limit" in shard_params:
+            shard_params["limit"] = None if limit is None else limit + offset
+            shard_params["offset"] = 0
+
+        def run(engine):
+            with engine.connect() as conn:
+                return conn.execute(stmt, shard_params).all()
+
+        # Each shard query runs in a copy of the caller's context (per-request query counts)
+        contexts = [contextvars.copy_context() for _ in self.engines]
+        partials = list(self._pool.map(lambda context, engine: context.run(run, engine),
+                                       contexts, self.engines.values()))
+        merged = heapq.merge(*partials, key=cmp_to_key(_row_comparator(sort_keys)))
+        rows = list(merged)[offset:]
+        return rows if limit is None else rows[:limit]
+
+
+def _row_comparator(sort_keys: List[tuple]):
+    """
+    Compare rows the way Postgres orders them: NULLs sort last ascending
+    and first descending. sort_keys is [(column name, descending), ...].
+    """
+    def compare(a, b) -> int:
+        for name, descending in sort_keys:
+            x, y = getattr(a, name), getattr(b, name)
+            if x == y:
+                continue
+            if x is None or y is None:
+                result = 1 if x is None else -1
+            else:
+                result = -1 if x < y else 1
+            return -result if descending else result
+        return 0
+    return compare
+
+
+class ItemShardedSession(ShardedSession):
+    def __init__(self, shard_set: ShardSet, **kwargs):
+        self.shard_set = shard_set
+        super().__init__(**kwargs)
+
+
+@event.listens_for(ItemShardedSession, "before_flush")
+def _reserve_emails(session, flush_context, instances):
+    shard_set = session.shard_set
+    for obj in session.new:
+        if isinstance(obj, models.Item):
+            shard_set.reserve_email(session, obj.email, shard_for_special_id(obj.special_id, shard_set.count))
+    for obj in session.dirty:
+        if not isinstance(obj, models.Item):
+            continue
+        state = inspect(obj)
+        special_id = state.attrs.special_id.history
+        if special_id.deleted and special_id.added and special_id.deleted[0] != special_id.added[0]:
+            raise ShardKeyChangeError("special_id is the shard key and cannot be changed")
+        email = state.attrs.email.history
+        if email.deleted and email.added and email.deleted[0] != email.added[0]:
+            shard_set.reserve_email(session, email.added[0], state.identity_token or state.key[2])
+            shard_set.release_on_commit(session, email.deleted[0])
+    for obj in session.deleted:
+        if isinstance(obj, models.Item):
+            shard_set.release_on_commit(session, obj.email)
+
+
+@event.listens_for(ItemShardedSession, "after_commit")
+def _release_replaced_emails(session):
+    session.info.pop("reserved_emails", None)
+    session.shard_set._delete_emails(session.info.pop("released_emails", []))
+
+
+@event.listens_for(ItemShardedSession, "after_soft_rollback")
+def _release_reserved_emails(session, previous_transaction):
+    session.info.pop("released_emails", None)
+    session.shard_set._delete_emails(session.info.pop("reserved_emails", []))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Manage item shards listed in SHARD_URLS")
+    parser.add_argument("command", choices=["prepare", "rebuild-directory"])
+    args = parser.parse_args(argv)
+    if not SHARD_URLS:
+        parser.error("SHARD_URLS is not set")
+
+    from fastapi_postgres_app.database import engine
+
+    shard_set = ShardSet(SHARD_URLS, directory=engine)
+    if args.command == "prepare":
+        shard_set.prepare()
+        print(f"prepared {shard_set.count} shards")
+    else:
+        shard_set.rebuild_directory()
+        print("item_email_directory rebuilt from shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+# fastapi_postgres_app/similar.py
+
+"""
+"Related items" for GET /items/{item_id}/similar, from an in-process vector
+index (SIMILAR_INDEX_ENABLED=true, requires numpy).
+
+Each item's name and description are embedded locally, with no model or
+network: words and word pairs are hashed (crc32, so vectors are the same in
+every process and after restarts) into SIMILAR_DIMENSIONS signed buckets,
+name terms count NAME_WEIGHT times, and the vector is L2-normalized, so the
+dot product of two rows is their cosine similarity. The rows live in one
+float32 matrix, about 4 * SIMILAR_DIMENSIONS bytes per item (1 KB with the
+default 256; 1 GB per million items), plus twice that briefly during a
+reload.
+
+A lookup scores the matrix against the item's vector in blocks of
+SIMILAR_BATCH_ROWS rows, keeping the best K of each block. With
+SIMILAR_IVF_LISTS > 0 the rows are also clustered into that many lists
+(spherical k-means at each reload) and only the SIMILAR_IVF_PROBES lists
+nearest to the query are scored: faster on large tables, approximate.
+
+Like the NumPy snapshot, the index is patched by the write handlers and
+reloaded every SIMILAR_REFRESH_SECONDS. A reload reuses the vector of every
+item whose version is unchanged and only embeds new or edited items. With
+SIMILAR_INDEX_PATH set, the process that loads the index at startup writes
+it there (one .npy file of id, version and vector per item) and the next
+start memory-maps it, so a restart only embeds what changed meanwhile.
+"""
+
+import logging
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import Engine
+
+from fastapi_postgres_app import models
+from fastapi_postgres_app.snapshot import ReadModel
+
+# NumPy is only needed when the index is switched on
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_INDEX_ENABLED = os.getenv("SIMILAR_INDEX_ENABLED", "false").lower() == "true"
+SIMILAR_REFRESH_SECONDS = float(os.getenv("SIMILAR_REFRESH_SECONDS", "300"))  # 0 = never
+SIMILAR_INDEX_PATH = os.getenv("SIMILAR_INDEX_PATH") or None
+SIMILAR_DIMENSIONS = int(os.getenv("SIMILAR_DIMENSIONS", "256"))
+SIMILAR_BATCH_ROWS = int(os.getenv("SIMILAR_BATCH_ROWS", "65536"))
+SIMILAR_IVF_LISTS = int(os.getenv("SIMILAR_IVF_LISTS", "0"))  # 0 = exact search
+SIMILAR_IVF_PROBES = int(os.getenv("SIMILAR_IVF_PROBES", "8"))
+SIMILAR_MAX_LIMIT = 50
+
+NAME_WEIGHT = 2.0
+TOKEN = re.compile(r"\w+")
+LOAD_CHUNK = 100_000
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 256
+
+VERSIONS_STATEMENT = select(models.Item.id, models.Item.version)
+TEXT_COLUMNS = (models.Item.id, models.Item.version, models.Item.name, models.Item.description)
+TEXT_STATEMENT = select(*TEXT_COLUMNS)
+TEXT_BY_IDS_STATEMENT = select(*TEXT_COLUMNS).where(
+    models.Item.id == any_(bindparam("ids", type_=ARRAY(Integer)))
+)
+
+
+def vectorize(name: Optional[str], description: Optional[str], dimensions: int = SIMILAR_DIMENSIONS):
+    """Unit-length hashed bag of words and word pairs; all zeros without text."""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for text, weight in ((name, NAME_WEIGHT), (description, 1.0)):
+        if not text:
+            continue
+        words = TOKEN.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = zlib.crc32(feature.encode())
+            # The sign bit keeps colliding features from only ever adding up
+            vector[h % dimensions] += weight if h & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _record_dtype(dimensions: int):
+    return np.dtype([("id", "<i8"), ("version", "<i8"), ("vector", "<f4", (dimensions,))])
+
+
+def _top(scores, ids, limit: int):
+    """Best `limit` (score, id) of one block, in no particular order."""
+    if len(scores) > limit:
+        keep = np.argpartition(-scores, limit)[:limit]
+        return scores[keep], ids[keep]
+    return scores, ids
+
+
+def train_lists(vectors, lists: int, seed: int = 0):
+    """Spherical k-means centroids (lists x dimensions) from a sample of the rows."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), lists * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(sample_size, lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1)
+        # An emptied list keeps its previous centroid
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+    return centroids
+
+
+class SimilarityIndex(ReadModel):
+    thread_name = "similar-index"
+
+    def __init__(
+        self,
+        engines: List[Engine],
+        refresh_seconds: float = SIMILAR_REFRESH_SECONDS,
+        path: Optional[str] = SIMILAR_INDEX_PATH,
+        dimensions: int = SIMILAR_DIMENSIONS,
+        ivf_lists: int = SIMILAR_IVF_LISTS,
+        ivf_probes: int = SIMILAR_IVF_PROBES,
+        batch_rows: int = SIMILAR_BATCH_ROWS,
+    ):
+        if np is None:
+            raise RuntimeError("SIMILAR_INDEX_ENABLED=true requires numpy (pip install numpy)")
+        super().__init__(engines, refresh_seconds)
+        self.path = path
+        self.dimensions = dimensions
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self.batch_rows = batch_rows
+        # Only the process that loads at startup writes SIMILAR_INDEX_PATH
+        self._persist = path is not None
+        self._replace(self._build(np.empty(0, "int64"), np.empty(0, "int64"),
+                                  np.empty((0, dimensions), np.float32), np.empty(0, bool), 0))
+
+    # --- loading ---
+
+    def _previous(self):
+        """(ids, versions, vectors) of live rows to reuse, sorted by id."""
+        if self.size:
+            live = np.flatnonzero(self.live[:self.size])
+            ids = self.ids[live]
+            order = np.argsort(ids)
+            return ids[order], self.versions[live][order], self.vectors[live[order]]
+        if self.path and os.path.exists(self.path):
+            try:
+                records = np.load(self.path, mmap_mode="r")
+                if records.dtype == _record_dtype(self.dimensions):
+                    return records["id"], records["version"], records["vector"]
+                logger.warning("Ignoring %s: built with other dimensions", self.path)
+            except (OSError, ValueError):
+                logger.exception("Ignoring unreadable %s", self.path)
+        return np.empty(0, "int64"), np.empty(0, "int64"), np.empty((0, self.dimensions), np.float32)
+
+    def _fetch(self) -> dict:
+        id_parts, version_parts = [], []
+        for engine in self.engines:
+            with engine.connect() as conn:
+                result = conn.execution_options(yield_per=LOAD_CHUNK).execute(VERSIONS_STATEMENT)
+                for rows in result.partitions():
+                    item_ids, item_versions = zip(*rows)
+                    id_parts.append(np.array(item_ids, dtype="int64"))
+                    version_parts.append(np.array(item_versions, dtype="int64"))
+        ids = np.concatenate(id_parts) if id_parts else np.empty(0, "int64")
+        versions = np.concatenate(version_parts) if version_parts else np.empty(0, "int64")
+        order = np.argsort(ids)
+        ids, versions = ids[order], versions[order]
+
+        previous_ids, previous_versions, previous_vectors = self._previous()
+        vectors = np.zeros((len(ids), self.dimensions), dtype=np.float32)
+        pos = np.minimum(np.searchsorted(previous_ids, ids), max(len(previous_ids) - 1, 0))
+        reused = np.zeros(len(ids), dtype=bool)
+        if len(previous_ids):
+            reused = (previous_ids[pos] == ids) & (previous_versions[pos] == versions)
+            vectors[reused] = previous_vectors[pos[reused]]
+        live = reused.copy()
+
+        # Embed new and edited items; rows deleted meanwhile stay dead
+        missing = ids[~reused]
+        for item_id, version, name, description in self._texts(missing, len(ids)):
+            row = int(np.searchsorted(ids, item_id))
+            if row < len(ids) and ids[row] == item_id:
+                vectors[row] = vectorize(name, description, self.dimensions)
+                versions[row] = version
+                live[row] = True
+        return self._build(ids, versions, vectors, live, len(missing))
+
+    def _texts(self, missing, total: int):
+        if not len(missing):
+            return
+        missing_set = set(missing.tolist())
+        for engine in self.engines:
+            with engine.connect() as conn:
+                if len(missing) > total // 2:
+                    # Mostly cold: one pass over the table beats id lookups
+                    result = conn.execution_options(yield_per=LOAD_CHUNK).execute(TEXT_STATEMENT)
+                    yield from (row for row in result if row.id in missing_set)
+                    continue
+                for start in range(0, len(missing), LOAD_CHUNK):
+                    chunk = missing[start:start + LOAD_CHUNK].tolist()
+                    yield from conn.execute(TEXT_BY_IDS_STATEMENT, {"ids": chunk})
+
+    def _build(self, ids, versions, vectors, live, embedded: int) -> dict:
+        centroids = lists = None
+        if self.ivf_lists and np.count_nonzero(live) >= self.ivf_lists * 4:
+            centroids = train_lists(vectors[live], self.ivf_lists)
+            lists = np.empty(len(ids), dtype=np.int32)
+            for start in range(0, len(ids), self.batch_rows):
+                block = vectors[start:start + self.batch_rows]
+                lists[start:start + self.batch_rows] = np.argmax(block @ centroids.T, axis=1)
+        return {"ids": ids, "versions": versions, "vectors": vectors, "live": live,
+                "centroids": centroids, "lists": lists, "embedded": embedded}
+
+    def _replace(self, data: dict) -> None:
+        self.ids, self.versions, self.vectors, self.live = data["ids"], data["versions"], data["vectors"], data["live"]
+        self.centroids, self.lists = data["centroids"], data["lists"]
+        self.size = len(self.ids)
+        self.positions: Dict[int, int] = {
+            item_id: row for row, item_id in enumerate(self.ids.tolist()) if self.live[row]
+        }
+        self.embedded = data["embedded"]
+
+    def load(self) -> None:
+        super().load()
+        if self._persist and (self.embedded or not os.path.exists(self.path)):
+            self.save()
+
+    def after_fork(self) -> None:
+        self._persist = False
+        super().after_fork()
+
+    def save(self) -> None:
+        """Write the live rows to self.path, replacing it atomically."""
+        with self._lock:
+            rows = np.flatnonzero(self.live[:self.size])
+            # Sorted by id, as _previous() expects
+            rows = rows[np.argsort(self.ids[rows])]
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        records = np.lib.format.open_memmap(tmp, mode="w+", dtype=_record_dtype(self.dimensions),
+                                            shape=(len(rows),))
+        for start in range(0, len(rows), LOAD_CHUNK):
+            chunk = rows[start:start + LOAD_CHUNK]
+            # Per chunk, so a row is never saved half-updated
+            with self._lock:
+                records["id"][start:start + len(chunk)] = self.ids[chunk]
+                records["version"][start:start + len(chunk)] = self.versions[chunk]
+                records["vector"][start:start + len(chunk)] = self.vectors[chunk]
+        records.flush()
+        del records
+        os.replace(tmp, self.path)
+
+    # --- incremental updates ---
+
+    def _row(self, item) -> tuple:
+        return item.id, item.version, vectorize(item.name, item.description, self.dimensions)
+
+    def _apply(self, rows: List[tuple], deleted_ids: List[int]) -> None:
+        for item_id, version, vector in rows:
+            row = self.positions.get(item_id)
+            if row is None:
+                row = self._append()
+                self.positions[item_id] = row
+            self.ids[row], self.versions[row], self.vectors[row], self.live[row] = item_id, version, vector, True
+            if self.lists is not None:
+                self.lists[row] = np.argmax(self.centroids @ vector)
+        for item_id in deleted_ids:
+            row = self.positions.pop(item_id, None)
+            if row is not None:
+                # Tombstone; the next reload drops the row
+                self.live[row] = False
+
+    def _append(self) -> int:
+        if self.size == len(self.ids):
+            capacity = max(16, len(self.ids) * 2)
+            for name in ("ids", "versions", "vectors", "live", "lists"):
+                column = getattr(self, name)
+                if column is None:
+                    continue
+                grown = np.zeros((capacity,) + column.shape[1:], column.dtype)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+        self.size += 1
+        return self.size - 1
+
+    # --- queries ---
+
+    def _candidates(self, query) -> Optional[object]:
+        """Rows in the IVF lists nearest to query, or None to scan all rows."""
+        if self.lists is None:
+            return None
+        probes = np.argsort(-(self.centroids @ query))[:self.ivf_probes]
+        return np.flatnonzero(np.isin(self.lists[:self.size], probes) & self.live[:self.size])
+
+    def similar(self, item_id: int, limit: int, text: Optional[Tuple[str, str]] = None) -> Optional[List[Tuple[int, float]]]:
+        """
+        (id, score) of the `limit` items most similar to item_id, best first.
+        Returns None when item_id is not indexed and no (name, description)
+        was given to embed it from.
+        """
+        with self._lock:
+            own = self.positions.get(item_id)
+            if own is not None:
+                query = self.vectors[own].copy()
+            elif text is not None:
+                query = vectorize(*text, self.dimensions)
+            else:
+                return None
+            candidates = self._candidates(query)
+            total = self.size if candidates is None else len(candidates)
+            best_scores, best_ids = [], []
+            for start in range(0, total, self.batch_rows):
+                if candidates is None:
+                    rows = slice(start, min(start + self.batch_rows, total))
+                    scores = self.vectors[rows] @ query
+                    scores[~self.live[rows]] = -np.inf
+                else:
+                    rows = candidates[start:start + self.batch_rows]
+                    scores = self.vectors[rows] @ query
+                ids = self.ids[rows]
+                scores[ids == item_id] = -np.inf
+                scores, ids = _top(scores, ids, limit)
+                best_scores.append(scores)
+                best_ids.append(ids)
+        if not best_scores:
+            return []
+        scores, ids = np.concatenate(best_scores), np.concatenate(best_ids)
+        keep = scores > 0
+        scores, ids = scores[keep], ids[keep]
+        order = np.lexsort((ids, -scores))[:limit]
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+    def memory_bytes(self) -> int:
+        return self.ids.nbytes + self.versions.nbytes + self.vectors.nbytes + self.live.nbytes
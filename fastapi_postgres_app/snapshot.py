@@ -0,0 +1,325 @@
+# fastapi_postgres_app/snapshot.py
+
+"""
+Optional in-memory columnar snapshot of the filterable item columns.
+
+When SNAPSHOT_ENABLED=true, id, price, available and created_at of every
+item are kept in NumPy arrays, sorted by id. GET /items/ filters on
+available/price/created_at and GET /items/stats then run as vectorized
+masks over the arrays, and Postgres is only asked to hydrate the final page
+of ids.
+
+Memory is 26 bytes per row (id int64, price float64 with NaN for NULL,
+created_at int64 microseconds, available int8, live flag bool), i.e. about
+26 MB per million rows, plus up to ~1 byte per row for the mask of a query
+in flight and twice the arrays briefly during a reload.
+
+Writes made through this process's handlers are applied immediately. Writes
+made elsewhere (other workers, imports, psql) show up after the next full
+reload, every SNAPSHOT_REFRESH_SECONDS. Pages are always hydrated from
+Postgres, so rows are current; only which ids match can be that stale.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import BigInteger, Integer, func, select
+from sqlalchemy.engine import Engine
+
+from fastapi_postgres_app import models
+
+# NumPy is only needed when the snapshot is switched on
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "false").lower() == "true"
+SNAPSHOT_REFRESH_SECONDS = float(os.getenv("SNAPSHOT_REFRESH_SECONDS", "60"))  # 0 = never
+SNAPSHOT_LOAD_CHUNK = 100_000
+
+# Orderings the snapshot can produce; anything else goes to Postgres
+SNAPSHOT_SORT_COLUMNS = {"id", "price", "created_at"}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+LOAD_STATEMENT = select(
+    models.Item.id,
+    models.Item.price,
+    func.coalesce(models.Item.available.cast(Integer), -1),
+    (func.extract("epoch", models.Item.created_at) * 1_000_000).cast(BigInteger),
+).order_by(models.Item.id)
+
+
+def to_micros(value: datetime) -> int:
+    # Naive datetimes are taken as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+class ReadModel:
+    """
+    In-process copy of some item columns: loaded in full at startup and every
+    refresh_seconds, and patched in between by apply() with the writes this
+    process commits. Subclasses provide _fetch(), _replace(), _row() and
+    _apply().
+    """
+
+    thread_name = "read-model"
+
+    def __init__(self, engines: List[Engine], refresh_seconds: float):
+        self.engines = engines
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        # Writes applied while a reload runs, replayed onto the fresh data
+        self._journal: Optional[list] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.loaded_at = 0.0
+
+    def start(self) -> None:
+        """Load now and keep reloading in the background."""
+        self.load()
+        self._start_refresh()
+
+    def _start_refresh(self) -> None:
+        if self.refresh_seconds > 0:
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._refresh_loop, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def after_fork(self) -> None:
+        """
+        Resume in a forked worker. The loaded data is inherited (shared
+        copy-on-write until the next reload); threads and locks are not.
+        """
+        self._lock = threading.Lock()
+        self._journal = None
+        self._start_refresh()
+
+    def _refresh_loop(self) -> None:
+        # The first wait counts from the last load, so a worker forked long
+        # after the preload reloads right away
+        delay = max(0.0, self.loaded_at + self.refresh_seconds - time.monotonic())
+        while not self._stop.wait(delay):
+            try:
+                self.load()
+            except Exception:
+                logger.exception("%s reload failed; keeping the previous one", self.thread_name)
+            delay = self.refresh_seconds
+
+    def load(self) -> None:
+        with self._lock:
+            self._journal = []
+        started = time.monotonic()
+        try:
+            data = self._fetch()
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._replace(data)
+            for rows, deleted_ids in journal:
+                self._apply(rows, deleted_ids)
+        self.loaded_at = started
+
+    def apply(self, items: Iterable = (), deleted_ids: Iterable[int] = ()) -> None:
+        """Record committed writes; items are ORM items or schemas.Item."""
+        rows = [self._row(item) for item in items]
+        deleted_ids = list(deleted_ids)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((rows, deleted_ids))
+            self._apply(rows, deleted_ids)
+
+    def _fetch(self):
+        raise NotImplementedError
+
+    def _replace(self, data) -> None:
+        raise NotImplementedError
+
+    def _row(self, item) -> tuple:
+        raise NotImplementedError
+
+    def _apply(self, rows: List[tuple], deleted_ids: List[int]) -> None:
+        raise NotImplementedError
+
+
+class ItemSnapshot(ReadModel):
+    COLUMNS = (("ids", "int64"), ("price", "float64"), ("created_at", "int64"),
+               ("available", "int8"), ("live", "bool"))
+    thread_name = "item-snapshot"
+
+    def __init__(self, engines: List[Engine], refresh_seconds: float = SNAPSHOT_REFRESH_SECONDS):
+        if np is None:
+            raise RuntimeError("SNAPSHOT_ENABLED=true requires numpy (pip install numpy)")
+        super().__init__(engines, refresh_seconds)
+        self._replace({name: np.empty(0, dtype) for name, dtype in self.COLUMNS})
+
+    def _replace(self, columns: dict) -> None:
+        for name, _ in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.size = len(columns["ids"])
+
+    # --- loading ---
+
+    def _fetch(self) -> dict:
+        chunks = []
+        for engine in self.engines:
+            with engine.connect() as conn:
+                result = conn.execution_options(yield_per=SNAPSHOT_LOAD_CHUNK).execute(LOAD_STATEMENT)
+                for rows in result.partitions():
+                    ids, prices, available, created_at = zip(*rows)
+                    chunks.append((
+                        np.array(ids, dtype="int64"),
+                        np.array(prices, dtype="float64"),  # None becomes NaN
+                        np.array(created_at, dtype="int64"),
+                        np.array(available, dtype="int8"),
+                    ))
+        if not chunks:
+            return {name: np.empty(0, dtype) for name, dtype in self.COLUMNS}
+        ids, price, created_at, available = (np.concatenate(parts) for parts in zip(*chunks))
+        if len(self.engines) > 1:
+            order = np.argsort(ids, kind="stable")
+            ids, price, created_at, available = ids[order], price[order], created_at[order], available[order]
+        return {"ids": ids, "price": price, "created_at": created_at,
+                "available": available, "live": np.ones(len(ids), dtype=bool)}
+
+    # --- incremental updates ---
+
+    def _row(self, item) -> tuple:
+        return item.id, item.price, item.available, item.created_at
+
+    def _apply(self, rows: List[tuple], deleted_ids: List[int]) -> None:
+        for item_id, price, available, created_at in rows:
+            values = {
+                "ids": item_id,
+                "price": np.nan if price is None else price,
+                "created_at": to_micros(created_at) if created_at is not None else 0,
+                "available": -1 if available is None else int(available),
+                "live": True,
+            }
+            pos = int(np.searchsorted(self.ids[:self.size], item_id))
+            if pos < self.size and self.ids[pos] == item_id:
+                for name, value in values.items():
+                    getattr(self, name)[pos] = value
+            else:
+                self._insert(pos, values)
+        for item_id in deleted_ids:
+            pos = int(np.searchsorted(self.ids[:self.size], item_id))
+            if pos < self.size and self.ids[pos] == item_id:
+                # Tombstone; the next reload drops the row
+                self.live[pos] = False
+
+    def _insert(self, pos: int, values: dict) -> None:
+        if self.size == len(self.ids):
+            capacity = max(16, len(self.ids) * 2)
+            for name, dtype in self.COLUMNS:
+                grown = np.empty(capacity, dtype)
+                grown[:self.size] = getattr(self, name)[:self.size]
+                setattr(self, name, grown)
+        # New ids normally arrive in ascending order, making this an append
+        for name, value in values.items():
+            column = getattr(self, name)
+            column[pos + 1:self.size + 1] = column[pos:self.size]
+            column[pos] = value
+        self.size += 1
+
+    # --- queries ---
+
+    @staticmethod
+    def can_serve(search: Optional[str], keys: List[Tuple[str, bool]]) -> bool:
+        return not search and all(name in SNAPSHOT_SORT_COLUMNS for name, _ in keys)
+
+    def _mask(self, available, price_lt, price_gt, created_after, created_before):
+        n = self.size
+        mask = self.live[:n].copy()
+        if available is not None:
+            mask &= self.available[:n] == int(available)
+        # Comparisons with NaN are False, matching SQL's NULL semantics
+        if price_lt is not None:
+            mask &= self.price[:n] < price_lt
+        if price_gt is not None:
+            mask &= self.price[:n] > price_gt
+        if created_after is not None:
+            mask &= self.created_at[:n] >= to_micros(created_after)
+        if created_before is not None:
+            mask &= self.created_at[:n] < to_micros(created_before)
+        return mask
+
+    def query_ids(
+        self,
+        keys: List[Tuple[str, bool]],
+        limit: Optional[int],
+        offset: int,
+        available: Optional[bool] = None,
+        price_lt: Optional[int] = None,
+        price_gt: Optional[int] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> List[int]:
+        """Ids of one page of matching items, ordered like Postgres would."""
+        with self._lock:
+            idx = np.flatnonzero(self._mask(available, price_lt, price_gt, created_after, created_before))
+            if keys == [("id", True)]:
+                idx = idx[::-1]
+            elif keys != [("id", False)]:
+                # np.lexsort treats the last key as the primary one
+                sort_columns = []
+                for name, descending in reversed(keys):
+                    values = getattr(self, "ids" if name == "id" else name)[idx]
+                    if name == "price":
+                        nulls = np.isnan(values)
+                        values = np.where(nulls, 0, values)
+                        sort_columns.append(-values if descending else values)
+                        # NULLs sort last ascending and first descending
+                        sort_columns.append(~nulls if descending else nulls)
+                    else:
+                        sort_columns.append(-values if descending else values)
+                idx = idx[np.lexsort(sort_columns)]
+            end = None if limit is None else offset + limit
+            return self.ids[idx[offset:end]].tolist()
+
+    def stats(
+        self,
+        available: Optional[bool] = None,
+        price_lt: Optional[int] = None,
+        price_gt: Optional[int] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> dict:
+        with self._lock:
+            mask = self._mask(available, price_lt, price_gt, created_after, created_before)
+            prices = self.price[:self.size][mask]
+            available_count = int(np.count_nonzero(self.available[:self.size][mask] == 1))
+        prices = prices[~np.isnan(prices)]
+        priced = len(prices) > 0
+        price_sum = int(prices.sum()) if priced else None
+        return {
+            "count": int(np.count_nonzero(mask)),
+            "available_count": available_count,
+            "price_count": len(prices),
+            "price_min": int(prices.min()) if priced else None,
+            "price_max": int(prices.max()) if priced else None,
+            "price_sum": price_sum,
+            "price_avg": price_sum / len(prices) if priced else None,
+        }
+
+    def memory_bytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name, _ in self.COLUMNS)
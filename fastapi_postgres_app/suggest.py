@@ -0,0 +1,156 @@
+# fastapi_postgres_app/suggest.py
+
+"""
+Prefix autocomplete over item names for GET /items/suggest.
+
+Matching is case-insensitive on lower(name), ordered by lower(name) in code
+point order (Postgres' "C" collation), then id. In Python, fold() stands in
+for lower(): Postgres maps one code point at a time, while str.lower() turns
+"İ" into two code points and a word-final "Σ" into "ς". fold() matches it in a
+UTF-8 database whose ctype lowercases non-ASCII letters (C.UTF-8, en_US.UTF-8;
+a Turkish locale maps "I" differently). Results come from one of:
+
+- NameIndex (SUGGEST_INDEX_ENABLED=true): parallel sorted lists in this
+  process; a lookup is one bisect plus K steps. Roughly 150-200 bytes per
+  item for short names (~150-200 MB per million), kept current like the
+  NumPy snapshot: patched by the write handlers and reloaded in full every
+  SUGGEST_REFRESH_SECONDS.
+- Postgres otherwise, as a range scan on ix_items_name_lower_c, an index on
+  lower(name) COLLATE "C". With byte-wise ordering the prefix becomes the
+  range [prefix, next prefix) and the scan stops after K rows in index
+  order, so the cost does not grow with the table.
+"""
+
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, String, bindparam, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from fastapi_postgres_app import models
+from fastapi_postgres_app.snapshot import ReadModel
+
+SUGGEST_INDEX_ENABLED = os.getenv("SUGGEST_INDEX_ENABLED", "false").lower() == "true"
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "60"))  # 0 = never
+SUGGEST_MAX_LIMIT = 50
+
+MAX_CODE_POINT = 0x10FFFF
+
+NAME_KEY = func.lower(models.Item.name).collate("C")
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with prefix."""
+    while prefix and ord(prefix[-1]) == MAX_CODE_POINT:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+SUGGEST_STATEMENT = (
+    select(models.Item.id, models.Item.name)
+    .where(NAME_KEY >= bindparam("low", type_=String), NAME_KEY < bindparam("high", type_=String))
+    .order_by(NAME_KEY, models.Item.id)
+    .limit(bindparam("limit", type_=Integer))
+)
+SUGGEST_STATEMENT_UNBOUNDED = (
+    select(models.Item.id, models.Item.name)
+    .where(NAME_KEY >= bindparam("low", type_=String))
+    .order_by(NAME_KEY, models.Item.id)
+    .limit(bindparam("limit", type_=Integer))
+)
+
+
+def fold(text: str) -> str:
+    """Lowercase like Postgres' lower(): the simple mapping of each code point."""
+    lowered = text.lower()
+    if len(lowered) == len(text) and "ς" not in lowered:
+        return lowered
+    return "".join(char.lower()[0] for char in text)
+
+
+def suggest_from_db(db: Session, prefix: str, limit: int) -> List[dict]:
+    low = fold(prefix)
+    high = prefix_upper_bound(low)
+    stmt = SUGGEST_STATEMENT if high is not None else SUGGEST_STATEMENT_UNBOUNDED
+    rows = db.execute(stmt, {"low": low, "high": high, "limit": limit}).all()
+    # A sharded session returns up to `limit` rows per shard
+    rows = sorted(rows, key=lambda row: (fold(row.name), row.id))[:limit]
+    return [{"id": row.id, "name": row.name} for row in rows]
+
+
+class NameIndex(ReadModel):
+    thread_name = "name-index"
+
+    def __init__(self, engines: List[Engine], refresh_seconds: float = SUGGEST_REFRESH_SECONDS):
+        super().__init__(engines, refresh_seconds)
+        self._replace(([], array("q"), [], {}))
+
+    def _replace(self, data) -> None:
+        # keys[i] = lower(name), sorted together with ids[i]; names[i] is the original
+        self.keys, self.ids, self.names, self.key_by_id = data
+
+    def _fetch(self):
+        entries = []
+        for engine in self.engines:
+            with engine.connect() as conn:
+                result = conn.execution_options(yield_per=100_000).execute(
+                    select(models.Item.id, models.Item.name).where(models.Item.name.is_not(None))
+                )
+                for item_id, name in result:
+                    entries.append((_key(name), item_id, name))
+        entries.sort()
+        keys = [key for key, _, _ in entries]
+        ids = array("q", (item_id for _, item_id, _ in entries))
+        names = [name for _, _, name in entries]
+        key_by_id: Dict[int, str] = dict(zip(ids, keys))
+        return keys, ids, names, key_by_id
+
+    def _row(self, item) -> tuple:
+        return item.id, item.name
+
+    def _position(self, key: str, item_id: int) -> int:
+        # First entry >= (key, item_id); ids are sorted within equal keys
+        low, high = bisect_left(self.keys, key), bisect_right(self.keys, key)
+        return bisect_left(self.ids, item_id, low, high)
+
+    def _remove(self, item_id: int) -> None:
+        key = self.key_by_id.pop(item_id, None)
+        if key is None:
+            return
+        pos = self._position(key, item_id)
+        del self.keys[pos], self.ids[pos], self.names[pos]
+
+    def _apply(self, rows: List[tuple], deleted_ids: List[int]) -> None:
+        for item_id, name in rows:
+            self._remove(item_id)
+            if name is None:
+                continue
+            key = _key(name)
+            pos = self._position(key, item_id)
+            self.keys.insert(pos, key)
+            self.ids.insert(pos, item_id)
+            self.names.insert(pos, name)
+            self.key_by_id[item_id] = key
+        for item_id in deleted_ids:
+            self._remove(item_id)
+
+    def suggest(self, prefix: str, limit: int) -> List[dict]:
+        low = fold(prefix)
+        results = []
+        with self._lock:
+            pos = bisect_left(self.keys, low)
+            while pos < len(self.keys) and len(results) < limit and self.keys[pos].startswith(low):
+                results.append({"id": self.ids[pos], "name": self.names[pos]})
+                pos += 1
+        return results
+
+
+def _key(name: str) -> str:
+    key = fold(name)
+    # Share the string when the name is already lower case
+    return name if key == name else key
@@ -9,6 +9,9 @@ from testcontainers.postgres import PostgresContainer
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+# Every request in the suite must stay within its route's @query_budget
+os.environ.setdefault("QUERY_BUDGETS_ENFORCED", "true")
+
 from fastapi.testclient import TestClient
 from fastapi_postgres_app.main import app, get_db
 from fastapi_postgres_app.database import Base
@@ -16,6 +19,7 @@ from fastapi_postgres_app.deps import (
     require_read_only,
     require_read_write,
     require_full_access,
+    require_metrics_access,
 )
 
 @pytest.fixture(scope="session")
@@ -88,6 +92,7 @@ def client(db_session):
     app.dependency_overrides[require_read_only] = lambda: None
     app.dependency_overrides[require_read_write] = lambda: None
     app.dependency_overrides[require_full_access] = lambda: None
+    app.dependency_overrides[require_metrics_access] = lambda: None
 
     client = TestClient(app)
     yield client
@@ -0,0 +1,90 @@
+# fastapi_postgres_app/tests/test_bulk.py
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_postgres_app import bulk, main, querycount
+from fastapi_postgres_app.querycount import QueryBudget, QueryBudgetExceeded
+
+
+def _create(client: TestClient, count: int) -> list:
+    items = []
+    for n in range(count):
+        payload = {
+            "name": f"gadget {n}" if n % 2 else f"widget {n}", "description": "d", "price": n,
+            "available": True, "email": f"bulk{n}@x.com", "special_id": 500 + n,
+        }
+        items.append(client.post("/items/", json=payload).json())
+    return items
+
+
+def test_bulk_update_by_filters_in_chunks(client: TestClient, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_CHUNK_SIZE", 2)
+    items = _create(client, 7)
+    body = {"filters": {"search": "widget", "price_gt": 0}, "changes": {"available": False, "price": 99}}
+
+    res = client.patch("/items/bulk", json={**body, "dry_run": True})
+    assert res.json() == {"affected": 3, "dry_run": True}
+    assert all(item["available"] for item in client.get("/items/").json())
+
+    res = client.patch("/items/bulk", json=body)
+    assert res.status_code == 200
+    assert res.json() == {"affected": 3, "dry_run": False}
+
+    by_id = {item["id"]: item for item in client.get("/items/").json()}
+    for item in items:
+        changed = by_id[item["id"]]
+        if item["name"].startswith("widget") and item["price"] > 0:
+            assert (changed["available"], changed["price"], changed["version"]) == (False, 99, 2)
+        else:
+            assert changed == item
+
+
+def test_bulk_delete_by_ids(client: TestClient):
+    items = _create(client, 4)
+    ids = [items[0]["id"], items[2]["id"], 999999]
+
+    res = client.request("DELETE", "/items/bulk", json={"ids": ids, "dry_run": True})
+    assert res.json() == {"affected": 2, "dry_run": True}
+
+    res = client.request("DELETE", "/items/bulk", json={"ids": ids})
+    assert res.json() == {"affected": 2, "dry_run": False}
+    assert [item["id"] for item in client.get("/items/").json()] == [items[1]["id"], items[3]["id"]]
+
+
+def test_bulk_selection_is_validated(client: TestClient):
+    changes = {"available": False}
+    assert client.patch("/items/bulk", json={"changes": changes}).status_code == 422
+    assert client.patch("/items/bulk", json={"ids": [1], "filters": {"available": True},
+                                             "changes": changes}).status_code == 422
+    # An empty filter set would match every item
+    assert client.patch("/items/bulk", json={"filters": {}, "changes": changes}).status_code == 422
+    assert client.patch("/items/bulk", json={"ids": [1], "changes": {}}).status_code == 422
+    assert client.patch("/items/bulk", json={"ids": [1], "changes": {"email": "a@x.com"}}).status_code == 422
+
+
+def test_bulk_delete_requires_full_access(auth_client: TestClient):
+    token = auth_client.post("/token", json={"permissions": "read_write", "expires_minutes": 5}).json()["access_token"]
+    res = auth_client.request("DELETE", "/items/bulk", json={"ids": [1]},
+                              headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 403
+
+
+def test_bulk_statements_scale_with_chunks(client: TestClient, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_CHUNK_SIZE", 2)
+    monkeypatch.setattr(querycount, "QUERY_COUNT_HEADER", True)
+    items = _create(client, 5)
+
+    # Chunks of 2, 2 and 1 ids: a locking SELECT and an UPDATE each
+    res = client.patch("/items/bulk", json={"ids": [item["id"] for item in items], "changes": {"price": 1}})
+    assert res.json()["affected"] == 5
+    assert res.headers["X-Query-Count"] == "6"
+    # A full last chunk costs one more SELECT to find the end
+    res = client.request("DELETE", "/items/bulk", json={"ids": [item["id"] for item in items[:4]]})
+    assert res.json()["affected"] == 4
+    assert res.headers["X-Query-Count"] == "5"
+
+    # One statement per chunk more than declared fails the request
+    monkeypatch.setattr(main.bulk_update_items, "query_budget", QueryBudget(0, None, batch_statements=1))
+    with pytest.raises(QueryBudgetExceeded, match=r"PATCH /items/bulk ran 2 statements; its budget is 1"):
+        client.patch("/items/bulk", json={"ids": [items[4]["id"]], "changes": {"price": 2}})
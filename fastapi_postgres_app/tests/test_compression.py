@@ -0,0 +1,127 @@
+# fastapi_postgres_app/tests/test_compression.py
+
+import gzip
+import zlib
+
+import anyio
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from fastapi_postgres_app import deps
+from fastapi_postgres_app.compression import CompressionMiddleware, negotiate_encoding
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("*", "zstd"),
+    ("br;q=0, zstd;q=0, *", "gzip"),
+    ("identity", None),
+    ("", None),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header, ["zstd", "br", "gzip"]) == expected
+
+
+def _seed(client: TestClient, n: int = 30):
+    for i in range(n):
+        client.post("/items/", json={
+            "name": f"Widget {i}", "description": "A repetitive description",
+            "price": i, "available": True,
+            "email": f"w{i}@example.com", "special_id": 5000 + i,
+        })
+
+
+def test_list_response_is_gzipped(client: TestClient):
+    _seed(client)
+    res = client.get("/items/", headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert res.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["vary"]
+    assert len(res.json()) == 30
+
+
+def test_small_response_not_compressed(client: TestClient):
+    res = client.get("/items/9999", headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 404
+    assert "content-encoding" not in res.headers
+
+
+def test_metrics_report_compression(client: TestClient):
+    _seed(client)
+    client.get("/items/", headers={"Accept-Encoding": "gzip"})
+    body = client.get("/metrics").text
+    assert 'http_compression_bytes_in_total{encoding="gzip"}' in body
+    assert 'http_compression_cpu_seconds_total{encoding="gzip"}' in body
+    assert "http_compression_ratio_count" in body
+
+
+def test_metrics_need_the_scrape_token_or_full_access(auth_client: TestClient, monkeypatch):
+    monkeypatch.setattr(deps, "METRICS_TOKEN", "scrape-secret")
+    assert auth_client.get("/metrics").status_code == 401
+    assert auth_client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    res = auth_client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert res.status_code == 200
+
+
+def test_compressed_etag_names_the_encoding(client: TestClient):
+    item = client.post("/items/", json={
+        "name": "Big", "description": "long " * 200, "price": 1, "available": True,
+        "email": "big@example.com", "special_id": 5100,
+    }).json()
+    res = client.get(f"/items/{item['id']}", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["ETag"] == '"1-gzip"'
+    assert client.get(f"/items/{item['id']}", headers={"Accept-Encoding": "identity"}).headers["ETag"] == '"1"'
+
+    # Either tag names version 1 for If-Match
+    res = client.patch(f"/items/{item['id']}", json={"price": 2}, headers={"If-Match": '"1-gzip"'})
+    assert res.status_code == 200
+    res = client.patch(f"/items/{item['id']}", json={"price": 3}, headers={"If-Match": '"1-gzip"'})
+    assert res.status_code == 412
+
+
+def test_streaming_response_compressed_incrementally():
+    chunks = [b'{"row": %d, "text": "repeat repeat repeat"}\n' % i for i in range(50)]
+
+    stream_app = FastAPI()
+    stream_app.add_middleware(CompressionMiddleware, minimum_size=10)
+
+    @stream_app.get("/export")
+    def export():
+        return StreamingResponse(iter(chunks), media_type="application/x-ndjson")
+
+    sent = []
+    done = anyio.Event()
+
+    async def capture(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    async def receive():
+        # the request has no body; block until the response is out
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http", "method": "GET", "path": "/export", "raw_path": b"/export",
+        "query_string": b"", "root_path": "", "scheme": "http", "http_version": "1.1",
+        "headers": [(b"accept-encoding", b"gzip")], "server": ("test", 80), "client": ("test", 1),
+    }
+    anyio.run(stream_app, scope, receive, capture)
+
+    start = sent[0]
+    assert (b"content-encoding", b"gzip") in start["headers"]
+    assert not any(k == b"content-length" for k, _ in start["headers"])
+
+    bodies = [m for m in sent if m["type"] == "http.response.body"]
+    # one compressed message per produced chunk, plus the closing frame
+    assert len(bodies) >= len(chunks)
+    # every intermediate frame is flushed, so a client can decode it immediately
+    partial = zlib.decompressobj(31).decompress(bodies[0]["body"])
+    assert partial == chunks[0]
+    assert gzip.decompress(b"".join(m["body"] for m in bodies)) == b"".join(chunks)
@@ -0,0 +1,79 @@
+# fastapi_postgres_app/tests/test_idempotency.py
+
+import os
+import threading
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select, text, update
+from sqlalchemy.orm import Session
+
+from fastapi_postgres_app import idempotency, models
+
+ITEM = {
+    "name": "Widget", "description": "d", "price": 5, "available": True,
+    "email": "w@idem.com", "special_id": 900,
+}
+
+
+def test_retry_replays_stored_response(client: TestClient, db_session):
+    first = client.post("/items/", json=ITEM, headers={"Idempotency-Key": "abc"})
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+
+    retry = client.post("/items/", json=ITEM, headers={"Idempotency-Key": "abc"})
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.headers["Location"] == first.headers["Location"]
+    assert retry.headers["ETag"] == first.headers["ETag"]
+    assert retry.json() == first.json()
+    assert db_session.scalar(select(func.count()).select_from(models.Item)) == 1
+
+    reused = client.post("/items/", json={**ITEM, "price": 6}, headers={"Idempotency-Key": "abc"})
+    assert reused.status_code == 422
+    assert reused.json()["error"] == "IdempotencyKeyReused"
+
+
+def test_failed_request_releases_key_and_expired_key_is_reused(client: TestClient, db_session):
+    taken = client.post("/items/", json={**ITEM, "special_id": 901}).json()
+    conflict = client.post("/items/", json=ITEM, headers={"Idempotency-Key": "k1"})
+    assert conflict.status_code == 409
+
+    # The 409 was not stored: once the conflict is gone the retry succeeds
+    client.delete(f"/items/{taken['id']}")
+    assert client.post("/items/", json=ITEM, headers={"Idempotency-Key": "k1"}).status_code == 201
+
+    db_session.execute(update(models.IdempotencyKey).values(expires_at=func.now() - text("interval '1 second'")))
+    db_session.commit()
+    other = {**ITEM, "email": "x@idem.com", "special_id": 902}
+    res = client.post("/items/", json=other, headers={"Idempotency-Key": "k1"})
+    assert res.status_code == 201 and res.json()["special_id"] == 902
+
+    assert client.post("/items/", json=ITEM, headers={"Idempotency-Key": ""}).status_code == 422
+
+
+def test_concurrent_duplicate_waits_for_first(postgres_container):
+    engine = create_engine(os.getenv("DATABASE_URL"))
+    results = {}
+    try:
+        with Session(engine) as first, Session(engine) as second:
+            assert idempotency.claim(first, "race", "h") is None
+
+            def duplicate():
+                results["stored"] = idempotency.claim(second, "race", "h")
+                second.rollback()
+
+            thread = threading.Thread(target=duplicate)
+            thread.start()
+            thread.join(0.3)
+            # Blocked on the first transaction's uncommitted key
+            assert thread.is_alive()
+
+            idempotency.save(first, "race", 201, {"Location": "/items/1"}, b"{}")
+            first.commit()
+            thread.join(5)
+            assert results["stored"].status_code == 201
+            assert results["stored"].headers == {"Location": "/items/1"}
+    finally:
+        with engine.begin() as conn:
+            conn.execute(models.IdempotencyKey.__table__.delete())
+        engine.dispose()
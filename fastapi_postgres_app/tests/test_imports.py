@@ -0,0 +1,113 @@
+# fastapi_postgres_app/tests/test_imports.py
+
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_postgres_app import imports, main
+from fastapi_postgres_app.suggest import NameIndex
+
+
+@pytest.fixture(autouse=True)
+def imports_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(imports, "IMPORTS_DIR", str(tmp_path))
+    monkeypatch.setattr(imports, "IMPORT_BATCH_SIZE", 3)
+    return tmp_path
+
+
+def _wait(client: TestClient, location: str, timeout: float = 10) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(location).json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"import did not finish: {job}")
+
+
+def test_csv_import_loads_rows_and_reports_rejects(client: TestClient):
+    client.post("/items/", json={
+        "name": "Existing", "description": "d", "price": 1, "available": True,
+        "email": "taken@imp.com", "special_id": 500,
+    })
+    csv_body = "\n".join([
+        "name,description,price,available,email,special_id",
+        "A,first,10,true,a@imp.com,501",
+        "B,second,,false,b@imp.com,502",          # empty price -> null
+        "C,bad price,-5,true,c@imp.com,503",      # fails ge=0
+        "D,dup email,4,true,taken@imp.com,504",   # unique violation
+        'E,"tab\tand ""quote""",7,true,e@imp.com,505',
+        "F,dup in file,8,true,a@imp.com,506",     # collides with row A
+    ]) + "\n"
+
+    res = client.post("/items/imports", files={"file": ("items.csv", csv_body, "text/csv")})
+    assert res.status_code == 202
+    assert res.headers["Location"] == f"/items/imports/{res.json()['id']}"
+
+    job = _wait(client, res.headers["Location"])
+    assert job["status"] == "succeeded"
+    assert job["format"] == "csv"
+    assert (job["rows_processed"], job["rows_imported"], job["rows_rejected"]) == (6, 3, 3)
+    assert job["progress"] == 1.0
+    assert job["rows_per_second"] is not None
+
+    items = {i["special_id"]: i for i in client.get("/items/?search=").json()}
+    assert items[502]["price"] is None and items[502]["available"] is False
+    assert items[505]["description"] == 'tab\tand "quote"'
+    assert 504 not in items and 506 not in items
+
+    rejects = client.get(job["rejects_url"])
+    assert rejects.status_code == 200
+    lines = [json.loads(line) for line in rejects.text.splitlines()]
+    assert [(r["line"], r["error"]) for r in lines] == [
+        (4, "ValidationError"), (5, "UniqueViolation"), (7, "UniqueViolation"),
+    ]
+    assert "price" in lines[0]["message"]
+
+
+def test_ndjson_import_with_invalid_lines(client: TestClient, imports_dir):
+    rows = [
+        json.dumps({"name": f"N{i}", "description": "nd", "price": i, "available": True,
+                    "email": f"n{i}@imp.com", "special_id": 600 + i})
+        for i in range(4)
+    ]
+    body = "\n".join([rows[0], "{not json", rows[1], "[1, 2]", rows[2], json.dumps({"name": "x"}), rows[3]])
+
+    res = client.post("/items/imports?format=ndjson", files={"file": ("data.txt", body)})
+    job = _wait(client, res.headers["Location"])
+    assert job["status"] == "succeeded"
+    assert (job["rows_imported"], job["rows_rejected"]) == (4, 3)
+
+    errors = [json.loads(line)["error"] for line in client.get(job["rejects_url"]).text.splitlines()]
+    assert errors == ["InvalidJSON", "InvalidJSON", "ValidationError"]
+    # the spooled upload is removed once the job finishes
+    assert not list(imports_dir.glob("*.upload"))
+
+
+def test_import_rejects_unknown_format_and_missing_jobs(client: TestClient):
+    res = client.post("/items/imports", files={"file": ("items.xlsx", b"PK")})
+    assert res.status_code == 422
+    assert res.json()["error"] == "UnknownFormat"
+
+    assert client.get("/items/imports/deadbeef").status_code == 404
+    assert client.get("/items/imports/deadbeef/rejects").status_code == 404
+
+
+def test_imported_rows_reach_the_read_models(client: TestClient, db_session, monkeypatch):
+    name_index = NameIndex([db_session.get_bind()], refresh_seconds=0)
+    monkeypatch.setattr(main, "suggest_index", name_index)
+    name_index.load()
+
+    body = "".join(
+        json.dumps({"name": f"Imported {i}", "description": "d", "price": i, "available": True,
+                    "email": f"r{i}@imp.com", "special_id": 800 + i}) + "\n"
+        for i in range(5)
+    )
+    res = client.post("/items/imports", files={"file": ("items.ndjson", body, "application/x-ndjson")})
+    assert _wait(client, res.headers["Location"])["rows_imported"] == 5
+
+    # No reload: the index was patched batch by batch
+    names = [s["name"] for s in client.get("/items/suggest", params={"prefix": "imported"}).json()]
+    assert names == [f"Imported {i}" for i in range(5)]
@@ -1,9 +1,12 @@
 # fastapi_postgres_app/tests/test_items_extended.py
 
+from datetime import datetime, timezone
+
 import pytest
 from fastapi.testclient import TestClient
 
 from fastapi_postgres_app.main import app
+from fastapi_postgres_app.models import Item
 
 
 def get_token(client: TestClient, perms: str = "full_access", mins: int = 5) -> str:
@@ -143,6 +146,33 @@ def test_query_filters(client: TestClient):
     assert all(i["available"] and i["price"] < 20 for i in r_comb.json())
 
 
+def test_created_at_range_filters(client: TestClient, db_session):
+    stamps = {
+        "old": datetime(2024, 1, 15, tzinfo=timezone.utc),
+        "mid": datetime(2025, 6, 1, tzinfo=timezone.utc),
+        "new": datetime(2026, 3, 1, tzinfo=timezone.utc),
+    }
+    for i, (name, ts) in enumerate(stamps.items()):
+        item_id = client.post("/items/", json={
+            "name": name, "description": "t", "price": 1, "available": True,
+            "email": f"{name}@t.com", "special_id": 1200 + i,
+        }).json()["id"]
+        db_session.query(Item).filter(Item.id == item_id).update({"created_at": ts})
+    db_session.commit()
+
+    r_after = client.get("/items/", params={"created_after": "2025-01-01T00:00:00Z"})
+    assert sorted(i["name"] for i in r_after.json()) == ["mid", "new"]
+
+    r_before = client.get("/items/", params={"created_before": "2025-06-01T00:00:00Z"})
+    assert [i["name"] for i in r_before.json()] == ["old"]
+
+    r_range = client.get("/items/", params={
+        "created_after": "2025-06-01T00:00:00Z",
+        "created_before": "2026-03-01T00:00:00Z",
+    })
+    assert [i["name"] for i in r_range.json()] == ["mid"]
+
+
 #
 # 4. Validation & Edge Cases (422 errors)
 #
@@ -0,0 +1,48 @@
+# fastapi_postgres_app/tests/test_lookup.py
+
+from fastapi.testclient import TestClient
+
+from fastapi_postgres_app.schemas import MAX_LOOKUP_KEYS
+
+
+def _create(client: TestClient, name: str, email: str, special_id: int) -> dict:
+    res = client.post("/items/", json={
+        "name": name, "description": "D", "price": 1, "available": True,
+        "email": email, "special_id": special_id,
+    })
+    assert res.status_code == 201
+    return res.json()
+
+
+def test_lookup_by_ids_emails_and_special_ids(client: TestClient):
+    a = _create(client, "A", "a@lookup.com", 3001)
+    b = _create(client, "B", "b@lookup.com", 3002)
+
+    res = client.post("/items/lookup", json={
+        "ids": [a["id"], 999999],
+        "emails": ["b@lookup.com", "nobody@lookup.com"],
+        "special_ids": [3001, 3002, 4040],
+    })
+    assert res.status_code == 200
+    data = res.json()
+
+    assert data["ids"][str(a["id"])]["found"] is True
+    assert data["ids"][str(a["id"])]["item"]["name"] == "A"
+    assert data["ids"]["999999"] == {"found": False, "item": None}
+
+    assert data["emails"]["b@lookup.com"]["item"]["id"] == b["id"]
+    assert data["emails"]["nobody@lookup.com"]["found"] is False
+
+    assert data["special_ids"]["3001"]["item"]["id"] == a["id"]
+    assert data["special_ids"]["3002"]["item"]["id"] == b["id"]
+    assert data["special_ids"]["4040"]["found"] is False
+
+
+def test_lookup_requires_at_least_one_key(client: TestClient):
+    res = client.post("/items/lookup", json={})
+    assert res.status_code == 422
+
+
+def test_lookup_rejects_too_many_keys(client: TestClient):
+    res = client.post("/items/lookup", json={"ids": list(range(MAX_LOOKUP_KEYS + 1))})
+    assert res.status_code == 422
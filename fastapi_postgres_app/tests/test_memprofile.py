@@ -0,0 +1,89 @@
+# fastapi_postgres_app/tests/test_memprofile.py
+
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_postgres_app import memprofile
+from fastapi_postgres_app.deps import require_full_access
+from fastapi_postgres_app.memprofile import MemoryProfiler, MemoryProfilingMiddleware
+
+retained = []
+
+
+def hold_memory():
+    retained.append(bytearray(4 * 1024 * 1024))
+
+
+@pytest.fixture()
+def memory_profiler(monkeypatch):
+    memory_profiler = MemoryProfiler(max_seconds=60, max_snapshots=2)
+    monkeypatch.setattr(memprofile, "profiler", memory_profiler)
+    yield memory_profiler
+    memory_profiler.stop()
+    retained.clear()
+
+
+def _app(memory_profiler: MemoryProfiler, admin: bool = True) -> TestClient:
+    profiled = FastAPI()
+    profiled.add_middleware(MemoryProfilingMiddleware, sample_rate=1, memory_profiler=memory_profiler)
+    profiled.include_router(memprofile.router)
+    if admin:
+        profiled.dependency_overrides[require_full_access] = lambda: None
+
+    @profiled.get("/allocate")
+    def allocate():
+        # 8 MiB at peak, nothing kept
+        return {"size": len(bytearray(8 * 1024 * 1024))}
+
+    return TestClient(profiled)
+
+
+def test_snapshot_diff_points_at_the_allocating_line(memory_profiler):
+    client = _app(memory_profiler)
+    assert client.post("/admin/memory/snapshots").status_code == 409
+
+    assert client.post("/admin/memory/start").json()["tracing"] is True
+    base = client.post("/admin/memory/snapshots").json()
+    hold_memory()
+    target = client.post("/admin/memory/snapshots", params={"limit": 5}).json()
+    assert target["size"] - base["size"] >= 4 * 1024 * 1024
+
+    diff = client.get("/admin/memory/diff", params={"base": base["id"], "target": target["id"]}).json()
+    top = diff["lines"][0]
+    assert top["file"] == __file__ and top["size_diff"] >= 4 * 1024 * 1024
+
+    # Only the newest two are kept
+    client.post("/admin/memory/snapshots")
+    assert client.get(f"/admin/memory/snapshots/{base['id']}").status_code == 404
+    assert [s["id"] for s in client.get("/admin/memory/").json()["snapshots"]] == [target["id"], target["id"] + 1]
+
+
+def test_sampled_request_peak(memory_profiler):
+    client = _app(memory_profiler)
+    client.get("/allocate")
+    assert client.get("/admin/memory/requests").json() == []  # not tracing
+
+    client.post("/admin/memory/start")
+    client.get("/allocate")
+    records = [r for r in client.get("/admin/memory/requests").json() if r["path"] == "/allocate"]
+    assert len(records) == 1
+    assert records[0]["status"] == 200
+    assert records[0]["peak_size"] >= 8 * 1024 * 1024
+    assert records[0]["retained_size"] < 1024 * 1024
+
+
+def test_tracing_stops_at_its_time_limit(memory_profiler):
+    client = _app(memory_profiler)
+    client.post("/admin/memory/start", params={"seconds": 0.05})
+    time.sleep(0.1)
+    status = client.get("/admin/memory/").json()
+    assert (status["tracing"], status["stopped_reason"]) == (False, "time limit")
+
+
+def test_requires_full_access(memory_profiler):
+    client = _app(memory_profiler, admin=False)
+    assert client.post("/admin/memory/start").status_code in (401, 403)
+    assert not memory_profiler.tracing
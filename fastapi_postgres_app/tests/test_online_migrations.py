@@ -0,0 +1,96 @@
+# fastapi_postgres_app/tests/test_online_migrations.py
+
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from fastapi_postgres_app.online_migrations import (
+    BACKFILL_TABLE,
+    create_index_online,
+    drop_index_online,
+    run_backfill,
+)
+
+
+@pytest.fixture()
+def conn(postgres_container):
+    engine = create_engine(os.getenv("DATABASE_URL"), isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        yield conn
+        conn.execute(text("DROP TABLE IF EXISTS online_scratch, online_parted"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {BACKFILL_TABLE}"))
+    engine.dispose()
+
+
+def test_backfill_runs_in_batches_and_resumes(conn):
+    conn.execute(text("CREATE TABLE online_scratch (id bigint PRIMARY KEY, n int, doubled int)"))
+    conn.execute(text("INSERT INTO online_scratch SELECT g, g, NULL FROM generate_series(1, 95) g"))
+    conn.execute(text("UPDATE online_scratch SET doubled = 0 WHERE id = 50"))
+
+    seen = []
+
+    def stop_after_two(name, last_id, max_id, rows, rate):
+        seen.append((last_id, rows))
+        if len(seen) == 2:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        run_backfill(conn, "double_n", "online_scratch", "doubled = n * 2",
+                     where="doubled IS NULL", batch_size=20, pause=0, progress=stop_after_two)
+    assert seen == [(20, 20), (40, 40)]
+    state = conn.execute(text(f"SELECT last_id, rows_updated FROM {BACKFILL_TABLE}")).one()
+    assert tuple(state) == (40, 40)
+
+    # Rerunning picks up at id 41; id 50 is skipped by the WHERE clause
+    seen.clear()
+    total = run_backfill(conn, "double_n", "online_scratch", "doubled = n * 2",
+                         where="doubled IS NULL", batch_size=20, pause=0,
+                         progress=lambda *args: seen.append((args[1], args[3])))
+    assert seen == [(60, 59), (80, 79), (95, 94)]
+    assert total == 94
+    mismatched = conn.execute(text(
+        "SELECT count(*) FROM online_scratch WHERE doubled <> n * 2 AND id <> 50"
+    )).scalar()
+    assert mismatched == 0
+
+    # A finished backfill is a no-op
+    assert run_backfill(conn, "double_n", "online_scratch", "doubled = -1", progress=None) == 94
+
+
+def _valid(conn, name):
+    return conn.execute(text(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"
+    ), {"name": name}).scalar()
+
+
+def test_create_index_online_replaces_invalid_index(conn):
+    conn.execute(text("CREATE TABLE online_scratch (id bigint PRIMARY KEY, n int)"))
+    conn.execute(text("INSERT INTO online_scratch SELECT g, g % 3 FROM generate_series(1, 50) g"))
+    # A unique build over duplicates fails and leaves an INVALID index behind
+    with pytest.raises(Exception):
+        create_index_online(conn, "ix_online_scratch_n", "online_scratch", "n", unique=True)
+    assert _valid(conn, "ix_online_scratch_n") is False
+
+    create_index_online(conn, "ix_online_scratch_n", "online_scratch", "n", where="n > 0")
+    assert _valid(conn, "ix_online_scratch_n") is True
+    # Idempotent
+    create_index_online(conn, "ix_online_scratch_n", "online_scratch", "n")
+
+    drop_index_online(conn, "ix_online_scratch_n")
+    assert _valid(conn, "ix_online_scratch_n") is None
+
+
+def test_create_index_online_on_partitioned_table(conn):
+    conn.execute(text("CREATE TABLE online_parted (id bigint, n int) PARTITION BY RANGE (id)"))
+    conn.execute(text("CREATE TABLE online_parted_a PARTITION OF online_parted FOR VALUES FROM (0) TO (100)"))
+    conn.execute(text("CREATE TABLE online_parted_b PARTITION OF online_parted FOR VALUES FROM (100) TO (200)"))
+    conn.execute(text("INSERT INTO online_parted SELECT g, g FROM generate_series(0, 199) g"))
+
+    create_index_online(conn, "ix_online_parted_n", "online_parted", "n, id")
+    assert _valid(conn, "ix_online_parted_n") is True
+    assert _valid(conn, "online_parted_a_ix_online_parted_n") is True
+    create_index_online(conn, "ix_online_parted_n", "online_parted", "n, id")
+
+    drop_index_online(conn, "ix_online_parted_n")
+    assert _valid(conn, "online_parted_b_ix_online_parted_n") is None
@@ -0,0 +1,175 @@
+# fastapi_postgres_app/tests/test_partitions.py
+
+import os
+from datetime import date, datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from fastapi_postgres_app import partitions
+from fastapi_postgres_app.models import Item
+from fastapi_postgres_app.partitions import (
+    _create_indexes,
+    convert_items_to_partitioned,
+    create_month_partition,
+    detach_partitions_before,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+    revert_items_partitioning,
+)
+
+ROWS = "SELECT id, name, price, created_at, email, special_id, version FROM items ORDER BY id"
+
+
+@pytest.fixture()
+def engine(db_session):
+    engine = create_engine(os.getenv("DATABASE_URL"))
+    yield engine
+    # An open transaction on items would block the rebuild
+    db_session.rollback()
+    with engine.begin() as conn:
+        revert_items_partitioning(conn)
+        conn.execute(text("DROP TABLE IF EXISTS items_p2020_01"))
+    engine.dispose()
+
+
+def _seed(db_session) -> None:
+    db_session.add_all([
+        Item(name=f"P{i}", price=i, available=True, email=f"p{i}@part.com", special_id=8800 + i,
+             created_at=datetime(2020, 1 + i, 15, tzinfo=timezone.utc))
+        for i in range(3)
+    ])
+    db_session.commit()
+
+
+def _convert(engine, db_session) -> None:
+    db_session.rollback()
+    with engine.begin() as conn:
+        convert_items_to_partitioned(conn, months_ahead=1)
+
+
+def _item(**overrides) -> dict:
+    item = {"name": "N", "description": "D", "price": 1, "available": True,
+            "email": "new@part.com", "special_id": 8900}
+    item.update(overrides)
+    return item
+
+
+def test_convert_keeps_rows_keys_and_sequence(client: TestClient, db_session, engine):
+    _seed(db_session)
+    before = db_session.execute(text(ROWS)).all()
+    _convert(engine, db_session)
+
+    with engine.connect() as conn:
+        assert is_partitioned(conn)
+        assert conn.execute(text(ROWS)).all() == before
+        assert {"items_p2020_01", "items_p2020_03", "items_default"} <= set(list_partitions(conn))
+        pkey = conn.execute(text(
+            "SELECT array_agg(a.attname ORDER BY a.attnum) FROM pg_index i "
+            "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
+            "WHERE i.indrelid = 'items'::regclass AND i.indisprimary"
+        )).scalar()
+        assert sorted(pkey) == ["created_at", "id"]
+        assert conn.execute(text("SELECT count(*) FROM item_keys")).scalar() == len(before)
+        indexed = conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'items'"
+        )).scalars().all()
+        assert {"ix_items_email", "ix_items_special_id", "ix_items_name_lower_c"} <= set(indexed)
+
+    res = client.post("/items/", json=_item())
+    assert res.status_code == 201
+    assert res.json()["id"] > max(row.id for row in before)
+
+
+def test_unique_keys_and_upserts_after_conversion(client: TestClient, db_session, engine):
+    _seed(db_session)
+    _convert(engine, db_session)
+
+    assert client.post("/items/", json=_item(email="p0@part.com")).status_code == 409
+    assert client.post("/items/", json=_item(special_id=8801)).status_code == 409
+    created = client.post("/items/", json=_item())
+    assert created.status_code == 201
+    assert client.patch(f"/items/{created.json()['id']}", json={"email": "p2@part.com"}).status_code == 409
+
+    res = client.post("/items/upsert", json=_item(price=5))
+    assert res.status_code == 501
+    assert res.json()["error"] == "NotImplemented"
+    assert client.post("/items/upsert/batch?on=email", json={"items": [_item()]}).status_code == 501
+    assert client.get(f"/items/{created.json()['id']}").json()["price"] == 1
+
+
+def test_ensure_is_idempotent_and_adopts_default_rows(client: TestClient, db_session, engine, capsys):
+    _seed(db_session)
+    _convert(engine, db_session)
+    partitions.main(["ensure", "--months-ahead", "2"])
+    first = capsys.readouterr().out.split()
+    with engine.begin() as conn:
+        existing = list_partitions(conn)
+        assert ensure_partitions(conn, 2) == first
+        assert list_partitions(conn) == existing
+
+    # No partition for 2035-06 yet: the row lands in the default partition
+    stranded = client.post("/items/", json=_item()).json()["id"]
+    db_session.execute(text("UPDATE items SET created_at = '2035-06-10' WHERE id = :id"), {"id": stranded})
+    db_session.commit()
+    with engine.begin() as conn:
+        assert create_month_partition(conn, date(2035, 6, 20)) == "items_p2035_06"
+        where = conn.execute(text("SELECT tableoid::regclass::text FROM items WHERE id = :id"),
+                             {"id": stranded}).scalar()
+        assert where == "items_p2035_06"
+    # Its keys are still taken
+    assert client.post("/items/", json=_item(special_id=8901)).status_code == 409
+    assert client.get(f"/items/{stranded}").status_code == 200
+
+
+def test_detach_frees_keys(client: TestClient, db_session, engine):
+    _seed(db_session)
+    _convert(engine, db_session)
+    with engine.begin() as conn:
+        assert detach_partitions_before(conn, date(2020, 2, 1)) == ["items_p2020_01"]
+        assert conn.execute(text("SELECT email FROM items_p2020_01")).scalars().all() == ["p0@part.com"]
+
+    res = client.post("/items/", json=_item(email="p0@part.com", special_id=8800))
+    assert res.status_code == 201
+    assert client.post("/items/", json=_item(email="p1@part.com")).status_code == 409
+
+
+def test_revert_round_trips(client: TestClient, db_session, engine):
+    _seed(db_session)
+    before = db_session.execute(text(ROWS)).all()
+    db_session.rollback()
+    partitions.main(["convert"])
+    with engine.begin() as conn:
+        revert_items_partitioning(conn)
+        assert not is_partitioned(conn)
+        assert conn.execute(text(ROWS)).all() == before
+        assert conn.execute(text("SELECT to_regclass('item_keys')")).scalar() is None
+
+    assert client.post("/items/", json=_item(email="p1@part.com")).status_code == 409
+    res = client.post("/items/upsert", json=_item(special_id=8801, email="p1@part.com", price=7))
+    assert res.status_code == 200
+    assert res.json()["status"] == "updated"
+
+
+def test_explicit_index_set_replaces_the_models(db_session, engine):
+    # As a migration passes it: only what existed at its revision
+    indexes = ["CREATE INDEX ix_items_created_at_brin ON items USING brin (created_at)"]
+    db_session.rollback()
+    with engine.begin() as conn:
+        convert_items_to_partitioned(conn, months_ahead=0, indexes=indexes)
+        names = set(conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'items'"
+        )).scalars())
+        assert names == {"items_pkey", "ix_items_created_at_brin", "ix_items_email", "ix_items_special_id"}
+
+        revert_items_partitioning(conn, indexes=indexes)
+        names = set(conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'items'"
+        )).scalars())
+        assert names == {"items_pkey", "items_email_key", "items_special_id_key", "ix_items_created_at_brin"}
+
+        # Back to the model's indexes for the rest of the suite
+        conn.execute(text("DROP INDEX ix_items_created_at_brin"))
+        _create_indexes(conn, None)
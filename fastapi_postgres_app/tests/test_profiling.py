@@ -0,0 +1,95 @@
+# fastapi_postgres_app/tests/test_profiling.py
+
+import json
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_postgres_app import profiling
+from fastapi_postgres_app.deps import require_full_access
+from fastapi_postgres_app.jwt_utils import create_access_token
+from fastapi_postgres_app.profiling import ProfileStore, ProfilingMiddleware
+
+
+def _token(perms: str) -> str:
+    return create_access_token({"permissions": perms}, timedelta(minutes=5))
+
+
+def slow_handler_body():
+    time.sleep(0.05)
+    return {"ok": True}
+
+
+@pytest.fixture()
+def profile_store(tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path), max_files=3)
+    monkeypatch.setattr(profiling, "store", store)
+    return store
+
+
+def _profiled_app(store: ProfileStore, sample_rate: int = 0) -> TestClient:
+    profiled = FastAPI()
+    profiled.add_middleware(
+        ProfilingMiddleware, sample_rate=sample_rate, interval_ms=1, profile_store=store
+    )
+    profiled.include_router(profiling.router)
+    profiled.dependency_overrides[require_full_access] = lambda: None
+
+    @profiled.get("/slow")
+    def slow():
+        return slow_handler_body()
+
+    return TestClient(profiled)
+
+
+def test_admin_header_produces_speedscope_profile(profile_store):
+    client = _profiled_app(profile_store)
+    res = client.get("/slow", headers={
+        "X-Profile": "1", "Authorization": f"Bearer {_token('full_access')}",
+    })
+    assert res.status_code == 200
+    name = res.headers["X-Profile-Id"]
+
+    data = json.loads(profile_store.path(name).read_text())
+    assert data["profiles"] and data["profiles"][0]["type"] == "sampled"
+    frame_names = {f["name"] for f in data["shared"]["frames"]}
+    assert "slow_handler_body" in frame_names
+
+
+def test_header_without_full_access_is_ignored(profile_store):
+    client = _profiled_app(profile_store)
+    res = client.get("/slow", headers={
+        "X-Profile": "1", "Authorization": f"Bearer {_token('read_write')}",
+    })
+    assert res.status_code == 200
+    assert "X-Profile-Id" not in res.headers
+    assert profile_store.list() == []
+
+
+def test_sampling_rate_and_bounded_directory(profile_store):
+    client = _profiled_app(profile_store, sample_rate=1)
+    for _ in range(5):
+        client.get("/slow")
+    assert len(profile_store.list()) == 3
+
+
+def test_admin_endpoint_lists_and_serves_profiles(profile_store):
+    client = _profiled_app(profile_store, sample_rate=1)
+    client.get("/slow")
+    listing = client.get("/admin/profiles/")
+    assert listing.status_code == 200
+    name = listing.json()[0]["name"]
+
+    download = client.get(f"/admin/profiles/{name}")
+    assert download.status_code == 200
+    assert "profiles" in download.json()
+
+    assert client.get("/admin/profiles/..%2Fetc%2Fpasswd").status_code == 404
+
+
+@pytest.mark.skipif(profiling.PROFILING_ENABLED, reason="profiling is enabled in this environment")
+def test_admin_endpoint_not_mounted_when_disabled(client: TestClient):
+    assert client.get("/admin/profiles/").status_code == 404
@@ -0,0 +1,43 @@
+# fastapi_postgres_app/tests/test_query_budgets.py
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from fastapi_postgres_app import main, querycount
+from fastapi_postgres_app.querycount import QueryBudget, QueryBudgetExceeded
+
+ITEM = {"name": "A", "description": "d", "price": 1, "available": True, "email": "a@q.com", "special_id": 1}
+
+
+def test_every_items_route_declares_a_budget():
+    missing = [
+        f"{sorted(route.methods)} {route.path}"
+        for route in main.app.routes
+        if isinstance(route, APIRoute) and route.path.startswith("/items")
+        and not hasattr(route.endpoint, "query_budget")
+    ]
+    assert missing == []
+
+
+def test_query_count_headers(client: TestClient, monkeypatch):
+    monkeypatch.setattr(querycount, "QUERY_COUNT_HEADER", True)
+    item_id = client.post("/items/", json=ITEM).json()["id"]
+
+    res = client.get(f"/items/{item_id}")
+    assert (res.headers["X-Query-Count"], res.headers["X-Query-Rows"]) == ("1", "1")
+    res = client.get("/items/999999")
+    assert (res.headers["X-Query-Count"], res.headers["X-Query-Rows"]) == ("1", "0")
+    # No database work at all
+    assert client.get("/metrics").headers["X-Query-Count"] == "0"
+
+
+def test_over_budget_request_fails(client: TestClient, monkeypatch):
+    item_id = client.post("/items/", json=ITEM).json()["id"]
+    monkeypatch.setattr(main.read_item, "query_budget", QueryBudget(statements=0))
+    with pytest.raises(QueryBudgetExceeded, match=r"GET /items/\{item_id\} ran 1 statements; its budget is 0"):
+        client.get(f"/items/{item_id}")
+
+    monkeypatch.setattr(main.read_item, "query_budget", QueryBudget(statements=1, rows=0))
+    with pytest.raises(QueryBudgetExceeded, match="fetched 1 rows"):
+        client.get(f"/items/{item_id}")
@@ -0,0 +1,122 @@
+# fastapi_postgres_app/tests/test_serve.py
+
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from fastapi_postgres_app.metrics import FileCollector, Registry
+from fastapi_postgres_app.serve import pool_size_for
+
+
+def test_pool_size_splits_the_connection_budget():
+    assert pool_size_for(40, 4) == 10
+    assert pool_size_for(10, 3) == 3
+    with pytest.raises(ValueError):
+        pool_size_for(3, 4)
+
+
+def _worker(directory, filename):
+    registry = Registry()
+    collector = FileCollector(registry, str(directory), flush_seconds=0)
+    # Pretend to be another process
+    collector._pid, collector._filename = os.getpid(), filename
+    requests = registry.counter("requests_total", "Requests")
+    latency = registry.histogram("latency_seconds", "Latency", buckets=[0.1, 1])
+    return collector, requests, latency
+
+
+def test_file_collector_sums_workers_and_keeps_exited_ones(tmp_path):
+    first, first_requests, first_latency = _worker(tmp_path, "101-aaaa.json")
+    second, second_requests, second_latency = _worker(tmp_path, "102-bbbb.json")
+    first_requests.inc(2, route="a")
+    first_latency.observe(0.05)
+    second_requests.inc(3, route="a")
+    second_requests.inc(route="b")
+    second_latency.observe(0.5)
+    second.flush()
+
+    text = first.render()
+    assert 'requests_total{route="a"} 5' in text
+    assert 'requests_total{route="b"} 1' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert "latency_seconds_count 2" in text
+
+    # The supervisor folds an exited worker into the archive
+    first.archive(102)
+    assert not (tmp_path / "102-bbbb.json").exists()
+    first_requests.inc(route="a")
+    assert 'requests_total{route="a"} 6' in first.render()
+
+    # Restarted workers do not grow the archive's file list
+    for pid in range(103, 106):
+        worker, worker_requests, _ = _worker(tmp_path, f"{pid}-cccc.json")
+        worker_requests.inc(route="a")
+        worker.flush()
+        first.archive(pid)
+    assert json.loads((tmp_path / "archive.json").read_text())["files"] == ["105-cccc.json"]
+    assert 'requests_total{route="a"} 9' in first.render()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(port: int, path: str, **headers) -> str:
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", headers=headers)
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.read().decode("latin-1")
+
+
+def test_serve_aggregates_metrics_across_workers(postgres_container, tmp_path):
+    port = _free_port()
+    env = dict(os.environ, METRICS_DIR=str(tmp_path), METRICS_FLUSH_SECONDS="0.1",
+               DB_CONNECTION_BUDGET="4", SNAPSHOT_ENABLED="false", SUGGEST_INDEX_ENABLED="false",
+               METRICS_TOKEN="scrape-secret")
+    scrape = {"Authorization": "Bearer scrape-secret"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "fastapi_postgres_app.serve", "--port", str(port), "--workers", "2",
+         "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                _get(port, "/metrics", **scrape)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        for _ in range(10):
+            # New connection each time, so both workers get some
+            _get(port, "/openapi.json", **{"Accept-Encoding": "gzip"})
+        assert len(list(tmp_path.glob("*.json"))) == 2
+
+        line = 'http_compression_ratio_count{encoding="gzip"} 10'
+        deadline = time.monotonic() + 5
+        while line not in _get(port, "/metrics", **scrape):
+            assert time.monotonic() < deadline, _get(port, "/metrics", **scrape)
+            time.sleep(0.1)
+
+        # A rolling restart keeps the node totals
+        server.send_signal(signal.SIGHUP)
+        deadline = time.monotonic() + 10
+        while not (tmp_path / "archive.json").exists() or len(list(tmp_path.glob("*-*.json"))) < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+        assert line in _get(port, "/metrics", **scrape)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=30) == 0
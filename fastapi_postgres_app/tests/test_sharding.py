@@ -0,0 +1,191 @@
+# fastapi_postgres_app/tests/test_sharding.py
+
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+from fastapi_postgres_app import querycount
+from fastapi_postgres_app.main import app, get_db
+from fastapi_postgres_app.deps import (
+    require_read_only,
+    require_read_write,
+    require_full_access,
+)
+from fastapi_postgres_app.sharding import ShardSet, shard_for_id, shard_for_special_id
+
+SHARD_DATABASES = ["items_shard_0", "items_shard_1", "items_shard_2"]
+
+
+@pytest.fixture()
+def shard_set(db_session):
+    """Three shard databases on the test server; the test DB is the directory."""
+    base_url = make_url(os.environ["DATABASE_URL"])
+    admin = create_engine(base_url, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        for name in SHARD_DATABASES:
+            conn.execute(text(f"DROP DATABASE IF EXISTS {name}"))
+            conn.execute(text(f"CREATE DATABASE {name}"))
+
+    shards = ShardSet(
+        [base_url.set(database=name).render_as_string(hide_password=False) for name in SHARD_DATABASES],
+        directory=db_session.get_bind(),
+    )
+    shards.prepare()
+    yield shards
+
+    for engine in shards.engines.values():
+        engine.dispose()
+    with admin.connect() as conn:
+        for name in SHARD_DATABASES:
+            conn.execute(text(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)"))
+    admin.dispose()
+
+
+@pytest.fixture()
+def sharded_client(shard_set, monkeypatch):
+    # Query budgets are per database; scatter-gather runs one statement per shard
+    monkeypatch.setattr(querycount, "QUERY_BUDGETS_ENFORCED", False)
+
+    def override_get_db():
+        db = shard_set.sessionmaker()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[require_read_only] = lambda: None
+    app.dependency_overrides[require_read_write] = lambda: None
+    app.dependency_overrides[require_full_access] = lambda: None
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def _item(special_id: int, **overrides) -> dict:
+    item = {
+        "name": f"S{special_id}", "description": "sharded", "price": special_id % 7,
+        "available": True, "email": f"s{special_id}@shard.com", "special_id": special_id,
+    }
+    item.update(overrides)
+    return item
+
+
+def _special_ids_on_distinct_shards(count: int):
+    first, second = 1, 2
+    while shard_for_special_id(second, count) == shard_for_special_id(first, count):
+        second += 1
+    return first, second
+
+
+def test_items_are_routed_by_special_id(sharded_client: TestClient, shard_set):
+    for sid in range(1, 13):
+        res = sharded_client.post("/items/", json=_item(sid))
+        assert res.status_code == 201
+        item_id = res.json()["id"]
+        expected = shard_for_special_id(sid, shard_set.count)
+        # ids encode their shard, so later by-id reads need no lookup
+        assert shard_for_id(item_id, shard_set.count) == expected
+        with shard_set.engines[expected].connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM items WHERE id = :id"), {"id": item_id}).scalar() == 1
+
+        fetched = sharded_client.get(f"/items/{item_id}")
+        assert fetched.status_code == 200
+        assert fetched.json()["special_id"] == sid
+
+
+def test_email_unique_across_shards(sharded_client: TestClient, shard_set):
+    a, b = _special_ids_on_distinct_shards(shard_set.count)
+    assert sharded_client.post("/items/", json=_item(a, email="same@shard.com")).status_code == 201
+    res = sharded_client.post("/items/", json=_item(b, email="same@shard.com"))
+    assert res.status_code == 409
+
+    # the failed write released nothing it did not own; a new email still works
+    assert sharded_client.post("/items/", json=_item(b)).status_code == 201
+
+
+def test_update_delete_and_email_release(sharded_client: TestClient, shard_set):
+    a, b = _special_ids_on_distinct_shards(shard_set.count)
+    item_id = sharded_client.post("/items/", json=_item(a, email="old@shard.com")).json()["id"]
+
+    res = sharded_client.patch(f"/items/{item_id}", json={"email": "new@shard.com", "price": 99})
+    assert res.status_code == 200
+    assert res.json()["price"] == 99
+    # the old email is free again, on any shard
+    assert sharded_client.post("/items/", json=_item(b, email="old@shard.com")).status_code == 201
+
+    assert sharded_client.patch(f"/items/{item_id}", json={"special_id": 424242}).status_code == 422
+    # version 1 became 2 with the email change above
+    assert sharded_client.patch(f"/items/{item_id}", json={"price": 1}, headers={"If-Match": '"1"'}).status_code == 412
+    assert sharded_client.delete(f"/items/{item_id}", headers={"If-Match": '"1"'}).status_code == 412
+
+    assert sharded_client.delete(f"/items/{item_id}").status_code == 204
+    assert sharded_client.get(f"/items/{item_id}").status_code == 404
+
+
+def test_read_items_merge_sorts_across_shards(sharded_client: TestClient, monkeypatch):
+    for sid in range(1, 21):
+        sharded_client.post("/items/", json=_item(sid))
+
+    monkeypatch.setattr(querycount, "QUERY_COUNT_HEADER", True)
+    res = sharded_client.get("/items/?sort=-price,special_id")
+    expected = sorted(range(1, 21), key=lambda sid: (-(sid % 7), sid))
+    assert [i["special_id"] for i in res.json()] == expected
+    # Counted across the scatter-gather threads: one query per shard
+    assert (res.headers["X-Query-Count"], res.headers["X-Query-Rows"]) == ("3", "20")
+
+    page = sharded_client.get("/items/?sort=-price,special_id&limit=5&offset=3").json()
+    assert [i["special_id"] for i in page] == expected[3:8]
+
+    stats = sharded_client.get("/items/stats").json()
+    assert (stats["count"], stats["price_max"], stats["price_sum"]) == (20, 6, sum(s % 7 for s in range(1, 21)))
+
+
+def test_lookup_and_upsert_on_shards(sharded_client: TestClient):
+    created = sharded_client.post("/items/", json=_item(5)).json()
+
+    res = sharded_client.post("/items/lookup", json={
+        "ids": [created["id"]], "emails": ["s5@shard.com", "none@shard.com"], "special_ids": [5, 6],
+    }).json()
+    assert res["ids"][str(created["id"])]["found"] is True
+    assert res["emails"]["s5@shard.com"]["item"]["id"] == created["id"]
+    assert res["emails"]["none@shard.com"]["found"] is False
+    assert res["special_ids"]["6"]["found"] is False
+
+    batch = sharded_client.post("/items/upsert/batch", json={"items": [
+        _item(5, price=50, email="moved@shard.com"), _item(6),
+    ]}).json()
+    assert [r["status"] for r in batch] == ["updated", "inserted"]
+    assert batch[0]["item"]["id"] == created["id"]
+    # s5@shard.com was released by the upsert that replaced it
+    assert sharded_client.post("/items/", json=_item(7, email="s5@shard.com")).status_code == 201
+
+
+def test_idempotent_create_on_shards(sharded_client: TestClient, shard_set):
+    headers = {"Idempotency-Key": "shard-key"}
+    first = sharded_client.post("/items/", json=_item(7), headers=headers)
+    retry = sharded_client.post("/items/", json=_item(7), headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    with shard_set.directory.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM idempotency_keys")).scalar() == 1
+
+
+def test_bulk_update_and_delete_on_shards(sharded_client: TestClient, shard_set):
+    for sid in range(1, 10):
+        sharded_client.post("/items/", json=_item(sid, available=sid % 3 != 0))
+
+    res = sharded_client.patch("/items/bulk", json={"filters": {"available": False}, "changes": {"price": 50}})
+    assert res.json() == {"affected": 3, "dry_run": False}
+    assert {i["special_id"] for i in sharded_client.get("/items/?price_gt=40").json()} == {3, 6, 9}
+
+    res = sharded_client.request("DELETE", "/items/bulk", json={"filters": {"price_gt": 40}, "dry_run": True})
+    assert res.json() == {"affected": 3, "dry_run": True}
+    res = sharded_client.request("DELETE", "/items/bulk", json={"filters": {"price_gt": 40}})
+    assert res.json() == {"affected": 3, "dry_run": False}
+    assert len(sharded_client.get("/items/").json()) == 6
+    # The emails are free again
+    assert sharded_client.post("/items/", json=_item(3)).status_code == 201
@@ -0,0 +1,121 @@
+# fastapi_postgres_app/tests/test_similar.py
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from fastapi_postgres_app import main
+from fastapi_postgres_app.models import Item
+from fastapi_postgres_app.similar import SimilarityIndex
+
+TEXTS = [
+    ("Apple pie", "Baked apple dessert with cinnamon"),
+    ("Apple tart", "French apple dessert"),
+    ("Claw hammer", "Steel hammer for nails"),
+    ("Sledge hammer", "Heavy steel hammer"),
+    ("Cherry pie", "Baked cherry dessert"),
+]
+
+
+def _seed(client: TestClient) -> dict:
+    return {
+        name: client.post("/items/", json={
+            "name": name, "description": description, "price": 1, "available": True,
+            "email": f"sim{i}@sim.com", "special_id": 9500 + i,
+        }).json()["id"]
+        for i, (name, description) in enumerate(TEXTS)
+    }
+
+
+def _similar(client: TestClient, item_id: int, limit: int = 10) -> list:
+    res = client.get(f"/items/{item_id}/similar", params={"limit": limit})
+    assert res.status_code == 200
+    return [(match["item"]["name"], match["score"]) for match in res.json()]
+
+
+@pytest.fixture()
+def similar_index(db_session, monkeypatch):
+    index = SimilarityIndex([db_session.get_bind()], refresh_seconds=0, path=None)
+    monkeypatch.setattr(main, "similar_index", index)
+    return index
+
+
+def test_similar_items_ranked_by_text(client: TestClient, similar_index):
+    ids = _seed(client)
+    similar_index.load()
+
+    matches = _similar(client, ids["Apple pie"])
+    names = [name for name, _ in matches]
+    assert names[:2] == ["Apple tart", "Cherry pie"]
+    assert "Apple pie" not in names
+    scores = [score for _, score in matches]
+    assert scores == sorted(scores, reverse=True) and 0 < scores[-1] <= scores[0] <= 1
+
+    assert [name for name, _ in _similar(client, ids["Claw hammer"], limit=1)] == ["Sledge hammer"]
+    assert client.get("/items/999999/similar").status_code == 404
+
+
+def test_index_follows_writes(client: TestClient, db_session, similar_index):
+    ids = _seed(client)
+    similar_index.load()
+
+    client.patch(f"/items/{ids['Cherry pie']}", json={"name": "Claw hammer set", "description": "Steel hammer"})
+    client.delete(f"/items/{ids['Sledge hammer']}")
+    names = [name for name, _ in _similar(client, ids["Claw hammer"])]
+    assert names[0] == "Claw hammer set"
+    assert "Sledge hammer" not in names
+
+    # Written behind the index's back: embedded on the fly from Postgres
+    outsider = Item(name="Apple crumble", description="Baked apple dessert", price=1, available=True,
+                    email="out@sim.com", special_id=9600)
+    db_session.add(outsider)
+    db_session.commit()
+    assert _similar(client, outsider.id, limit=1)[0][0] == "Apple pie"
+
+
+def test_persisted_index_only_embeds_changes(client: TestClient, db_session, tmp_path):
+    ids = _seed(client)
+    path = str(tmp_path / "similar.npy")
+    first = SimilarityIndex([db_session.get_bind()], refresh_seconds=0, path=path)
+    first.load()
+    assert first.embedded == len(TEXTS)
+
+    db_session.execute(update(Item).where(Item.id == ids["Apple tart"])
+                       .values(description="Apple and pear", version=Item.version + 1))
+    db_session.commit()
+
+    restarted = SimilarityIndex([db_session.get_bind()], refresh_seconds=0, path=path)
+    restarted.load()
+    assert restarted.embedded == 1
+
+    # The version check caught the edit: same results as a cold build
+    cold = SimilarityIndex([db_session.get_bind()], refresh_seconds=0, path=None)
+    cold.load()
+    for item_id in ids.values():
+        assert restarted.similar(item_id, 5) == cold.similar(item_id, 5)
+
+
+def test_ivf_probing_every_list_matches_exact_search(db_session):
+    words = ["apple", "pear", "hammer", "nail", "cherry", "steel", "tart", "pie", "drill", "saw"]
+    db_session.execute(Item.__table__.insert(), [
+        {"name": f"{words[i % 10]} {words[i * 3 % 10]}", "description": f"{words[i * 7 % 10]} item {i}",
+         "price": 1, "available": True, "email": f"ivf{i}@sim.com", "special_id": 9700 + i}
+        for i in range(60)
+    ])
+    db_session.commit()
+    engines = [db_session.get_bind()]
+    exact = SimilarityIndex(engines, refresh_seconds=0, path=None, batch_rows=16)
+    ivf = SimilarityIndex(engines, refresh_seconds=0, path=None, batch_rows=16, ivf_lists=4, ivf_probes=4)
+    exact.load()
+    ivf.load()
+    assert ivf.centroids.shape == (4, exact.dimensions)
+
+    for item_id in exact.ids[:10].tolist():
+        assert ivf.similar(item_id, 5) == exact.similar(item_id, 5)
+
+
+def test_similar_needs_the_index(client: TestClient, monkeypatch):
+    monkeypatch.setattr(main, "similar_index", None)
+    res = client.get("/items/1/similar")
+    assert res.status_code == 501
+    assert res.json()["error"] == "NotImplemented"
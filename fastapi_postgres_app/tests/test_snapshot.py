@@ -0,0 +1,108 @@
+# fastapi_postgres_app/tests/test_snapshot.py
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from fastapi_postgres_app import main
+from fastapi_postgres_app.models import Item
+from fastapi_postgres_app.snapshot import ItemSnapshot
+
+QUERIES = [
+    "",
+    "?available=true",
+    "?price_gt=20&sort=-price",
+    "?price_lt=40&sort=price,-id&limit=3&offset=1",
+    "?sort=-price&limit=4",
+    "?available=false&sort=created_at",
+]
+
+
+def _seed(client: TestClient):
+    prices = [10, None, 30, 20, 50, None, 40, 20]
+    for i, price in enumerate(prices):
+        client.post("/items/", json={
+            "name": f"Snap {i}", "description": "s", "price": price, "available": i % 3 != 0,
+            "email": f"snap{i}@snap.com", "special_id": 9100 + i,
+        })
+
+
+@pytest.fixture()
+def snapshot(db_session, monkeypatch):
+    snap = ItemSnapshot([db_session.get_bind()], refresh_seconds=0)
+    monkeypatch.setattr(main, "snapshot", snap)
+    return snap
+
+
+def _ids(client: TestClient, query: str):
+    return [item["id"] for item in client.get(f"/items/{query}").json()]
+
+
+def test_snapshot_matches_database(client: TestClient, snapshot, monkeypatch):
+    _seed(client)
+    snapshot.load()
+
+    from_snapshot = {q: _ids(client, q) for q in QUERIES}
+    stats_snapshot = client.get("/items/stats?price_gt=15").json()
+
+    monkeypatch.setattr(main, "snapshot", None)
+    assert {q: _ids(client, q) for q in QUERIES} == from_snapshot
+    assert client.get("/items/stats?price_gt=15").json() == stats_snapshot
+    assert stats_snapshot["count"] == 5 and stats_snapshot["price_min"] == 20
+
+
+def test_snapshot_follows_writes(client: TestClient, snapshot, db_session):
+    snapshot.load()
+    _seed(client)  # applied incrementally through the handlers
+    cheap = _ids(client, "?price_lt=15")
+    assert len(cheap) == 1
+
+    client.patch(f"/items/{cheap[0]}", json={"price": 99})
+    assert _ids(client, "?price_lt=15") == []
+    assert _ids(client, "?price_gt=90") == [cheap[0]]
+
+    client.delete(f"/items/{cheap[0]}")
+    assert _ids(client, "?price_gt=90") == []
+
+    # rows written behind the app's back appear after a reload
+    past = datetime.now(timezone.utc) - timedelta(days=400)
+    db_session.add(Item(name="direct", description="d", price=1, available=True,
+                        email="direct@snap.com", special_id=9999, created_at=past))
+    db_session.commit()
+    assert _ids(client, "?price_lt=2") == []
+    snapshot.load()
+    before = (past + timedelta(days=1)).isoformat().replace("+", "%2B")
+    assert len(_ids(client, f"?price_lt=2&created_before={before}")) == 1
+
+
+def test_naive_datetimes_are_utc_in_both_paths(client: TestClient, snapshot, db_session, monkeypatch):
+    stamp = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+    db_session.add(Item(name="noon", description="n", price=1, available=True,
+                        email="noon@snap.com", special_id=9998, created_at=stamp))
+    db_session.commit()
+    # A session TimeZone far from UTC would shift naive bounds in SQL
+    db_session.execute(text("SET TimeZone = 'America/New_York'"))
+    db_session.commit()
+    snapshot.load()
+
+    queries = ["?created_after=2024-03-01T11:00:00", "?created_after=2024-03-01T13:00:00",
+               "?created_before=2024-03-01T13:00:00", "?created_before=2024-03-01T11:00:00"]
+    from_snapshot = [_ids(client, q) for q in queries]
+    assert [len(ids) for ids in from_snapshot] == [1, 0, 1, 0]
+    monkeypatch.setattr(main, "snapshot", None)
+    assert [_ids(client, q) for q in queries] == from_snapshot
+
+
+def test_stats_without_snapshot(client: TestClient):
+    assert client.get("/items/stats").json() == {
+        "count": 0, "available_count": 0, "price_count": 0, "price_min": None,
+        "price_max": None, "price_sum": None, "price_avg": None,
+    }
+    _seed(client)
+    stats = client.get("/items/stats?available=true").json()
+    assert stats["count"] == 5
+    assert stats["price_count"] == 3
+    assert stats["price_sum"] == 30 + 50 + 20
+    assert stats["price_avg"] == pytest.approx(100 / 3)
@@ -0,0 +1,55 @@
+# fastapi_postgres_app/tests/test_sorting.py
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from fastapi_postgres_app.queries import items_query
+from fastapi_postgres_app.models import Item
+
+
+def _seed(client: TestClient):
+    rows = [("B", 30), ("A", 10), ("C", 20), ("D", 10)]
+    for i, (name, price) in enumerate(rows):
+        client.post("/items/", json={
+            "name": name, "description": "s", "price": price, "available": True,
+            "email": f"{name.lower()}@sort.com", "special_id": 8000 + i,
+        })
+
+
+def test_sort_by_multiple_columns(client: TestClient):
+    _seed(client)
+    res = client.get("/items/?sort=price,-name")
+    assert res.status_code == 200
+    assert [i["name"] for i in res.json()] == ["D", "A", "C", "B"]
+
+
+def test_sort_descending_with_limit_and_offset(client: TestClient):
+    _seed(client)
+    res = client.get("/items/?sort=-price&limit=2&offset=1")
+    assert [i["name"] for i in res.json()] == ["C", "D"]
+
+
+def test_sort_rejects_unknown_column(client: TestClient):
+    res = client.get("/items/?sort=email")
+    assert res.status_code == 422
+    assert res.json()["error"] == "InvalidSort"
+
+
+def test_filtered_sorted_page_uses_index_without_sort(db_session):
+    db_session.execute(Item.__table__.insert(), [
+        {"name": f"n{i}", "description": "d", "price": i % 500,
+         "available": i % 2 == 0, "email": f"e{i}@plan.com", "special_id": 100000 + i}
+        for i in range(5000)
+    ])
+    db_session.commit()
+    db_session.execute(text("ANALYZE items"))
+
+    stmt, params = items_query(available=True, sort="price", limit=20)
+    sql = stmt.params(**params).compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    plan = "\n".join(row[0] for row in db_session.execute(text(f"EXPLAIN {sql}")))
+
+    assert "ix_items_available_price_id" in plan
+    assert "Sort" not in plan
@@ -0,0 +1,106 @@
+# fastapi_postgres_app/tests/test_suggest.py
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from fastapi_postgres_app import main
+from fastapi_postgres_app.models import Item
+from fastapi_postgres_app.suggest import SUGGEST_STATEMENT, NameIndex
+
+NAMES = ["Apple", "apricot", "Banana", "app store", "APPLE pie", "Zebra", "ap_x"]
+EXPECTED_AP = ["ap_x", "app store", "Apple", "APPLE pie", "apricot"]
+
+
+def _seed(client: TestClient):
+    return {
+        name: client.post("/items/", json={
+            "name": name, "description": "s", "price": 1, "available": True,
+            "email": f"sug{i}@sug.com", "special_id": 9300 + i,
+        }).json()["id"]
+        for i, name in enumerate(NAMES)
+    }
+
+
+def _names(client: TestClient, query: str):
+    return [s["name"] for s in client.get(f"/items/suggest?{query}").json()]
+
+
+@pytest.fixture()
+def name_index(db_session, monkeypatch):
+    index = NameIndex([db_session.get_bind()], refresh_seconds=0)
+    monkeypatch.setattr(main, "suggest_index", index)
+    return index
+
+
+def test_suggest_from_database(client: TestClient):
+    ids = _seed(client)
+    res = client.get("/items/suggest?prefix=AP")
+    assert res.status_code == 200
+    assert [s["name"] for s in res.json()] == EXPECTED_AP
+    assert res.json()[2]["id"] == ids["Apple"]
+
+    assert _names(client, "prefix=app&limit=2") == ["app store", "Apple"]
+    # LIKE wildcards are plain characters here
+    assert _names(client, "prefix=a%25") == []
+    assert client.get("/items/suggest?prefix=").status_code == 422
+
+
+def test_name_index_matches_database_and_follows_writes(client: TestClient, name_index):
+    ids = _seed(client)
+    name_index.load()
+    assert _names(client, "prefix=ap") == EXPECTED_AP
+
+    client.patch(f"/items/{ids['Banana']}", json={"name": "Apex"})
+    client.delete(f"/items/{ids['apricot']}")
+    expected = ["ap_x", "Apex", "app store", "Apple", "APPLE pie"]
+    assert _names(client, "prefix=ap") == expected
+
+    name_index.load()
+    assert _names(client, "prefix=ap") == expected
+
+
+UNICODE_NAMES = ["İstanbul", "istanbul kebab", "Straße", "STRASSE", "ΣΟΦΟΣ", "σοφός", "Ärger", "ärmel"]
+
+
+UNICODE_PREFIXES = {
+    "İs": ["İstanbul", "istanbul kebab"],
+    "ist": ["İstanbul", "istanbul kebab"],
+    "STRAß": ["Straße"],
+    "stras": ["STRASSE"],
+    "ΣΟΦΟΣ": ["ΣΟΦΟΣ"],
+    "σοφό": ["σοφός"],
+    "är": ["Ärger", "ärmel"],
+}
+
+
+def test_name_index_and_database_agree_on_non_ascii(client: TestClient, db_session):
+    for i, name in enumerate(UNICODE_NAMES):
+        client.post("/items/", json={
+            "name": name, "description": "u", "price": 1, "available": True,
+            "email": f"uni{i}@sug.com", "special_id": 9400 + i,
+        })
+    index = NameIndex([db_session.get_bind()], refresh_seconds=0)
+    index.load()
+    for prefix, expected in UNICODE_PREFIXES.items():
+        from_db = _names(client, f"prefix={prefix}")
+        assert from_db == [s["name"] for s in index.suggest(prefix, 10)] == expected, prefix
+
+
+def test_prefix_query_uses_index_without_sort(db_session):
+    db_session.execute(Item.__table__.insert(), [
+        {"name": f"name {i:05d}", "description": "d", "price": 1, "available": True,
+         "email": f"p{i}@plan.com", "special_id": 200000 + i}
+        for i in range(5000)
+    ])
+    db_session.commit()
+    db_session.execute(text("ANALYZE items"))
+
+    sql = SUGGEST_STATEMENT.params(low="name 01", high="name 02", limit=10).compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    plan = "\n".join(row[0] for row in db_session.execute(text(f"EXPLAIN {sql}")))
+
+    assert "ix_items_name_lower_c" in plan
+    assert "Sort" not in plan
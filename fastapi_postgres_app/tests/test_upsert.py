@@ -0,0 +1,66 @@
+# fastapi_postgres_app/tests/test_upsert.py
+
+from fastapi.testclient import TestClient
+
+
+def _item(**overrides) -> dict:
+    item = {
+        "name": "U", "description": "D", "price": 10, "available": True,
+        "email": "u@upsert.com", "special_id": 7001,
+    }
+    item.update(overrides)
+    return item
+
+
+def test_upsert_inserts_then_updates(client: TestClient):
+    r1 = client.post("/items/upsert", json=_item())
+    assert r1.status_code == 201
+    assert r1.json()["status"] == "inserted"
+    item_id = r1.json()["item"]["id"]
+    assert r1.headers["Location"] == f"/items/{item_id}"
+
+    r2 = client.post("/items/upsert", json=_item(price=25, name="U2"))
+    assert r2.status_code == 200
+    assert r2.json()["status"] == "updated"
+    assert r2.json()["item"]["id"] == item_id
+    assert r2.json()["item"]["price"] == 25
+    assert r2.json()["item"]["name"] == "U2"
+
+
+def test_upsert_keyed_on_email(client: TestClient):
+    r1 = client.post("/items/upsert?on=email", json=_item())
+    item_id = r1.json()["item"]["id"]
+
+    r2 = client.post("/items/upsert?on=email", json=_item(special_id=7999))
+    assert r2.status_code == 200
+    assert r2.json()["status"] == "updated"
+    assert r2.json()["item"]["id"] == item_id
+    assert r2.json()["item"]["special_id"] == 7999
+
+
+def test_upsert_conflict_on_other_column_returns_409(client: TestClient):
+    client.post("/items/", json=_item(email="taken@upsert.com", special_id=7100))
+    res = client.post("/items/upsert", json=_item(email="taken@upsert.com", special_id=7101))
+    assert res.status_code == 409
+    assert res.json()["error"] == "UniqueViolation"
+
+
+def test_batch_upsert_reports_status_per_row(client: TestClient):
+    client.post("/items/", json=_item(email="old@upsert.com", special_id=7200, price=1))
+    res = client.post("/items/upsert/batch", json={"items": [
+        _item(email="new@upsert.com", special_id=7201),
+        _item(email="old@upsert.com", special_id=7200, price=99),
+    ]})
+    assert res.status_code == 200
+    data = res.json()
+    assert [r["status"] for r in data] == ["inserted", "updated"]
+    assert data[1]["item"]["price"] == 99
+
+
+def test_batch_upsert_rejects_duplicate_keys(client: TestClient):
+    res = client.post("/items/upsert/batch", json={"items": [
+        _item(email="a@upsert.com", special_id=7300),
+        _item(email="b@upsert.com", special_id=7300),
+    ]})
+    assert res.status_code == 422
+    assert res.json()["error"] == "DuplicateKey"
@@ -0,0 +1,72 @@
+# fastapi_postgres_app/tests/test_versioning.py
+
+from fastapi.testclient import TestClient
+
+
+def _create(client: TestClient, special_id: int = 7100) -> dict:
+    res = client.post("/items/", json={
+        "name": "Versioned", "description": "v", "price": 5, "available": True,
+        "email": f"v{special_id}@ver.com", "special_id": special_id,
+    })
+    assert res.headers["ETag"] == '"1"'
+    return res.json()
+
+
+def test_etag_tracks_version(client: TestClient):
+    item = _create(client)
+    assert item["version"] == 1
+
+    res = client.get(f"/items/{item['id']}")
+    assert res.headers["ETag"] == '"1"'
+
+    res = client.patch(f"/items/{item['id']}", json={"price": 6})
+    assert res.json()["version"] == 2
+    assert res.headers["ETag"] == '"2"'
+
+
+def test_empty_patch_keeps_version(client: TestClient):
+    item = _create(client)
+    url = f"/items/{item['id']}"
+
+    res = client.patch(url, json={}, headers={"If-Match": '"1"'})
+    assert res.status_code == 200
+    assert res.json()["version"] == 1
+    assert res.headers["ETag"] == '"1"'
+    # Nothing changed, so the client's ETag is still good
+    assert client.patch(url, json={"price": 6}, headers={"If-Match": '"1"'}).status_code == 200
+    assert client.patch(url, json={}, headers={"If-Match": '"1"'}).status_code == 412
+    assert client.patch("/items/999999", json={}).status_code == 404
+
+
+def test_if_match_detects_lost_updates(client: TestClient):
+    item = _create(client)
+    url = f"/items/{item['id']}"
+
+    first = client.patch(url, json={"price": 10}, headers={"If-Match": '"1"'})
+    assert first.status_code == 200
+    # a second writer still holding version 1 must not overwrite the first
+    second = client.put(url, json={
+        "name": "Stale", "description": "v", "price": 11, "available": True,
+        "email": item["email"], "special_id": item["special_id"],
+    }, headers={"If-Match": '"1"'})
+    assert second.status_code == 412
+    assert second.json()["error"] == "PreconditionFailed"
+    assert client.get(url).json()["price"] == 10
+
+    # any of several tags may match; weak tags never do
+    assert client.patch(url, json={"price": 12}, headers={"If-Match": '"7", "2"'}).status_code == 200
+    assert client.patch(url, json={"price": 13}, headers={"If-Match": 'W/"3"'}).status_code == 412
+
+    assert client.delete(url, headers={"If-Match": '"2"'}).status_code == 412
+    assert client.delete(url, headers={"If-Match": '"3"'}).status_code == 204
+    assert client.patch(url, json={"price": 1}, headers={"If-Match": '"3"'}).status_code == 404
+
+
+def test_upsert_bumps_version(client: TestClient):
+    item = _create(client, special_id=7200)
+    res = client.post("/items/upsert", json={
+        "name": "Upserted", "description": "v", "price": 1, "available": True,
+        "email": item["email"], "special_id": 7200,
+    })
+    assert res.json()["item"]["version"] == 2
+    assert res.headers["ETag"] == '"2"'
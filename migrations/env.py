@@ -43,16 +43,23 @@ def run_migrations_offline() -> None:
 
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode."""
+    # Fail fast instead of queueing behind long transactions, e.g. "5s"
+    lock_timeout = os.getenv("MIGRATION_LOCK_TIMEOUT")
+    connect_args = {"options": f"-c lock_timeout={lock_timeout}"} if lock_timeout else {}
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
+        connect_args=connect_args,
     )
 
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
+            # One transaction per revision, so online_migrations helpers can
+            # step outside it with autocommit_block()
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,41 @@
+"""add sort indexes
+
+Revision ID: a546a7836b73
+Revises: b5f28d87fea8
+Create Date: 2026-10-19 10:02:17.402911
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from fastapi_postgres_app.online_migrations import (
+    create_index_concurrently,
+    drop_index_concurrently,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a546a7836b73'
+down_revision: Union[str, Sequence[str], None] = 'b5f28d87fea8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SORT_INDEXES = {
+    "ix_items_available_price_id": "available, price, id",
+    "ix_items_price_id": "price, id",
+    "ix_items_created_at_id": "created_at, id",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in SORT_INDEXES.items():
+        create_index_concurrently(name, "items", columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in SORT_INDEXES:
+        drop_index_concurrently(name)
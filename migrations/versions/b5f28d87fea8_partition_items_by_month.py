@@ -0,0 +1,55 @@
+"""partition items by month
+
+Revision ID: b5f28d87fea8
+Revises: f9bfde1bfcaf
+Create Date: 2026-10-19 09:20:03.551870
+
+Opt-in: only runs when ITEMS_PARTITIONED=true (or `alembic -x partition_items=true`).
+Deployments that skip it can convert later with
+`python -m fastapi_postgres_app.partitions convert`.
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from fastapi_postgres_app.partitions import (
+    convert_items_to_partitioned,
+    revert_items_partitioning,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5f28d87fea8'
+down_revision: Union[str, Sequence[str], None] = 'f9bfde1bfcaf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The items indexes as of this revision. Frozen here rather than read from
+# the models, whose later indexes belong to later revisions.
+INDEXES = [
+    "CREATE INDEX ix_items_id ON items (id)",
+    "CREATE INDEX ix_items_name ON items (name)",
+    "CREATE INDEX ix_items_description ON items (description)",
+    "CREATE INDEX ix_items_created_at_brin ON items USING brin (created_at)",
+]
+
+
+def _enabled() -> bool:
+    x_args = context.get_x_argument(as_dictionary=True)
+    flag = x_args.get("partition_items", os.getenv("ITEMS_PARTITIONED", "false"))
+    return flag.lower() == "true"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _enabled():
+        convert_items_to_partitioned(op.get_bind(), indexes=INDEXES)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # No-op when items was never partitioned
+    revert_items_partitioning(op.get_bind(), indexes=INDEXES)
@@ -0,0 +1,47 @@
+"""add import jobs
+
+Revision ID: c41e7d2a9f03
+Revises: a546a7836b73
+Create Date: 2026-10-19 11:20:41.718204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7d2a9f03'
+down_revision: Union[str, Sequence[str], None] = 'a546a7836b73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The app's create_all() may have created it already
+    if sa.inspect(op.get_bind()).has_table('import_jobs'):
+        return
+    op.create_table(
+        'import_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('filename', sa.String(), nullable=True),
+        sa.Column('format', sa.String(), nullable=False),
+        sa.Column('bytes_total', sa.BigInteger(), nullable=False),
+        sa.Column('bytes_read', sa.BigInteger(), nullable=False),
+        sa.Column('rows_processed', sa.Integer(), nullable=False),
+        sa.Column('rows_imported', sa.Integer(), nullable=False),
+        sa.Column('rows_rejected', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS import_jobs")
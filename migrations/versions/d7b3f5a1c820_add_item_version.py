@@ -0,0 +1,29 @@
+"""add item version
+
+Revision ID: d7b3f5a1c820
+Revises: c41e7d2a9f03
+Create Date: 2026-10-19 12:05:13.220871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7b3f5a1c820'
+down_revision: Union[str, Sequence[str], None] = 'c41e7d2a9f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant default is stored in the catalog, so this does not rewrite the table
+    op.execute("ALTER TABLE items ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE items DROP COLUMN IF EXISTS version")
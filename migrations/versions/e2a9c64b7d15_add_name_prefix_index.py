@@ -0,0 +1,34 @@
+"""add name prefix index
+
+Revision ID: e2a9c64b7d15
+Revises: d7b3f5a1c820
+Create Date: 2026-10-19 13:41:52.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from fastapi_postgres_app.online_migrations import (
+    create_index_concurrently,
+    drop_index_concurrently,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9c64b7d15'
+down_revision: Union[str, Sequence[str], None] = 'd7b3f5a1c820'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Byte-wise ordering lets /items/suggest turn a prefix into an index range
+    create_index_concurrently("ix_items_name_lower_c", "items", '(lower(name) COLLATE "C"), id')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently("ix_items_name_lower_c")
@@ -0,0 +1,34 @@
+"""add created_at brin index
+
+Revision ID: f9bfde1bfcaf
+Revises: 37e12b095c8c
+Create Date: 2026-10-19 09:12:44.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from fastapi_postgres_app.online_migrations import (
+    create_index_concurrently,
+    drop_index_concurrently,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f9bfde1bfcaf'
+down_revision: Union[str, Sequence[str], None] = '37e12b095c8c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # IF NOT EXISTS: Base.metadata.create_all() may already have built it
+    create_index_concurrently("ix_items_created_at_brin", "items", "created_at", using="brin")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently("ix_items_created_at_brin")